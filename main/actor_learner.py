@@ -0,0 +1,677 @@
+import os
+import json
+import time
+import queue
+import socket
+import struct
+import argparse
+import threading
+import collections
+import multiprocessing
+
+import numpy as np
+import torch as th
+from stable_baselines3.common.logger import configure
+from stable_baselines3.common.policies import ActorCriticCnnPolicy, ActorCriticPolicy, MultiInputActorCriticPolicy
+from stable_baselines3.common.utils import obs_as_tensor, safe_mean
+from stable_baselines3.common.vec_env import DummyVecEnv, VecEnv, VecTransposeImage
+
+from trajectory_dataset import encode_frames, decode_frames
+
+GAME = "StreetFighterIISpecialChampionEdition-Genesis"
+STATE = "Champion.Level12.RyuVsBison"
+DEFAULT_PORT = 29500
+
+# Wire format: an 8 byte length, a 4 byte length + JSON header naming the
+# arrays (dtype, shape, byte size), then the raw array bytes. No pickle, so
+# a message is only ever parsed as data.
+
+# The policies an actor builds, by the class name the learner sends. Nothing
+# else is looked up, so a header cannot make an actor import a module.
+POLICY_CLASSES = {cls.__name__: cls for cls in (ActorCriticPolicy, ActorCriticCnnPolicy, MultiInputActorCriticPolicy)}
+
+def policy_class(name):
+    if name not in POLICY_CLASSES:
+        raise ValueError("Unsupported policy {}, expected one of {}".format(name, sorted(POLICY_CLASSES)))
+    return POLICY_CLASSES[name]
+
+def encode_message(kind, header=None, arrays=None):
+    arrays = arrays or {}
+    buffers = [np.ascontiguousarray(array) for array in arrays.values()]
+    meta = json.dumps({
+        "kind": kind,
+        "header": header or {},
+        "arrays": [[name, array.dtype.str, array.shape, array.nbytes] for name, array in zip(arrays, buffers)],
+    }).encode("utf-8")
+    parts = [struct.pack("!I", len(meta)), meta] + [memoryview(array.reshape(-1).view(np.uint8)) for array in buffers]
+    total = sum(len(part) for part in parts)
+    return [struct.pack("!Q", total)] + parts
+
+def send_message(sock, parts):
+    for part in parts:
+        sock.sendall(part)
+
+def _recv_exactly(sock, size):
+    buffer = bytearray(size)
+    view = memoryview(buffer)
+    received = 0
+    while received < size:
+        n = sock.recv_into(view[received:], size - received)
+        if n == 0:
+            raise ConnectionError("Connection closed")
+        received += n
+    return buffer
+
+def recv_message(sock):
+    """
+    Returns (kind, header, arrays).
+    """
+    total, = struct.unpack("!Q", _recv_exactly(sock, 8))
+    buffer = _recv_exactly(sock, total)
+    meta_size, = struct.unpack_from("!I", buffer)
+    meta = json.loads(bytes(buffer[4:4 + meta_size]).decode("utf-8"))
+    offset = 4 + meta_size
+    arrays = {}
+    for name, dtype, shape, nbytes in meta["arrays"]:
+        arrays[name] = np.frombuffer(buffer, dtype=np.dtype(dtype), count=nbytes // np.dtype(dtype).itemsize,
+                                     offset=offset).reshape(shape)
+        offset += nbytes
+    return meta["kind"], meta["header"], arrays
+
+def encode_observations(obs, level=1):
+    # (steps, envs, ...) uint8 frames, XOR-delta + zlib compressed per env along time
+    blobs = [np.frombuffer(encode_frames(np.ascontiguousarray(obs[:, i]), level), dtype=np.uint8)
+             for i in range(obs.shape[1])]
+    sizes = np.array([len(blob) for blob in blobs], dtype=np.int64)
+    return np.concatenate(blobs), sizes
+
+def decode_observations(blob, sizes, shape, dtype=np.uint8):
+    offsets = np.concatenate([[0], np.cumsum(sizes)])
+    frames = [decode_frames(blob[offsets[i]:offsets[i + 1]].tobytes(), shape, dtype) for i in range(len(sizes))]
+    return np.stack(frames, axis=1)
+
+def policy_weights(policy):
+    return {name: tensor.detach().cpu().numpy() for name, tensor in policy.state_dict().items()}
+
+def load_policy_weights(policy, arrays):
+    policy.load_state_dict({name: th.from_numpy(np.array(array)) for name, array in arrays.items()})
+
+class _SpacesVecEnv(VecEnv):
+    """
+    VecEnv that only carries the spaces, so a learner can build PPO and its
+    rollout buffer without running any env itself.
+    """
+    def reset(self):
+        raise NotImplementedError("The learner's envs run in the actors")
+
+    def step_async(self, actions):
+        raise NotImplementedError("The learner's envs run in the actors")
+
+    def step_wait(self):
+        raise NotImplementedError("The learner's envs run in the actors")
+
+    def close(self):
+        pass
+
+    def seed(self, seed=None):
+        return [None] * self.num_envs
+
+    def get_attr(self, attr_name, indices=None):
+        raise NotImplementedError("The learner's envs run in the actors")
+
+    def set_attr(self, attr_name, value, indices=None):
+        raise NotImplementedError("The learner's envs run in the actors")
+
+    def env_method(self, method_name, *method_args, indices=None, **method_kwargs):
+        raise NotImplementedError("The learner's envs run in the actors")
+
+    def env_is_wrapped(self, wrapper_class, indices=None):
+        return [False] * self.num_envs
+
+class _ActorConnection(object):
+    """
+    Learner side of one actor: a reader thread holds its newest batch, a
+    writer thread sends the newest weights. Batches and weights that were
+    superseded before they were used are skipped, so a slow learner or a
+    slow link holds at most one batch per actor in memory.
+    """
+    def __init__(self, sock, address, ready, pending):
+        self.sock = sock
+        self.address = address
+        self.num_envs = None
+        self.num_batches = 0
+        self.num_superseded = 0
+        self.closed = False
+
+        # Shared with the learner: ready guards pending, the connections with a batch waiting, oldest first
+        self._ready = ready
+        self._pending = pending
+        self._batch = None
+        self._weights = None
+        self._condition = threading.Condition()
+
+        threading.Thread(target=self._read, name="ActorReader", daemon=True).start()
+        threading.Thread(target=self._write, name="ActorWriter", daemon=True).start()
+
+    def send_weights(self, parts):
+        with self._condition:
+            self._weights = parts
+            self._condition.notify()
+
+    def _read(self):
+        try:
+            while True:
+                kind, header, arrays = recv_message(self.sock)
+                if kind == "hello":
+                    self.num_envs = header["num_envs"]
+                elif kind == "batch":
+                    self.num_batches += 1
+                    with self._ready:
+                        if self._batch is None:
+                            self._pending.append(self)
+                        else:
+                            self.num_superseded += 1
+                        self._batch = (header, arrays)
+                        self._ready.notify()
+        except (ConnectionError, OSError):
+            pass
+        finally:
+            self.close()
+
+    def _write(self):
+        try:
+            while True:
+                with self._condition:
+                    while self._weights is None and not self.closed:
+                        self._condition.wait()
+                    if self.closed:
+                        return
+                    parts, self._weights = self._weights, None
+                send_message(self.sock, parts)
+        except (ConnectionError, OSError):
+            self.close()
+
+    def take_batch(self):
+        # Called with ready held, after popping this connection from pending
+        batch, self._batch = self._batch, None
+        return batch
+
+    def close(self):
+        with self._condition:
+            self.closed = True
+            self._condition.notify()
+        with self._ready:
+            self._ready.notify()
+        try:
+            self.sock.close()
+        except OSError:
+            pass
+
+# Learner
+class Learner(object):
+    """
+    Fills a PPO rollout buffer from actor batches and runs model.train().
+
+    Every batch is tagged with the policy version that collected it; batches
+    more than max_staleness versions behind are dropped. Actions and their
+    log probabilities are the actors' (so PPO's ratio and clipping account
+    for the lag), values are recomputed with the current policy. After each
+    update the weights go out to every actor as version + 1.
+
+    Waiting for batches gives up with TimeoutError after batch_timeout
+    seconds without one (None waits forever), or with RuntimeError as soon
+    as actors_alive(), if given, returns False.
+    """
+    def __init__(self, model, host="127.0.0.1", port=DEFAULT_PORT, max_staleness=1, callback=None,
+                 batch_timeout=600.0, actors_alive=None):
+        self.model = model
+        self.max_staleness = max_staleness
+        # Optional BaseCallback (e.g. AsyncCheckpointCallback) stepped once per update
+        self.callback = callback
+        self.batch_timeout = batch_timeout
+        self.actors_alive = actors_alive
+
+        self.version = 0
+        self.num_updates = 0
+        self.num_dropped = 0
+        self.num_truncated_envs = 0
+        self.connections = []
+
+        self._ready = threading.Condition()
+        self._pending = collections.deque()
+        self._server = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+        self._server.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+        self._server.bind((host, port))
+        self._server.listen()
+        self.address = self._server.getsockname()
+        self._closed = False
+        self._weights = self._encode_weights()
+
+        threading.Thread(target=self._accept, name="LearnerAccept", daemon=True).start()
+
+    def _policy_spec(self):
+        name = type(self.model.policy).__name__
+        # Fail here rather than in every actor
+        policy_class(name)
+        return {
+            "name": name,
+            "kwargs": self.model.policy_kwargs,
+            "n_steps": self.model.n_steps,
+        }
+
+    def _encode_weights(self):
+        header = {"version": self.version, "policy": self._policy_spec()}
+        return encode_message("weights", header, policy_weights(self.model.policy))
+
+    def _accept(self):
+        while not self._closed:
+            try:
+                sock, address = self._server.accept()
+            except OSError:
+                return
+            sock.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+            connection = _ActorConnection(sock, address, self._ready, self._pending)
+            self.connections.append(connection)
+            connection.send_weights(self._weights)
+            print("Actor connected from {}:{}".format(*address))
+
+    @property
+    def num_superseded(self):
+        return sum(connection.num_superseded for connection in self.connections)
+
+    def _next_batch(self):
+        deadline = None if self.batch_timeout is None else time.monotonic() + self.batch_timeout
+        with self._ready:
+            while not self._pending:
+                if self._closed:
+                    raise RuntimeError("The learner was closed")
+                if self.actors_alive is not None and not self.actors_alive():
+                    raise RuntimeError("Every actor has exited, no more batches will arrive")
+                if deadline is not None and time.monotonic() > deadline:
+                    raise TimeoutError("No actor batch arrived in {} s".format(self.batch_timeout))
+                # Woken by new batches and closed connections, the timeout rechecks the actors
+                self._ready.wait(1.0)
+            connection = self._pending.popleft()
+            header, arrays = connection.take_batch()
+        return connection, header, arrays
+
+    def _fill_buffer(self):
+        """
+        Copies actor batches into the rollout buffer env columns until every
+        column is filled. Returns the episode stats and staleness seen.
+        """
+        model = self.model
+        buffer = model.rollout_buffer
+        buffer.reset()
+        n_steps, n_envs = buffer.buffer_size, buffer.n_envs
+        action_dim = buffer.actions.shape[-1]
+
+        last_obs = np.zeros((n_envs,) + buffer.obs_shape, dtype=np.float32)
+        last_starts = np.zeros(n_envs, dtype=np.float32)
+        episode_rewards, episode_lengths, staleness = [], [], []
+        column = 0
+        while column < n_envs:
+            connection, header, arrays = self._next_batch()
+            lag = self.version - header["version"]
+            if lag > self.max_staleness:
+                self.num_dropped += 1
+                continue
+
+            obs = decode_observations(arrays["obs"], arrays["obs_sizes"], buffer.obs_shape)
+            num = min(obs.shape[1], n_envs - column)
+            if num < obs.shape[1]:
+                self.num_truncated_envs += obs.shape[1] - num
+            columns = slice(column, column + num)
+            buffer.observations[:, columns] = obs[:, :num]
+            buffer.actions[:, columns] = arrays["actions"].reshape(n_steps, -1, action_dim)[:, :num]
+            buffer.rewards[:, columns] = arrays["rewards"][:, :num]
+            buffer.episode_starts[:, columns] = arrays["episode_starts"][:, :num]
+            buffer.log_probs[:, columns] = arrays["log_probs"][:, :num]
+            last_obs[columns] = arrays["last_obs"][:num]
+            last_starts[columns] = arrays["last_episode_starts"][:num]
+            episode_rewards += header["episode_rewards"]
+            episode_lengths += header["episode_lengths"]
+            staleness.append(lag)
+            column += num
+
+        # Values under the current policy, also for the bootstrap observations
+        with th.no_grad():
+            flat_obs = buffer.observations.reshape((n_steps * n_envs,) + buffer.obs_shape)
+            values = [model.policy.predict_values(obs_as_tensor(flat_obs[i:i + 1024], model.device)).cpu().numpy()
+                      for i in range(0, len(flat_obs), 1024)]
+            buffer.values[:] = np.concatenate(values).reshape(n_steps, n_envs)
+            last_values = model.policy.predict_values(obs_as_tensor(last_obs, model.device))
+        buffer.pos = n_steps
+        buffer.full = True
+        buffer.compute_returns_and_advantage(last_values=last_values, dones=last_starts)
+        return episode_rewards, episode_lengths, staleness
+
+    def run(self, total_timesteps):
+        model = self.model
+        if model.ep_info_buffer is None:
+            # Normally set up by learn(), which the learner does not call
+            model.ep_info_buffer = collections.deque(maxlen=100)
+        if self.callback is not None:
+            self.callback.init_callback(model)
+            self.callback.on_training_start(locals(), globals())
+        try:
+            while model.num_timesteps < total_timesteps:
+                start = time.perf_counter()
+                episode_rewards, episode_lengths, staleness = self._fill_buffer()
+                collect_time = time.perf_counter() - start
+
+                model.num_timesteps += model.rollout_buffer.buffer_size * model.rollout_buffer.n_envs
+                model._update_current_progress_remaining(model.num_timesteps, total_timesteps)
+                model.train()
+
+                self.version += 1
+                self.num_updates += 1
+                self._weights = self._encode_weights()
+                for connection in list(self.connections):
+                    if connection.closed:
+                        self.connections.remove(connection)
+                    else:
+                        connection.send_weights(self._weights)
+
+                model.ep_info_buffer.extend({"r": r, "l": l} for r, l in zip(episode_rewards, episode_lengths))
+                logger = model.logger
+                if model.ep_info_buffer:
+                    logger.record("rollout/ep_rew_mean", safe_mean([info["r"] for info in model.ep_info_buffer]))
+                    logger.record("rollout/ep_len_mean", safe_mean([info["l"] for info in model.ep_info_buffer]))
+                logger.record("actor_learner/version", self.version)
+                logger.record("actor_learner/actors", len(self.connections))
+                logger.record("actor_learner/staleness_mean", safe_mean(staleness))
+                logger.record("actor_learner/dropped_batches", self.num_dropped)
+                logger.record("actor_learner/superseded_batches", self.num_superseded)
+                logger.record("actor_learner/wait_s", collect_time)
+                logger.record("actor_learner/update_s", time.perf_counter() - start - collect_time)
+                logger.record("time/total_timesteps", model.num_timesteps)
+                logger.dump(model.num_timesteps)
+
+                if self.callback is not None:
+                    self.callback.on_step()
+        finally:
+            if self.callback is not None:
+                self.callback.on_training_end()
+
+    def close(self):
+        self._closed = True
+        self._server.close()
+        for connection in self.connections:
+            connection.close()
+        with self._ready:
+            self._ready.notify_all()
+
+# Actor
+class Actor(object):
+    """
+    Runs envs with the newest policy weights received from the learner and
+    streams n_steps long batches back. Collection, sending and receiving
+    weights overlap: a sender thread ships the last batch while the next
+    one is collected, and new weights are picked up between batches.
+    """
+    def __init__(self, venv, host="127.0.0.1", port=DEFAULT_PORT, device="cpu", compress_level=1,
+                 connect_timeout=60.0):
+        if not isinstance(venv, VecTransposeImage):
+            venv = VecTransposeImage(venv)
+        self.venv = venv
+        self.device = th.device(device)
+        self.compress_level = compress_level
+
+        self.policy = None
+        self.version = None
+        self.n_steps = None
+        self.num_batches = 0
+
+        self._latest = None
+        self._condition = threading.Condition()
+        self._outbox = queue.Queue(maxsize=1)
+        self._closed = False
+
+        self.sock = self._connect(host, port, connect_timeout)
+        self.sock.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+        send_message(self.sock, encode_message("hello", {"num_envs": venv.num_envs}))
+
+        threading.Thread(target=self._receive, name="ActorReceive", daemon=True).start()
+        threading.Thread(target=self._send, name="ActorSend", daemon=True).start()
+
+    @staticmethod
+    def _connect(host, port, timeout):
+        # Actors may come up before the learner listens
+        deadline = time.monotonic() + timeout
+        while True:
+            try:
+                sock = socket.create_connection((host, port), timeout=timeout)
+                sock.settimeout(None)
+                return sock
+            except ConnectionRefusedError:
+                if time.monotonic() > deadline:
+                    raise
+                time.sleep(1.0)
+
+    def _receive(self):
+        try:
+            while True:
+                kind, header, arrays = recv_message(self.sock)
+                if kind == "weights":
+                    with self._condition:
+                        self._latest = (header, arrays)
+                        self._condition.notify()
+        except (ConnectionError, OSError):
+            with self._condition:
+                self._closed = True
+                self._condition.notify()
+
+    def _send(self):
+        while True:
+            parts = self._outbox.get()
+            if parts is None:
+                return
+            try:
+                send_message(self.sock, parts)
+            except (ConnectionError, OSError):
+                with self._condition:
+                    self._closed = True
+                    self._condition.notify()
+                return
+
+    def _put(self, parts):
+        # The sender thread stops with the connection, so a full outbox is only waited on while it is open
+        while not self._closed:
+            try:
+                self._outbox.put(parts, timeout=1.0)
+                return
+            except queue.Full:
+                pass
+
+    def _build_policy(self, spec):
+        policy = policy_class(spec["name"])(self.venv.observation_space, self.venv.action_space, lambda _: 0.0, **spec["kwargs"])
+        policy.set_training_mode(False)
+        return policy.to(self.device)
+
+    def _update_weights(self, wait):
+        with self._condition:
+            while wait and self._latest is None and not self._closed:
+                self._condition.wait()
+            latest, self._latest = self._latest, None
+        if latest is None:
+            return
+        header, arrays = latest
+        if self.policy is None:
+            self.policy = self._build_policy(header["policy"])
+            self.n_steps = header["policy"]["n_steps"]
+        load_policy_weights(self.policy, arrays)
+        self.version = header["version"]
+
+    def run(self, max_batches=None):
+        venv = self.venv
+        num_envs = venv.num_envs
+        self._update_weights(wait=True)
+        obs = venv.reset()
+        episode_starts = np.ones(num_envs, dtype=np.float32)
+        while not self._closed and (max_batches is None or self.num_batches < max_batches):
+            self._update_weights(wait=False)
+            version = self.version
+            n_steps = self.n_steps
+            observations = np.zeros((n_steps,) + obs.shape, dtype=obs.dtype)
+            rewards = np.zeros((n_steps, num_envs), dtype=np.float32)
+            starts = np.zeros((n_steps, num_envs), dtype=np.float32)
+            log_probs = np.zeros((n_steps, num_envs), dtype=np.float32)
+            actions = None
+            episode_rewards, episode_lengths = [], []
+
+            for step in range(n_steps):
+                with th.no_grad():
+                    action, _values, log_prob = self.policy(obs_as_tensor(obs, self.device))
+                action = action.cpu().numpy()
+                if actions is None:
+                    actions = np.zeros((n_steps,) + action.shape, dtype=np.float32)
+                observations[step] = obs
+                actions[step] = action
+                starts[step] = episode_starts
+                log_probs[step] = log_prob.cpu().numpy()
+
+                obs, reward, dones, infos = venv.step(action)
+                rewards[step] = reward
+                episode_starts = dones.astype(np.float32)
+                for info in infos:
+                    if info is not None and "episode" in info:
+                        episode_rewards.append(float(info["episode"]["r"]))
+                        episode_lengths.append(int(info["episode"]["l"]))
+
+            obs_blob, obs_sizes = encode_observations(observations, self.compress_level)
+            header = {"version": version, "episode_rewards": episode_rewards, "episode_lengths": episode_lengths}
+            self._put(encode_message("batch", header, {
+                "obs": obs_blob,
+                "obs_sizes": obs_sizes,
+                "actions": actions,
+                "rewards": rewards,
+                "episode_starts": starts,
+                "log_probs": log_probs,
+                "last_obs": obs,
+                "last_episode_starts": episode_starts,
+            }))
+            self.num_batches += 1
+
+    def close(self):
+        self._closed = True
+        try:
+            self._outbox.put_nowait(None)
+        except queue.Full:
+            # The sender is busy with the last batch, closing the socket ends it
+            pass
+        self.sock.close()
+        self.venv.close()
+
+def make_actor_env(num_envs, seed=0, game=GAME, state=STATE):
+    from ram_decoder import RamDecoder
+    from shm_vec_env import ShmVecEnv
+    from train import make_env
+
+    env_fns = [make_env(game, state, seed=seed + i) for i in range(num_envs)]
+    if num_envs == 1:
+        return DummyVecEnv(env_fns)
+    # One emulator per process
+    return ShmVecEnv(env_fns, ram_decoder=RamDecoder.from_json(), start_method="spawn")
+
+def make_learner_model(num_envs, device="cuda", game=GAME, state=STATE):
+    from train import make_env, make_model, USE_LSTM_POLICY
+
+    if USE_LSTM_POLICY:
+        raise ValueError("The actor-learner mode does not carry recurrent states, set USE_LSTM_POLICY = False")
+    # One env only to read the spaces
+    env = make_env(game, state)()
+    observation_space, action_space = env.observation_space, env.action_space
+    env.close()
+    return make_model(_SpacesVecEnv(num_envs, observation_space, action_space), device=device)
+
+def run_actor(host, port, num_envs, seed=0, device="cpu", max_batches=None):
+    actor = Actor(make_actor_env(num_envs, seed), host=host, port=port, device=device)
+    try:
+        actor.run(max_batches=max_batches)
+    finally:
+        actor.close()
+
+def run_learner(host, port, num_envs, total_timesteps, max_staleness=1, device="cuda", save_dir="trained_models",
+                num_local_actors=0, envs_per_actor=1):
+    from checkpoint import AsyncCheckpointCallback
+    from train import KEEP_CHECKPOINTS
+
+    model = make_learner_model(num_envs, device=device)
+    model.set_logger(configure("logs/actor_learner", ["stdout", "tensorboard"]))
+    # Stepped once per update, so about as often as train.py's 31250 steps per env
+    checkpoint = AsyncCheckpointCallback(save_freq=max(1, 31250 // model.n_steps), save_path=save_dir,
+                                         name_prefix="ppo_ryu", keep_last=KEEP_CHECKPOINTS)
+    learner = Learner(model, host=host, port=port, max_staleness=max_staleness, callback=checkpoint)
+    host, port = learner.address
+    print("Learner listening on {}:{}".format(host, port))
+
+    # Actors on this machine for a single host run or a test. Not daemonic, since
+    # an actor with more than one env starts env worker processes of its own.
+    context = multiprocessing.get_context("spawn")
+    actors = [context.Process(target=run_actor, args=(host, port, envs_per_actor, 1000 * (i + 1)))
+              for i in range(num_local_actors)]
+    for process in actors:
+        process.start()
+    if actors:
+        learner.actors_alive = lambda: any(process.is_alive() for process in actors)
+    try:
+        learner.run(total_timesteps)
+        model.save(os.path.join(save_dir, "ppo_sf2_ryu_actor_learner_final.zip"))
+    finally:
+        # Closing the connections ends the actors' loops, stragglers are terminated
+        learner.close()
+        for process in actors:
+            process.join(timeout=30)
+            if process.is_alive():
+                process.terminate()
+                process.join()
+
+def load_config(path):
+    """
+    Cluster config, e.g.
+    {"learner": {"host": "10.0.0.1", "port": 29500, "num_envs": 32, "max_staleness": 1},
+     "actors": [{"host": "10.0.0.2", "num_envs": 16}, {"host": "10.0.0.3", "num_envs": 16}]}
+    The learner binds to its host, actor --index i connects to it with actors[i]'s num_envs.
+    """
+    with open(path) as file:
+        return json.load(file)
+
+def main():
+    parser = argparse.ArgumentParser(description="Distributed PPO: actors stream rollouts to a learner over TCP.")
+    parser.add_argument("role", choices=["learner", "actor", "local"])
+    parser.add_argument("--config", help="Cluster config JSON, overrides the address and env counts")
+    parser.add_argument("--index", type=int, default=0, help="Actor index in the config")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=DEFAULT_PORT)
+    parser.add_argument("--num-envs", type=int, default=16, help="Learner: envs per update, actor: envs to run")
+    parser.add_argument("--actors", type=int, default=2, help="local: actor processes to start")
+    parser.add_argument("--max-staleness", type=int, default=1)
+    parser.add_argument("--timesteps", type=int, default=100000000)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--device", default=None)
+    args = parser.parse_args()
+
+    host, port, num_envs, max_staleness = args.host, args.port, args.num_envs, args.max_staleness
+    if args.config is not None:
+        config = load_config(args.config)
+        learner_config = config["learner"]
+        host = learner_config.get("host", host)
+        port = learner_config.get("port", port)
+        max_staleness = learner_config.get("max_staleness", max_staleness)
+        if args.role == "actor":
+            num_envs = config["actors"][args.index]["num_envs"]
+        else:
+            num_envs = learner_config.get("num_envs", num_envs)
+
+    if args.role == "actor":
+        run_actor(host, port, num_envs, seed=args.seed or 1000 * (args.index + 1), device=args.device or "cpu")
+    elif args.role == "learner":
+        run_learner(host, port, num_envs, args.timesteps, max_staleness, device=args.device or "cuda")
+    else:
+        # Everything on localhost: the learner plus actors sharing its env count
+        run_learner("127.0.0.1", 0, num_envs, args.timesteps, max_staleness, device=args.device or "cuda",
+                    num_local_actors=args.actors, envs_per_actor=max(1, num_envs // args.actors))
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,191 @@
+import time
+import threading
+
+import numpy as np
+
+class AudioRingBuffer(object):
+    """
+    Single-producer single-consumer ring of int16 sample frames. The producer
+    only advances the write counter and the consumer only the read counter,
+    so neither side takes a lock.
+    """
+    def __init__(self, capacity, channels=2):
+        self.capacity = capacity
+        self.channels = channels
+        self._buffer = np.zeros((capacity, channels), dtype=np.int16)
+        # Total frames written and read, the difference is the fill level
+        self._write = 0
+        self._read = 0
+
+        self.num_overruns = 0
+        self.overrun_frames = 0
+        self.num_underruns = 0
+        self.underrun_frames = 0
+
+    def __len__(self):
+        return self._write - self._read
+
+    def write(self, samples):
+        """
+        Producer side. Samples that do not fit are dropped and counted as an overrun.
+        """
+        samples = np.asarray(samples, dtype=np.int16).reshape(-1, self.channels)
+        free = self.capacity - (self._write - self._read)
+        if len(samples) > free:
+            self.num_overruns += 1
+            self.overrun_frames += len(samples) - free
+            samples = samples[:free]
+        n = len(samples)
+        start = self._write % self.capacity
+        first = min(n, self.capacity - start)
+        self._buffer[start:start + first] = samples[:first]
+        self._buffer[:n - first] = samples[first:]
+        # Publish only after the copy
+        self._write += n
+        return n
+
+    def read_into(self, out, count_underrun=True):
+        """
+        Consumer side. Fills out with the oldest frames and pads with silence,
+        counted as an underrun, when fewer are available.
+        """
+        n = min(len(out), self._write - self._read)
+        start = self._read % self.capacity
+        first = min(n, self.capacity - start)
+        out[:first] = self._buffer[start:start + first]
+        out[first:n] = self._buffer[:n - first]
+        out[n:] = 0
+        self._read += n
+        if n < len(out) and count_underrun:
+            self.num_underruns += 1
+            self.underrun_frames += len(out) - n
+        return n
+
+class PyAudioOutput(object):
+    """
+    PyAudio stream in callback mode, PortAudio calls pull from its own thread.
+    """
+    def __init__(self, rate, channels=2, frames_per_buffer=512):
+        self.rate = rate
+        self.channels = channels
+        self.frames_per_buffer = frames_per_buffer
+        self._pyaudio = None
+        self._stream = None
+
+    def start(self, pull):
+        import pyaudio
+
+        out = np.zeros((self.frames_per_buffer, self.channels), dtype=np.int16)
+
+        def callback(in_data, frame_count, time_info, status):
+            buffer = out[:frame_count] if frame_count <= len(out) else np.zeros((frame_count, self.channels), np.int16)
+            pull(buffer)
+            return buffer.tobytes(), pyaudio.paContinue
+
+        self._pyaudio = pyaudio.PyAudio()
+        self._stream = self._pyaudio.open(format=pyaudio.paInt16, channels=self.channels, rate=int(self.rate),
+                                          output=True, frames_per_buffer=self.frames_per_buffer,
+                                          stream_callback=callback)
+        self._stream.start_stream()
+
+    def close(self):
+        if self._stream is not None:
+            self._stream.stop_stream()
+            self._stream.close()
+            self._stream = None
+        if self._pyaudio is not None:
+            self._pyaudio.terminate()
+            self._pyaudio = None
+
+class NullAudioOutput(object):
+    """
+    Output without a sound device. With realtime=True a thread pulls buffers
+    at the device rate like PortAudio would; otherwise the caller drives it
+    with pull(), which makes the audio path testable.
+    """
+    def __init__(self, rate, channels=2, frames_per_buffer=512, realtime=False):
+        self.rate = rate
+        self.channels = channels
+        self.frames_per_buffer = frames_per_buffer
+        self.realtime = realtime
+        self.num_frames = 0
+        self._pull = None
+        self._closed = threading.Event()
+        self._thread = None
+
+    def start(self, pull):
+        self._pull = pull
+        if self.realtime:
+            self._thread = threading.Thread(target=self._run, name="NullAudioOutput", daemon=True)
+            self._thread.start()
+
+    def pull(self, frame_count=None):
+        out = np.zeros((frame_count or self.frames_per_buffer, self.channels), dtype=np.int16)
+        self._pull(out)
+        self.num_frames += len(out)
+        return out
+
+    def _run(self):
+        period = self.frames_per_buffer / float(self.rate)
+        next_tick = time.perf_counter()
+        while not self._closed.is_set():
+            self.pull()
+            next_tick += period
+            delay = next_tick - time.perf_counter()
+            if delay > 0:
+                self._closed.wait(delay)
+
+    def close(self):
+        self._closed.set()
+        if self._thread is not None:
+            self._thread.join(timeout=1.0)
+            self._thread = None
+
+# Audio pump
+class AudioPump(object):
+    """
+    Moves emulator audio to an output without blocking the emulator thread.
+    push() copies each frame's samples into a ring buffer and returns; the
+    output drains it from its own thread. Playback starts once prefill
+    seconds are buffered and restarts the same way after the buffer ran dry,
+    so a stall costs one gap instead of a run of crackles.
+    """
+    def __init__(self, rate, channels=2, buffer_seconds=0.25, prefill=0.05, output=None):
+        self.rate = rate
+        self.ring = AudioRingBuffer(int(rate * buffer_seconds), channels)
+        self.prefill_frames = int(rate * prefill)
+        self.output = output if output is not None else PyAudioOutput(rate, channels)
+        self._primed = False
+        self.output.start(self._pull)
+
+    def push(self, retro_env):
+        """
+        Queues the samples of the last emulated frame, usable as RealtimeRunner's on_frame.
+        """
+        return self.ring.write(retro_env.em.get_audio())
+
+    def push_samples(self, samples):
+        return self.ring.write(samples)
+
+    def _pull(self, out):
+        # Runs on the output thread
+        if not self._primed:
+            if len(self.ring) < self.prefill_frames:
+                out[:] = 0
+                return
+            self._primed = True
+        if self.ring.read_into(out) < len(out):
+            self._primed = False
+
+    def stats(self):
+        ring = self.ring
+        return {
+            "buffered_frames": len(ring),
+            "overruns": ring.num_overruns,
+            "overrun_frames": ring.overrun_frames,
+            "underruns": ring.num_underruns,
+            "underrun_frames": ring.underrun_frames,
+        }
+
+    def close(self):
+        self.output.close()
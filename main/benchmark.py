@@ -0,0 +1,219 @@
+import os
+import json
+import time
+import argparse
+import platform
+import functools
+import tracemalloc
+
+import numpy as np
+
+from fighter import Fighter
+from ram_decoder import RamDecoder
+from stand_in_env import StandInRetroEnv
+from street_fighter_custom_wrapper import StreetFighterCustomWrapper
+
+RESULTS_PATH = "bench_results.json"
+
+def make_stand_in_env(seed=0, fast_step=True):
+    env = StandInRetroEnv(seed=seed)
+    return StreetFighterCustomWrapper(env, fast_step=fast_step, ram_decoder=RamDecoder.from_json())
+
+def summarize(samples, frames_per_sample=None):
+    """
+    Latency percentiles in microseconds plus throughput.
+    """
+    samples = np.asarray(samples, dtype=np.float64)
+    p50, p90, p99 = np.percentile(samples, [50, 90, 99]) * 1e6
+    result = {
+        "count": int(samples.size),
+        "mean_us": float(samples.mean() * 1e6),
+        "p50_us": float(p50),
+        "p90_us": float(p90),
+        "p99_us": float(p99),
+        "per_sec": float(samples.size / samples.sum()),
+    }
+    if frames_per_sample is not None:
+        result["frames_per_sec"] = float(frames_per_sample * samples.size / samples.sum())
+    return result
+
+def time_calls(fn, repeat, warmup=10):
+    for _ in range(warmup):
+        fn()
+    samples = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        fn()
+        samples.append(time.perf_counter() - start)
+    return samples
+
+def measure_memory(fn, repeat=50):
+    """
+    Peak traced bytes above the baseline while one call runs, and the memory
+    blocks a call leaves allocated (a tracemalloc snapshot diff over `repeat`
+    calls, divided by `repeat`). Temporaries freed within the call only show
+    up in the peak, tracemalloc does not count them.
+    """
+    fn()
+    peaks = np.zeros(repeat)
+    ignore_tracemalloc = [tracemalloc.Filter(False, tracemalloc.__file__)]
+    tracemalloc.start()
+    try:
+        before = tracemalloc.take_snapshot().filter_traces(ignore_tracemalloc)
+        for i in range(repeat):
+            tracemalloc.reset_peak()
+            base = tracemalloc.get_traced_memory()[0]
+            fn()
+            peaks[i] = tracemalloc.get_traced_memory()[1] - base
+        after = tracemalloc.take_snapshot().filter_traces(ignore_tracemalloc)
+    finally:
+        tracemalloc.stop()
+    retained = sum(stat.count_diff for stat in after.compare_to(before, "filename"))
+    return {"peak_traced_bytes_per_call": float(peaks.mean()), "retained_blocks_per_call": retained / repeat}
+
+def bench_stages(repeat):
+    """
+    Each hot-path stage of StreetFighterCustomWrapper.step on its own.
+    """
+    wrapper = make_stand_in_env()
+    wrapper.reset()
+    retro_env = wrapper.env.unwrapped
+    decoder = wrapper.ram_decoder
+    frame_stack = wrapper.frame_stack
+    frame = retro_env.get_screen()
+    ram = decoder.decode(retro_env.get_ram())
+    info = decoder.to_dict(ram)
+    fighter = Fighter(None)
+    rng = np.random.default_rng(0)
+    hps = rng.integers(0, 176, size=(1024, 2))
+    hp_index = [0]
+
+    def emulator_frame():
+        retro_env.em.step()
+        retro_env.data.update_ram()
+
+    def decision():
+        fighter.update(info)
+        fighter.get_best_move()
+
+    def reward():
+        i = hp_index[0] = (hp_index[0] + 1) % len(hps)
+        wrapper.compute_reward(int(hps[i, 0]), int(hps[i, 1]))
+
+    stages = {
+        "emulator_frame": emulator_frame,
+        "screen_capture": retro_env.get_screen,
+        "frame_stack_push": lambda: frame_stack.push(frame),
+        "ram_decode": lambda: decoder.decode(retro_env.get_ram()),
+        "retro_lookup_all": retro_env.data.lookup_all,
+        "ram_to_dict": lambda: decoder.to_dict(ram),
+        "decision": decision,
+        "reward": reward,
+        "observation_copy": lambda: frame_stack.observation(copy=True),
+        "observation_view": lambda: frame_stack.observation(copy=False),
+    }
+    # Leave real frames in the stack for the observation stages
+    frame_stack.fill(frame)
+
+    results = {}
+    for name, fn in stages.items():
+        results[name] = summarize(time_calls(fn, repeat))
+        results[name].update(measure_memory(fn))
+    return results
+
+def bench_single_env(steps):
+    results = {}
+    for fast_step in (False, True):
+        wrapper = make_stand_in_env(fast_step=fast_step)
+        wrapper.reset()
+        retro_env = wrapper.env.unwrapped
+        frames = []
+
+        def step():
+            start_frame = retro_env._state["frame"]
+            _obs, _reward, done, _info = wrapper.step(None)
+            frames.append(retro_env._state["frame"] - start_frame)
+            if done:
+                wrapper.reset()
+
+        samples = time_calls(step, steps)
+        result = summarize(samples, frames_per_sample=np.mean(frames[-steps:]))
+        result.update(measure_memory(step))
+        results["fast_step" if fast_step else "env_step"] = result
+    return results
+
+def bench_vec_env(num_envs, steps):
+    from stable_baselines3.common.vec_env import DummyVecEnv, SubprocVecEnv
+    from shm_vec_env import ShmVecEnv
+
+    env_fns = [functools.partial(make_stand_in_env, seed=i) for i in range(num_envs)]
+    kinds = {
+        "dummy": lambda: DummyVecEnv(env_fns),
+        "subproc": lambda: SubprocVecEnv(env_fns),
+        "shared_memory": lambda: ShmVecEnv(env_fns, ram_decoder=RamDecoder.from_json()),
+    }
+    results = {}
+    for name, make in kinds.items():
+        venv = make()
+        venv.reset()
+        actions = np.zeros((num_envs, 12), dtype=np.uint8)
+        samples = time_calls(lambda: venv.step(actions), steps)
+        venv.close()
+        result = summarize(samples)
+        result["env_steps_per_sec"] = result["per_sec"] * num_envs
+        results[name] = result
+    return results
+
+def bench_policy(batch_sizes, repeat):
+    import torch as th
+    from stable_baselines3 import PPO
+    from stable_baselines3.common.vec_env import DummyVecEnv
+
+    th.set_num_threads(max(1, os.cpu_count() or 1))
+    model = PPO("CnnPolicy", DummyVecEnv([make_stand_in_env]), device="cpu")
+    results = {}
+    for batch_size in batch_sizes:
+        obs = np.random.randint(0, 256, size=(batch_size,) + model.observation_space.shape, dtype=np.uint8)
+        samples = time_calls(lambda: model.predict(obs, deterministic=True), repeat)
+        result = summarize(samples)
+        result["obs_per_sec"] = result["per_sec"] * batch_size
+        results["batch_{}".format(batch_size)] = result
+    return results
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmark the env hot path against a stand-in for the emulator.")
+    parser.add_argument("--steps", type=int, default=500)
+    parser.add_argument("--stage-repeat", type=int, default=2000)
+    parser.add_argument("--num-envs", type=int, nargs="+", default=[1, 8])
+    parser.add_argument("--policy-batch", type=int, nargs="+", default=[1, 16])
+    parser.add_argument("--skip-vec-env", action="store_true")
+    parser.add_argument("--skip-policy", action="store_true")
+    parser.add_argument("--output", default=RESULTS_PATH)
+    args = parser.parse_args(argv)
+
+    results = {
+        "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        "python": platform.python_version(),
+        "numpy": np.__version__,
+        "cpu_count": os.cpu_count(),
+        "stages": bench_stages(args.stage_repeat),
+        "single_env": bench_single_env(args.steps),
+    }
+    if not args.skip_vec_env:
+        results["vec_env"] = {str(n): bench_vec_env(n, args.steps) for n in args.num_envs}
+    if not args.skip_policy:
+        results["policy"] = bench_policy(args.policy_batch, max(20, args.steps // 10))
+
+    for name, result in results["stages"].items():
+        print("{:<20} p50 {:>9.2f} us  p99 {:>9.2f} us  peak {:>10.0f} bytes  retained {:>6.2f} blocks".format(
+            name, result["p50_us"], result["p99_us"], result["peak_traced_bytes_per_call"],
+            result["retained_blocks_per_call"]))
+    for name, result in results["single_env"].items():
+        print("{:<20} {:>9.1f} steps/s  {:>9.1f} frames/s".format(name, result["per_sec"], result["frames_per_sec"]))
+
+    with open(args.output, "w") as f:
+        json.dump(results, f, indent=2)
+    print("Results saved to {}".format(args.output))
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,87 @@
+import time
+import argparse
+
+import numpy as np
+from stable_baselines3.common.vec_env import SubprocVecEnv
+
+from state_cache import PrewarmedEnvPool
+from street_fighter_custom_wrapper import StreetFighterCustomWrapper
+
+GAME = "StreetFighterIISpecialChampionEdition-Genesis"
+STATE = "Champion.Level12.RyuVsBison"
+OTHER_STATE = "Champion.Level1.RyuVsGuile"
+
+def make_env(game, state, seed=0):
+    def _init():
+        import retro
+
+        env = retro.make(
+            game=game,
+            state=state,
+            use_restricted_actions=retro.Actions.FILTERED,
+            obs_type=retro.Observations.IMAGE
+        )
+        env = StreetFighterCustomWrapper(env)
+        env.seed(seed)
+        return env
+    return _init
+
+def wrap_prewarmed(env, rank):
+    env = StreetFighterCustomWrapper(env)
+    env.seed(rank)
+    return env
+
+def time_startup(create, num_envs):
+    start = time.perf_counter()
+    env = create(num_envs)
+    env.reset()
+    elapsed = time.perf_counter() - start
+    env.close()
+    return elapsed
+
+def percentiles(samples):
+    samples = np.asarray(samples) * 1000.0
+    return "p50 {:.2f} ms, p90 {:.2f} ms, p99 {:.2f} ms".format(*np.percentile(samples, [50, 90, 99]))
+
+def main():
+    parser = argparse.ArgumentParser(description="Measure env startup and reset latency.")
+    parser.add_argument("--num-envs", type=int, default=16)
+    parser.add_argument("--num-resets", type=int, default=200)
+    args = parser.parse_args()
+
+    # Cold start first: the main process must not own an emulator yet
+    cold = time_startup(lambda n: SubprocVecEnv([make_env(GAME, STATE, seed=i) for i in range(n)], start_method="fork"), args.num_envs)
+    print("Cold startup of {} envs: {:.2f} s".format(args.num_envs, cold))
+
+    pool = PrewarmedEnvPool(GAME, STATE, states=(OTHER_STATE,))
+    warm = time_startup(lambda n: SubprocVecEnv(pool.env_fns(n, wrap_prewarmed), start_method="fork"), args.num_envs)
+    print("Pre-warmed startup of {} envs: {:.2f} s".format(args.num_envs, warm))
+
+    # Reset latency on the parent's emulator, now that no worker is using it
+    env = pool.base_env
+    samples = []
+    for _ in range(args.num_resets):
+        start = time.perf_counter()
+        env.reset()
+        samples.append(time.perf_counter() - start)
+    print("retro reset: " + percentiles(samples))
+
+    samples = []
+    for _ in range(args.num_resets):
+        start = time.perf_counter()
+        env.load_state(OTHER_STATE)
+        env.reset()
+        samples.append(time.perf_counter() - start)
+    print("State switch from file: " + percentiles(samples))
+
+    samples = []
+    for _ in range(args.num_resets):
+        start = time.perf_counter()
+        pool.state_cache.restore(env, OTHER_STATE)
+        samples.append(time.perf_counter() - start)
+    print("State switch from cache: " + percentiles(samples))
+
+    pool.close()
+
+if __name__ == "__main__":
+    main()
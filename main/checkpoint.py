@@ -0,0 +1,250 @@
+import os
+import json
+import time
+import queue
+import zipfile
+import threading
+
+import numpy as np
+import torch as th
+from stable_baselines3.common.callbacks import BaseCallback
+from stable_baselines3.common.save_util import data_to_json, recursive_getattr, save_to_zip_file
+
+INDEX_NAME = "checkpoints.json"
+
+def _to_cpu(obj):
+    # Detached CPU copies of every tensor in a (nested) state dict
+    if isinstance(obj, th.Tensor):
+        return obj.detach().to("cpu", copy=True)
+    if isinstance(obj, dict):
+        return type(obj)((key, _to_cpu(value)) for key, value in obj.items())
+    if isinstance(obj, (list, tuple)):
+        return type(obj)(_to_cpu(value) for value in obj)
+    return obj
+
+def snapshot(model):
+    """
+    Captures what BaseAlgorithm.save writes: the serialized "data" entry plus
+    CPU copies of the policy and optimizer state dicts and the torch variables.
+    The result no longer references the model, so it can be written on
+    another thread while training goes on.
+    """
+    data = model.__dict__.copy()
+    exclude = set(model._excluded_save_params())
+    state_dicts_names, torch_variable_names = model._get_torch_save_params()
+    for torch_var in state_dicts_names + torch_variable_names:
+        exclude.add(torch_var.split(".")[0])
+    for name in exclude:
+        data.pop(name, None)
+
+    pytorch_variables = None
+    if torch_variable_names:
+        pytorch_variables = {name: _to_cpu(recursive_getattr(model, name)) for name in torch_variable_names}
+
+    return data_to_json(data), _to_cpu(model.get_parameters()), pytorch_variables
+
+def write_snapshot(path, serialized_data, params, pytorch_variables=None):
+    """
+    Writes a snapshot as a regular SB3 zip, loadable with PPO.load. The file
+    is written next to path and renamed over it, so readers never see a
+    partial checkpoint.
+    """
+    tmp_path = path + ".tmp"
+    save_to_zip_file(tmp_path, params=params, pytorch_variables=pytorch_variables)
+    # "data" is already serialized, append it instead of passing the dict
+    with zipfile.ZipFile(tmp_path, mode="a") as archive:
+        archive.writestr("data", serialized_data)
+    with open(tmp_path, "ab") as file:
+        os.fsync(file.fileno())
+    os.replace(tmp_path, path)
+
+def _write_json(path, obj):
+    tmp_path = path + ".tmp"
+    with open(tmp_path, "w") as file:
+        json.dump(obj, file, indent=2)
+    os.replace(tmp_path, path)
+
+def _episode_reward_mean(model):
+    # Rolling mean training episode reward over the Monitor stats of recent rounds
+    if not model.ep_info_buffer:
+        return None
+    return float(np.mean([info["r"] for info in model.ep_info_buffer]))
+
+# Evaluation score
+class EvalScore(object):
+    """
+    score_fn that plays n_eval_episodes rounds with evaluate_policy on an env
+    of its own (e.g. a state held out from training) and returns the mean
+    episode reward. AsyncCheckpointCallback calls score_checkpoint on its
+    writer thread with the written file, so training does not wait for the
+    rounds. The env is made on first use and kept open until close().
+    """
+    def __init__(self, env_fn, n_eval_episodes=2, deterministic=True, device="cpu"):
+        self.env_fn = env_fn
+        self.n_eval_episodes = n_eval_episodes
+        self.deterministic = deterministic
+        # Device of the checkpoint copies scored by score_checkpoint
+        self.device = device
+        self.env = None
+
+    def __call__(self, model):
+        from stable_baselines3.common.evaluation import evaluate_policy
+
+        if self.env is None:
+            self.env = self.env_fn()
+        mean_reward, _ = evaluate_policy(model, self.env, n_eval_episodes=self.n_eval_episodes,
+                                         deterministic=self.deterministic)
+        return float(mean_reward)
+
+    def score_checkpoint(self, path, algorithm):
+        """
+        Scores the checkpoint at path, loaded as a separate algorithm instance.
+        """
+        return self(algorithm.load(path, device=self.device))
+
+    def close(self):
+        if self.env is not None:
+            self.env.close()
+            self.env = None
+
+# Asynchronous checkpoint callback
+class AsyncCheckpointCallback(BaseCallback):
+    """
+    Drop-in replacement for CheckpointCallback. Every save_freq calls the
+    model is snapshotted in memory and a writer thread serializes it, so the
+    rollout workers only wait for the GPU to CPU copy.
+
+    Retention keeps the keep_last newest checkpoints plus the one with the
+    best score. score_fn(model) is evaluated at every save on the training
+    thread, so it must be cheap; the default is the rolling mean training
+    episode reward, which favors lucky rollouts. A score_fn with a
+    score_checkpoint(path, algorithm) method, e.g. an EvalScore, is instead
+    run by the writer thread on the written file, which enters the index
+    once it is scored. The list of kept checkpoints and their
+    scores is in save_path/checkpoints.json.
+    """
+    def __init__(self, save_freq, save_path, name_prefix="rl_model", keep_last=5, score_fn=_episode_reward_mean,
+                 verbose=0):
+        super(AsyncCheckpointCallback, self).__init__(verbose)
+        self.save_freq = save_freq
+        self.save_path = save_path
+        self.name_prefix = name_prefix
+        self.keep_last = keep_last
+        self.score_fn = score_fn
+        self.index_path = os.path.join(save_path, INDEX_NAME)
+
+        self.num_written = 0
+        self.num_deleted = 0
+        self.error = None
+
+        # At most one snapshot waits while another is written, a third save blocks
+        self._queue = queue.Queue(maxsize=1)
+        self._thread = None
+        self._index = None
+
+    def _init_callback(self):
+        os.makedirs(self.save_path, exist_ok=True)
+        self._index = self._load_index()
+        self._thread = threading.Thread(target=self._run, name="AsyncCheckpointWriter", daemon=True)
+        self._thread.start()
+
+    def _load_index(self):
+        # Continue the retention of a previous run saving into the same directory
+        if not os.path.exists(self.index_path):
+            return []
+        with open(self.index_path) as file:
+            entries = json.load(file)["checkpoints"]
+        return [entry for entry in entries if os.path.exists(os.path.join(self.save_path, entry["file"]))]
+
+    def _checkpoint_path(self):
+        return os.path.join(self.save_path, "{}_{}_steps.zip".format(self.name_prefix, self.num_timesteps))
+
+    def _on_step(self):
+        if self.n_calls % self.save_freq == 0:
+            self.save()
+        return True
+
+    def save(self):
+        """
+        Snapshots the model and queues it for writing.
+        """
+        if self.error is not None:
+            raise RuntimeError("Checkpoint writer failed") from self.error
+        start = time.perf_counter()
+        score = None
+        if self.score_fn is not None and not hasattr(self.score_fn, "score_checkpoint"):
+            score = self.score_fn(self.model)
+        entry = {
+            "file": os.path.basename(self._checkpoint_path()),
+            "timesteps": int(self.num_timesteps),
+            "score": score,
+            "time": time.time(),
+        }
+        self._queue.put((entry, snapshot(self.model)))
+        if self.verbose > 0:
+            print("Snapshotted {} in {:.3f}s".format(entry["file"], time.perf_counter() - start))
+
+    def _run(self):
+        while True:
+            item = self._queue.get()
+            try:
+                if item is None:
+                    return
+                entry, (serialized_data, params, pytorch_variables) = item
+                path = os.path.join(self.save_path, entry["file"])
+                write_snapshot(path, serialized_data, params, pytorch_variables)
+                self.num_written += 1
+                if hasattr(self.score_fn, "score_checkpoint"):
+                    start = time.perf_counter()
+                    entry["score"] = float(self.score_fn.score_checkpoint(path, type(self.model)))
+                    if self.verbose > 0:
+                        print("Scored {} in {:.3f}s: {:.3f}".format(entry["file"], time.perf_counter() - start,
+                                                                    entry["score"]))
+                self._index = [e for e in self._index if e["file"] != entry["file"]] + [entry]
+                self._apply_retention()
+            except Exception as error:
+                self.error = error
+            finally:
+                self._queue.task_done()
+
+    def _best(self):
+        scored = [entry for entry in self._index if entry["score"] is not None]
+        return max(scored, key=lambda entry: entry["score"]) if scored else None
+
+    def _apply_retention(self):
+        best = self._best()
+        keep = self._index[-self.keep_last:] if self.keep_last > 0 else []
+        if best is not None and best not in keep:
+            keep = [best] + keep
+        for entry in self._index:
+            if entry not in keep:
+                try:
+                    os.remove(os.path.join(self.save_path, entry["file"]))
+                    self.num_deleted += 1
+                except FileNotFoundError:
+                    pass
+        self._index = keep
+        _write_json(self.index_path, {
+            "checkpoints": keep,
+            "best": best["file"] if best is not None else None,
+            "latest": keep[-1]["file"] if keep else None,
+        })
+
+    def flush(self):
+        """
+        Waits until every queued checkpoint is on disk.
+        """
+        self._queue.join()
+        if self.error is not None:
+            raise RuntimeError("Checkpoint writer failed") from self.error
+
+    def _on_training_end(self):
+        if self._thread is not None:
+            self._queue.put(None)
+            self._thread.join()
+            self._thread = None
+        # After the writer, which may still be scoring with it
+        if hasattr(self.score_fn, "close"):
+            self.score_fn.close()
+        if self.error is not None:
+            raise RuntimeError("Checkpoint writer failed") from self.error
@@ -0,0 +1,216 @@
+import os
+import glob
+import json
+import inspect
+import argparse
+import importlib
+import importlib.util
+
+# Only the standard library is imported here: retro, torch and stable_baselines3
+# are imported by the module a subcommand runs, so listing states or checkpoints
+# stays instant.
+
+GAME = "StreetFighterIISpecialChampionEdition-Genesis"
+REPO_DATA_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), os.pardir, "data")
+CHECKPOINT_INDEX = "checkpoints.json" # checkpoint.INDEX_NAME, not imported to keep torch out
+
+def load_config(path):
+    """
+    Reads a JSON config with one section per subcommand, e.g.
+    {"train": {"total_timesteps": 2e6, "NUM_ENV": 16}, "play": {"state": "VsKen"}}.
+    Lowercase keys are arguments of the module's main(), uppercase keys
+    override the module's constants.
+    """
+    if path is None:
+        return {}
+    with open(path) as file:
+        return json.load(file)
+
+def parse_overrides(pairs):
+    # --set key=value, values are parsed as JSON and fall back to plain strings
+    overrides = {}
+    for pair in pairs or []:
+        key, sep, value = pair.partition("=")
+        if not sep:
+            raise SystemExit("--set expects key=value, got {!r}".format(pair))
+        try:
+            overrides[key] = json.loads(value)
+        except ValueError:
+            overrides[key] = value
+    return overrides
+
+def run_main(module_name, settings):
+    """
+    Imports module_name, applies the uppercase settings to its constants and
+    calls its main() with the rest. Unknown names fail before main() runs.
+    """
+    module = importlib.import_module(module_name)
+    parameters = inspect.signature(module.main).parameters
+    kwargs = {}
+    for key, value in settings.items():
+        if key.isupper():
+            if not hasattr(module, key):
+                raise SystemExit("{} has no constant {}".format(module_name, key))
+            setattr(module, key, value)
+        elif key in parameters:
+            kwargs[key] = value
+        else:
+            raise SystemExit("{}.main() has no argument {!r} (expected one of: {})".format(
+                module_name, key, ", ".join(parameters)))
+    return module.main(**kwargs)
+
+def merge(config, command, flags, overrides):
+    # Config section < --set < explicit flags
+    settings = dict(config.get(command, {}))
+    settings.update(overrides)
+    settings.update({key: value for key, value in flags.items() if value is not None})
+    return settings
+
+def retro_data_dirs(game):
+    """
+    Game data folders of the installed retro package, found without importing it.
+    """
+    spec = importlib.util.find_spec("retro")
+    if spec is None or not spec.submodule_search_locations:
+        return []
+    root = list(spec.submodule_search_locations)[0]
+    dirs = [os.path.join(root, "data", kind, game) for kind in ("stable", "experimental", "contrib")]
+    return [path for path in dirs if os.path.isdir(path)]
+
+def list_states(game):
+    states = []
+    for directory in retro_data_dirs(game) + [os.path.normpath(REPO_DATA_DIR)]:
+        for path in sorted(glob.glob(os.path.join(directory, "*.state"))):
+            states.append((os.path.basename(path)[:-len(".state")], directory))
+    return states
+
+def list_checkpoints(model_dir):
+    index = {}
+    index_path = os.path.join(model_dir, CHECKPOINT_INDEX)
+    if os.path.exists(index_path):
+        with open(index_path) as file:
+            index = json.load(file)
+    scores = {entry["file"]: entry.get("score") for entry in index.get("checkpoints", [])}
+
+    checkpoints = []
+    for path in sorted(glob.glob(os.path.join(model_dir, "*.zip")), key=os.path.getmtime):
+        name = os.path.basename(path)
+        tags = [tag for tag in ("best", "latest") if index.get(tag) == name]
+        checkpoints.append((name, os.path.getsize(path), scores.get(name), tags))
+    return checkpoints
+
+def cmd_states(args, config):
+    states = list_states(args.game)
+    if not states:
+        print("No states found for {} (is gym-retro installed?)".format(args.game))
+    for name, directory in states:
+        print("{:<40} {}".format(name, directory))
+
+def cmd_checkpoints(args, config):
+    checkpoints = list_checkpoints(args.model_dir)
+    if not checkpoints:
+        print("No checkpoints in {}".format(args.model_dir))
+    for name, size, score, tags in checkpoints:
+        score = "" if score is None else "{:.3f}".format(score)
+        print("{:<44} {:>8.1f} MB {:>10} {}".format(name, size / 1e6, score, " ".join(tags)))
+
+def cmd_train(args, config):
+    flags = {"game": args.game, "state": args.state, "total_timesteps": args.total_timesteps, "save_dir": args.save_dir}
+    run_main("train", merge(config, "train", flags, parse_overrides(args.set)))
+
+def cmd_play(args, config):
+    if args.realtime:
+        # Fixed 60Hz play with audio (game.py), driven by Fighter or an exported engine
+        flags = {"game": args.game, "state": args.state, "engine_path": args.engine}
+        run_main("game", merge(config, "play", flags, parse_overrides(args.set)))
+        return
+    flags = {
+        "game": args.game,
+        "state": args.state,
+        "model_name": args.model,
+        "model_dir": args.model_dir,
+        "engine_path": args.engine,
+        "num_episodes": args.episodes,
+        "random_action": args.random or None,
+        "deterministic": args.deterministic or None,
+        "rendering": False if args.no_render else None,
+    }
+    run_main("test", merge(config, "play", flags, parse_overrides(args.set)))
+
+def cmd_eval(args, config):
+    flags = {
+        "game": args.game,
+        "state": args.state,
+        "model_path": args.model,
+        "n_eval_episodes": args.episodes,
+        "deterministic": args.deterministic or None,
+    }
+    run_main("evaluate", merge(config, "eval", flags, parse_overrides(args.set)))
+
+def cmd_bench(args, config):
+    # Everything after "bench" goes to benchmark.py, or to sweep.py with --sweep
+    module = importlib.import_module("sweep" if args.sweep else "benchmark")
+    argv = list(config.get("bench", {}).get("args", [])) + args.extra
+    module.main(argv)
+
+def build_parser():
+    parser = argparse.ArgumentParser(description="Train, play, evaluate and benchmark the Street Fighter agent.")
+    parser.add_argument("--config", default=None, help="JSON file with a section per subcommand")
+    subparsers = parser.add_subparsers(dest="command")
+    subparsers.required = True
+
+    def add_common(subparser):
+        subparser.add_argument("--game", default=None)
+        subparser.add_argument("--state", default=None)
+        subparser.add_argument("--set", action="append", metavar="KEY=VALUE",
+                               help="Override a main() argument or an uppercase module constant")
+
+    train = subparsers.add_parser("train", help="Train a PPO agent (train.py)")
+    add_common(train)
+    train.add_argument("--total-timesteps", type=int, default=None)
+    train.add_argument("--save-dir", default=None)
+    train.set_defaults(func=cmd_train)
+
+    play = subparsers.add_parser("play", help="Play rounds with a model or random actions (test.py, game.py)")
+    add_common(play)
+    play.add_argument("--model", default=None, help="Checkpoint name inside --model-dir")
+    play.add_argument("--model-dir", default=None)
+    play.add_argument("--engine", default=None, help="Model exported by inference.py")
+    play.add_argument("--episodes", type=int, default=None)
+    play.add_argument("--random", action="store_true", help="Random actions, e.g. to check the reward")
+    play.add_argument("--deterministic", action="store_true")
+    play.add_argument("--no-render", action="store_true")
+    play.add_argument("--realtime", action="store_true", help="Fixed 60Hz play with audio")
+    play.set_defaults(func=cmd_play)
+
+    evaluate = subparsers.add_parser("eval", help="Evaluate a checkpoint (evaluate.py)")
+    add_common(evaluate)
+    evaluate.add_argument("--model", default=None, help="Checkpoint path")
+    evaluate.add_argument("--episodes", type=int, default=None)
+    evaluate.add_argument("--deterministic", action="store_true")
+    evaluate.set_defaults(func=cmd_eval)
+
+    bench = subparsers.add_parser("bench", help="Benchmark the env (benchmark.py) or sweep checkpoints (sweep.py), "
+                                                "other flags are passed on")
+    bench.add_argument("--sweep", action="store_true")
+    bench.set_defaults(func=cmd_bench)
+
+    states = subparsers.add_parser("states", help="List the save states available to retro.make")
+    states.add_argument("--game", default=GAME)
+    states.set_defaults(func=cmd_states)
+
+    checkpoints = subparsers.add_parser("checkpoints", help="List saved checkpoints")
+    checkpoints.add_argument("--model-dir", default="trained_models")
+    checkpoints.set_defaults(func=cmd_checkpoints)
+    return parser
+
+def main(argv=None):
+    parser = build_parser()
+    args, extra = parser.parse_known_args(argv)
+    if extra and args.command != "bench":
+        parser.error("unrecognized arguments: {}".format(" ".join(extra)))
+    args.extra = extra
+    args.func(args, load_config(args.config))
+
+if __name__ == "__main__":
+    main()
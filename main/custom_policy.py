@@ -1,17 +1,18 @@
 from stable_baselines3.common.torch_layers import BaseFeaturesExtractor
-from stable_baselines3.common.policies import ActorCriticPolicy
-from stable_baselines3 import PPO
+from sb3_contrib.common.recurrent.policies import RecurrentActorCriticCnnPolicy
 import torch as th
 import torch.nn as nn
 import gym
 
-class CustomCnnLstmExtractor(BaseFeaturesExtractor):
+class CustomCnnExtractor(BaseFeaturesExtractor):
     def __init__(self, observation_space: gym.spaces.Box, features_dim: int = 256):
-        super(CustomCnnLstmExtractor, self).__init__(observation_space, features_dim)
+        super(CustomCnnExtractor, self).__init__(observation_space, features_dim)
 
-        # CNN Layers
+        # CNN Layers. SB3 hands over channel-first observations, the channel count
+        # depends on the observation pipeline (3 for RGB, 1 for grayscale, ...)
+        n_input_channels = observation_space.shape[0]
         self.cnn = nn.Sequential(
-            nn.Conv2d(3, 32, kernel_size=8, stride=4, padding=0),
+            nn.Conv2d(n_input_channels, 32, kernel_size=8, stride=4, padding=0),
             nn.ReLU(),
             nn.Conv2d(32, 64, kernel_size=4, stride=2, padding=0),
             nn.ReLU(),
@@ -20,22 +21,44 @@ class CustomCnnLstmExtractor(BaseFeaturesExtractor):
             nn.Flatten(),
         )
 
-        # Calculate the CNN output size to feed into LSTM
+        # Calculate the CNN output size to feed into the linear layer
         with th.no_grad():
             n_flatten = self.cnn(th.as_tensor(observation_space.sample()[None]).float()).shape[1]
 
-        # LSTM Layer
-        self.lstm = nn.LSTM(n_flatten, features_dim, batch_first=True)
+        self.linear = nn.Sequential(nn.Linear(n_flatten, features_dim), nn.ReLU())
 
     def forward(self, observations: th.Tensor):
-        cnn_out = self.cnn(observations)
-        cnn_out = cnn_out.unsqueeze(0)  # Add sequence dimension
-        lstm_out, _ = self.lstm(cnn_out)
-        return lstm_out.squeeze(0)  # Remove sequence dimension
+        return self.linear(self.cnn(observations))
 
-# Custom policy with the LSTM feature extractor
-class CustomLstmPolicy(ActorCriticPolicy):
+# Recurrent actor-critic with the CNN feature extractor, trained with sb3_contrib.RecurrentPPO.
+# The LSTM sits between the features and the policy/value heads. RecurrentPPO keeps the
+# hidden state of every env across steps, zeroes it when an episode starts, and its
+# rollout buffer splits the rollout into per-episode sequences that are padded and fed
+# through the LSTM in one batched call per minibatch (truncated BPTT over n_steps).
+class CustomLstmPolicy(RecurrentActorCriticCnnPolicy):
     def __init__(self, *args, **kwargs):
-        super(CustomLstmPolicy, self).__init__(*args, **kwargs,
-                                               features_extractor_class=CustomCnnLstmExtractor,
-                                               features_extractor_kwargs=dict(features_dim=256))
+        kwargs.setdefault("features_extractor_class", CustomCnnExtractor)
+        kwargs.setdefault("features_extractor_kwargs", dict(features_dim=256))
+        kwargs.setdefault("lstm_hidden_size", 256)
+        super(CustomLstmPolicy, self).__init__(*args, **kwargs)
+
+    @staticmethod
+    def _process_sequence(features, lstm_states, episode_starts, lstm):
+        """
+        sb3_contrib steps through the sequence one timestep at a time as soon as
+        any episode_start is set. The rollout buffer cuts sequences at episode
+        starts, so they only ever sit on the first timestep (and data collection
+        has one timestep per env). Zeroing those states up front gives the same
+        result with a single LSTM call over the whole minibatch.
+        """
+        n_seq = lstm_states[0].shape[1]
+        starts = episode_starts.reshape((n_seq, -1)).swapaxes(0, 1)
+        if th.any(starts[1:] != 0.0):
+            # An episode starts inside a sequence, keep the per-step loop
+            return RecurrentActorCriticCnnPolicy._process_sequence(features, lstm_states, episode_starts, lstm)
+
+        keep = (1.0 - starts[0]).view(1, n_seq, 1)
+        lstm_states = (keep * lstm_states[0], keep * lstm_states[1])
+        features_sequence = features.reshape((n_seq, -1, lstm.input_size)).swapaxes(0, 1)
+        lstm_output, lstm_states = lstm(features_sequence, lstm_states)
+        return th.flatten(lstm_output.transpose(0, 1), start_dim=0, end_dim=1), lstm_states
@@ -0,0 +1,110 @@
+import bisect
+import collections
+
+from fighter import CharacterYPosition
+
+# Bucket edges that line up with Fighter's thresholds (distance 40, 100-105,
+# 150 and enemy y 105-130 or on the ground), so cached Fighter decisions are
+# exactly the ones Fighter would make.
+FIGHTER_DISTANCE_EDGES = (40, 100, 106, 150)
+FIGHTER_Y_EDGES = (106, 130, CharacterYPosition.GROUND.value, CharacterYPosition.GROUND.value + 1)
+
+def uniform_edges(step, limit=400):
+    """
+    Edges for evenly sized buckets, e.g. for keys of a CNN policy that has no thresholds to line up with.
+    """
+    return tuple(range(step, limit, step))
+
+# Bounded LRU decision cache
+class DecisionCache(object):
+    """
+    Memoizes decisions (macro indices, actions, logits) under a quantized
+    RAM state: distance bucket, both y buckets, both status codes and facing.
+    Least recently used entries are evicted past max_size.
+    """
+    def __init__(self, max_size=4096, distance_edges=FIGHTER_DISTANCE_EDGES, y_edges=FIGHTER_Y_EDGES):
+        self.max_size = max_size
+        self.distance_edges = tuple(distance_edges)
+        self.y_edges = tuple(y_edges)
+
+        self._entries = collections.OrderedDict()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def __len__(self):
+        return len(self._entries)
+
+    def key(self, info):
+        """
+        Quantized state of retro's info dict or a RamDecoder record.
+        """
+        agent_x = int(info['agent_x'])
+        enemy_x = int(info['enemy_x'])
+        return (
+            bisect.bisect_right(self.distance_edges, abs(enemy_x - agent_x)),
+            bisect.bisect_right(self.y_edges, int(info['agent_y'])),
+            bisect.bisect_right(self.y_edges, int(info['enemy_y'])),
+            int(info['agent_status']),
+            int(info['enemy_status']),
+            agent_x < enemy_x,
+        )
+
+    def lookup(self, key, compute):
+        """
+        Returns the cached value for key, or stores and returns compute().
+        """
+        value = self._entries.get(key)
+        if value is not None:
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return value
+        self.misses += 1
+        value = compute()
+        self._entries[key] = value
+        if len(self._entries) > self.max_size:
+            self._entries.popitem(last=False)
+            self.evictions += 1
+        return value
+
+    def clear(self):
+        self._entries.clear()
+
+    def stats(self):
+        lookups = self.hits + self.misses
+        return {
+            "size": len(self._entries),
+            "hits": self.hits,
+            "misses": self.misses,
+            "evictions": self.evictions,
+            "hit_rate": self.hits / lookups if lookups else 0.0,
+        }
+
+class CachedPolicy(object):
+    """
+    Wraps an SB3 model or an inference.InferenceEngine behind the same
+    predict(). info_fn returns the RAM state of the current observation
+    (e.g. lambda: env.prev_info), None skips the cache.
+
+    Deterministic actions are cached for both. For stochastic play an engine's
+    logits are cached and sampled per call; an SB3 model is not cached.
+    Recurrent policies carry hidden state and must not be wrapped.
+    """
+    def __init__(self, model, cache, info_fn):
+        self.model = model
+        self.cache = cache
+        self.info_fn = info_fn
+        self.bypassed = 0
+
+    def predict(self, obs, state=None, episode_start=None, deterministic=False):
+        info = self.info_fn()
+        engine = hasattr(self.model, "act_from_logits")
+        if info is None or not (deterministic or engine):
+            self.bypassed += 1
+            return self.model.predict(obs, state=state, episode_start=episode_start, deterministic=deterministic)
+
+        key = self.cache.key(info)
+        if engine:
+            logits = self.cache.lookup(key + ("logits",), lambda: self.model.logits(obs[None]))
+            return self.model.act_from_logits(logits, deterministic)[0], None
+        return self.cache.lookup(key + ("action",), lambda: self.model.predict(obs, deterministic=True)[0]), None
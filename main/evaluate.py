@@ -10,6 +10,8 @@
 # limitations under the License.
 # ==============================================================================
 
+import os
+
 import retro
 
 from stable_baselines3 import PPO
@@ -17,13 +19,17 @@ from stable_baselines3.common.vec_env import DummyVecEnv
 from stable_baselines3.common.monitor import Monitor
 from stable_baselines3.common.evaluation import evaluate_policy
 
-from street_fighter_custom_wrapper import StreetFighterCustomWrapper
+from train import build_wrapper, load_wrapper_settings
 
 RESET_ROUND = True # Reset the round when fight is over. 
 RENDERING = False
 MODEL_PATH = r"trained_models/ppo_ryu_2000000_steps"
+GAME = "StreetFighterIISpecialChampionEdition-Genesis"
+STATE = "Champion.Level12.RyuVsBison"
 
-def make_env(game, state):
+def make_env(game, state, settings=None):
+    # The wrapper settings of the checkpoints, see train.load_wrapper_settings
+    settings = load_wrapper_settings(os.path.dirname(MODEL_PATH)) if settings is None else settings
     def _init():
         env = retro.make(
             game=game, 
@@ -31,16 +37,24 @@ def make_env(game, state):
             use_restricted_actions=retro.Actions.FILTERED, 
             obs_type=retro.Observations.IMAGE
         )
-        env = StreetFighterCustomWrapper(env, reset_round=RESET_ROUND, rendering=RENDERING)
+        env = build_wrapper(env, reset_round=RESET_ROUND, rendering=RENDERING, **settings)
         env = Monitor(env)
         return env
     return _init
 
-game = "StreetFighterIISpecialChampionEdition-Genesis"
-env = make_env(game, state="Champion.Level12.RyuVsBison")()
-model = PPO("CnnPolicy", env)
-model.load(MODEL_PATH)
-mean_reward, std_reward = evaluate_policy(model, env, render=False, n_eval_episodes=5, deterministic=False, return_episode_rewards=True)
-print(mean_reward)
-print(std_reward)
-# print(f"Reward: {mean_reward:.2f} +/- {std_reward:.2f}")
+def main(model_path=None, game=None, state=None, n_eval_episodes=5, deterministic=False):
+    model_path = MODEL_PATH if model_path is None else model_path
+    game = GAME if game is None else game
+    state = STATE if state is None else state
+    env = make_env(game, state=state, settings=load_wrapper_settings(os.path.dirname(model_path)))()
+    model = PPO.load(model_path, env=env)
+    episode_rewards, episode_lengths = evaluate_policy(model, env, render=False, n_eval_episodes=n_eval_episodes,
+                                                       deterministic=deterministic, return_episode_rewards=True)
+    env.close()
+    print(episode_rewards)
+    print(episode_lengths)
+    # print(f"Reward: {mean_reward:.2f} +/- {std_reward:.2f}")
+    return episode_rewards, episode_lengths
+
+if __name__ == "__main__":
+    main()
@@ -1,5 +1,10 @@
-import numpy as np
+import logging
 from enum import Enum
+from types import MappingProxyType
+
+import numpy as np
+
+logger = logging.getLogger(__name__)
 
 class Punch(Enum):
     LP = 9
@@ -38,17 +43,213 @@ class CharacterYPosition(Enum):
     GROUND = 192  # 地面高度
     MAX_HEIGHT = 67  # 跳躍的最高點高度
 
+# Move macros are built once at import time. Every button array in the table is
+# read-only and shared, so picking a move is a dict lookup with no allocation.
+def _diagonal_jump_kick_sequence(button, facing_right):
+    """
+    返回執行對角線跳踢（Diagonal Jumping Kick）的按鍵序列。
+    """
+    sequence = []
+    action = np.zeros(12, dtype=np.uint8)
+
+    # 1. 向上並向右/左跳躍
+    action[4] = 1  # 按下 ↑ (UP) 來跳躍
+    if facing_right:
+        action[7] = 1  # 按下 → (Right) 來向右跳
+    else:
+        action[6] = 1  # 按下 ← (Left) 來向左跳
+    sequence.append(action.copy())  # 添加到序列: 按一下 ↑ 和 → 或 ←
+
+    # 2. 在空中按下踢擊鍵
+    action[4] = 0  # 釋放 ↑
+    action[button.value] = 1  # 按下 High Kick (HK) 按鍵
+    sequence.append(action.copy())  # 添加到序列: 按一下 HK
+
+    # 3. 結束跳踢
+    action[button.value] = 0  # 釋放 HK
+    if facing_right:
+        action[7] = 0  # 釋放 →
+    else:
+        action[6] = 0  # 釋放 ←
+    sequence.append(action.copy())  # 添加到序列: 釋放所有按鍵
+
+    return sequence
+
+def _jump_kick_sequence(button, facing_right):
+    """
+    返回執行跳踢（High Kick, HK）的按鍵序列。
+    """
+    sequence = []
+    action = np.zeros(12, dtype=np.uint8)
+
+    # 1. 跳躍
+    action[4] = 1  # 按下 ↑ (UP) 來跳躍
+    sequence.append(action.copy())  # 添加到序列: 按一下 ↑
+
+    # 2. 在空中按下踢擊鍵
+    action[4] = 0  # 釋放 ↑，模擬跳躍開始
+    action[button.value] = 1
+    sequence.append(action.copy())  # 添加到序列: 按一下 MK
+
+    # 3. 結束跳踢
+    action[Kick.HK.value] = 0  # 釋放 HK
+    sequence.append(action.copy())  # 添加到序列: 釋放按鍵
+
+    return sequence
+
+def _attack_sequence(button, facing_right):
+    sequence = []
+    action = np.zeros(12, dtype=np.uint8)
+
+    if facing_right:
+        action[7] = 1
+    else:
+        action[6] = 1
+    sequence.append(action.copy())
+
+    action[button.value] = 1
+    sequence.append(action.copy())
+
+    return sequence
+
+def _hadouken_sequence(button, facing_right):
+    """
+    返回執行波動拳（Hadouken）的按鍵序列。
+    面向右邊：↓ ↘ → + 拳，面向左邊：↓ ↙ ← + 拳
+    """
+    sequence = []
+    action = np.zeros(12, dtype=np.uint8)
+    forward = 7 if facing_right else 6
+
+    action[5] = 1  # 按下 ↓ (DOWN)
+    sequence.append(action.copy())  # 按一下 ↓
+
+    action[forward] = 1  # 同時按下前方向鍵和 ↓，形成 ↘ 或 ↙
+    sequence.append(action.copy())  # 按一下 ↘ 或 ↙
+
+    action[5] = 0  # 放開 ↓，只保持前方向鍵
+    sequence.append(action.copy())  # 按一下 → 或 ←
+
+    action[forward] = 0  # 放開前方向鍵
+    action[button.value] = 1
+    sequence.append(action.copy())  # 按一下 拳
+
+    return sequence
+
+def _shoryuken_sequence(button, facing_right):
+    """
+    返回執行昇龍拳（Shoryuken）的按鍵序列。
+    面向右邊：→ ↓ ↘ + 拳，面向左邊：← ↓ ↙ + 拳
+    """
+    sequence = []
+    action = np.zeros(12, dtype=np.uint8)
+    forward = 7 if facing_right else 6
+
+    action[forward] = 1  # 按下前方向鍵
+    sequence.append(action.copy())  # 按一下 → 或 ←
+
+    action[forward] = 0  # 釋放前方向鍵
+    action[5] = 1  # 按下 ↓ (DOWN)
+    sequence.append(action.copy())  # 按一下 ↓
+
+    action[forward] = 1  # 同時按下前方向鍵和 ↓，形成 ↘ 或 ↙
+    sequence.append(action.copy())  # 按一下 ↘ 或 ↙
+
+    action[5] = 0  # 釋放 ↓
+    action[button.value] = 1
+    sequence.append(action.copy())  # 按一下 拳
+
+    return sequence
+
+def _defense_sequence(button, facing_right):
+    """
+    返回執行防禦（Defense）的按鍵序列，根據角色面向方向。
+    """
+    action = np.zeros(12, dtype=np.uint8)
+
+    if facing_right:
+        # 面向右邊時，按下 ← (LEFT) 進行防禦
+        action[6] = 1  # 按下 ← (LEFT)
+    else:
+        # 面向左邊時，按下 → (RIGHT) 進行防禦
+        action[7] = 1  # 按下 → (RIGHT)
+
+    return [action]
+
+def _hurricane_kick_sequence(button, facing_right):
+    """
+    返回執行龙卷旋风脚（Hurricane Kick）的按鍵序列。
+    面向右邊：↓ ↙ ← + 脚，面向左邊：↓ ↘ → + 脚
+    """
+    sequence = []
+    action = np.zeros(12, dtype=np.uint8)
+    back = 6 if facing_right else 7
+
+    action[5] = 1  # 按下 ↓ (DOWN)
+    sequence.append(action.copy())  # 按一下 ↓
+
+    action[back] = 1  # 同時按下後方向鍵和 ↓，形成 ↙ 或 ↘
+    sequence.append(action.copy())  # 按一下 ↙ 或 ↘
+
+    action[5] = 0  # 釋放 ↓，只保持後方向鍵
+    sequence.append(action.copy())  # 按一下 ← 或 →
+
+    action[back] = 0  # 釋放後方向鍵
+    action[button.value] = 1
+    sequence.append(action.copy())  # 按一下 脚
+
+    return sequence
+
+_MOVE_BUILDERS = {
+    "diagonal_jump_kick": (_diagonal_jump_kick_sequence, (Kick.HK,)),
+    "jump_kick": (_jump_kick_sequence, (Kick.MK,)),
+    "attack": (_attack_sequence, tuple(Punch)),
+    "hadouken": (_hadouken_sequence, tuple(Punch)),
+    "shoryuken": (_shoryuken_sequence, tuple(Punch)),
+    "defense": (_defense_sequence, (None,)),
+    "hurricane_kick": (_hurricane_kick_sequence, tuple(Kick)),
+}
+
+def _build_move_table():
+    table = {}
+    for move, (builder, buttons) in _MOVE_BUILDERS.items():
+        for button in buttons:
+            for facing_right in (True, False):
+                sequence = builder(button, facing_right)
+                for action in sequence:
+                    action.flags.writeable = False
+                table[(move, button, facing_right)] = tuple(sequence)
+    return MappingProxyType(table)
+
+# (move, button, facing_right) -> tuple of read-only button arrays
+MOVE_TABLE = _build_move_table()
+
+# The same macros by index, shared by VecFighter and discrete macro actions
+MACRO_KEYS = tuple(MOVE_TABLE)
+MACRO_TABLE = tuple(MOVE_TABLE[key] for key in MACRO_KEYS)
+MACRO_INDEX = MappingProxyType({key: i for i, key in enumerate(MACRO_KEYS)})
+
 class Fighter:
     def __init__(self, info):
-        if info != None:
-            self.agent_x = info.get('agent_x', 0)
-            self.enemy_x = info.get('enemy_x', 0)
-            self.agent_y = info.get('agent_y', 0)
-            self.enemy_y = info.get('enemy_y', 0)
+        self.update(info)
+
+    def update(self, info):
+        """
+        Loads the RAM variables of the last frame. The same Fighter is reused
+        across steps, so no object is built per decision.
+        """
+        if info is not None:
+            # info is retro's info dict or RamDecoder.to_dict's. A RamDecoder record
+            # works too, but indexing it field by field is slower than converting
+            # it once; int() keeps unsigned record fields from wrapping on subtraction
+            self.agent_x = int(info['agent_x'])
+            self.enemy_x = int(info['enemy_x'])
+            self.agent_y = int(info['agent_y'])
+            self.enemy_y = int(info['enemy_y'])
             self.is_facing_right = self.agent_x < self.enemy_x
             self._distance = abs(self.enemy_x - self.agent_x)
-            self.agent_status = info.get('agent_status', 0)
-            self.enemy_status = info.get('enemy_status', 0)
+            self.agent_status = int(info['agent_status'])
+            self.enemy_status = int(info['enemy_status'])
         else:
             self.agent_x = 0
             self.enemy_x = 0
@@ -59,21 +260,24 @@ class Fighter:
             self.agent_status = Status.STANDING.value
             self.enemy_status = Status.STANDING.value
             
-    def get_best_move(self):
-        sequence = None
-        
-        #print(f"Distance: {self.distance}")
+    def get_best_macro(self):
+        """
+        Returns the (move, button, facing_right) key of the best macro.
+        """
+        if logger.isEnabledFor(logging.DEBUG):
+            logger.debug("Distance: %s", self.distance)
         
         if self.is_enemy_jumping and (self.distance >= 100 and self.distance <= 105):
-            sequence = self.shoryuken_sequence(Punch.HP)
+            return ("shoryuken", Punch.HP, self.is_facing_right)
         elif self.distance >= 150 and not self.is_enemy_stun:
-            sequence = self.hadouken_sequence(Punch.MP)
+            return ("hadouken", Punch.MP, self.is_facing_right)
         elif self.is_enemy_standing and self.distance < 40:
-            sequence = self.attack_sequence(Punch.LP)
+            return ("attack", Punch.LP, self.is_facing_right)
         else:
-            sequence = self.defense_sequence()
-            
-        return sequence
+            return ("defense", None, self.is_facing_right)
+
+    def get_best_move(self):
+        return MOVE_TABLE[self.get_best_macro()]
             
     @property
     def distance(self):
@@ -85,7 +289,9 @@ class Fighter:
     
     @property   
     def is_enemy_jumping(self):
-        print(f"agent_status:{self.agent_status} enemy_status:{self.enemy_status} y:{self.enemy_y} x:{self.enemy_x}")
+        if logger.isEnabledFor(logging.DEBUG):
+            logger.debug("agent_status:%s enemy_status:%s y:%s x:%s",
+                         self.agent_status, self.enemy_status, self.enemy_y, self.enemy_x)
         return self.enemy_y > 105 and self.enemy_y < 130\
             or self.enemy_status == Status.JUMPING.value
     
@@ -96,210 +302,80 @@ class Fighter:
     @property
     def is_enemy_stun(self):
         return self.enemy_status == Status.HIT_STUN.value
+
+    def move_sequence(self, move, button=None):
+        return MOVE_TABLE[(move, button, self.is_facing_right)]
     
     def diagonal_jump_kick_sequence(self):
-        """
-        返回執行對角線跳踢（Diagonal Jumping Kick）的按鍵序列。
-        """
-        sequence = []
-        action = np.array([0] * 12)
-
-        # 1. 向上並向右/左跳躍
-        action[4] = 1  # 按下 ↑ (UP) 來跳躍
-        if self.is_facing_right:
-            action[7] = 1  # 按下 → (Right) 來向右跳
-        else:
-            action[6] = 1  # 按下 ← (Left) 來向左跳
-        sequence.append(action.copy())  # 添加到序列: 按一下 ↑ 和 → 或 ←
-        
-        # 2. 在空中按下踢擊鍵
-        action[4] = 0  # 釋放 ↑
-        if self.is_facing_right:
-            action[7] = 1  # 保持 → (Right)
-        else:
-            action[6] = 1  # 保持 ← (Left)
-        action[Kick.HK.value] = 1  # 按下 High Kick (HK) 按鍵
-        sequence.append(action.copy())  # 添加到序列: 按一下 HK
-
-        # 3. 結束跳踢
-        action[Kick.HK.value] = 0  # 釋放 HK
-        if self.is_facing_right:
-            action[7] = 0  # 釋放 →
-        else:
-            action[6] = 0  # 釋放 ←
-        sequence.append(action.copy())  # 添加到序列: 釋放所有按鍵
-
-        return sequence
+        return MOVE_TABLE[("diagonal_jump_kick", Kick.HK, self.is_facing_right)]
 
     def jump_kick_sequence(self):
-        """
-        返回執行跳踢（High Kick, HK）的按鍵序列。
-        """
-        sequence = []
-        action = np.array([0] * 12)
-
-        # 1. 跳躍
-        action[4] = 1  # 按下 ↑ (UP) 來跳躍
-        sequence.append(action.copy())  # 添加到序列: 按一下 ↑
-
-        # 2. 在空中按下踢擊鍵
-        action[4] = 0  # 釋放 ↑，模擬跳躍開始
-        action[Kick.MK.value] = 1
-        sequence.append(action.copy())  # 添加到序列: 按一下 HK
-
-        # 3. 結束跳踢
-        action[Kick.HK.value] = 0  # 釋放 HK
-        sequence.append(action.copy())  # 添加到序列: 釋放按鍵
-        
-        return sequence
-
+        return MOVE_TABLE[("jump_kick", Kick.MK, self.is_facing_right)]
 
     def attack_sequence(self, punch):
-        sequence = []
-        action = np.array([0] * 12)
-                          
-        if self.is_facing_right:
-            action[7] = 1
-            
-        else:
-            action[6] = 1
-        sequence.append(action.copy())
-        
-        action[punch.value] = 1
-        sequence.append(action.copy())
-        
-        return sequence
+        return MOVE_TABLE[("attack", punch, self.is_facing_right)]
 
     def hadouken_sequence(self, punch):
-        """
-        返回執行波動拳（Hadouken）的按鍵序列。
-        """
-        sequence = []
-        action = np.array([0] * 12)
-
-        if self.is_facing_right:
-            # 面向右邊的波動拳：↓ ↘ → + 拳
-            action[5] = 1  # 按下 ↓ (DOWN)
-            sequence.append(action.copy())  # 按一下 ↓
-
-            action[7] = 1  # 同時按下 → (RIGHT) 和 ↓，形成 ↘
-            sequence.append(action.copy())  # 按一下 ↘
-
-            action[5] = 0  # 放開 ↓，只保持 →
-            sequence.append(action.copy())  # 按一下 →
-
-            action[7] = 0  # 放開 →
-            action[punch.value] = 1
-            sequence.append(action.copy())  # 按一下 拳
-        else:
-            # 面向左邊的波動拳：↓ ↙ ← + 拳
-            action[5] = 1  # 按下 ↓ (DOWN)
-            sequence.append(action.copy())  # 按一下 ↓
-
-            action[6] = 1  # 同時按下 ← (LEFT) 和 ↓，形成 ↙
-            sequence.append(action.copy())  # 按一下 ↙
-
-            action[5] = 0  # 放開 ↓，只保持 ←
-            sequence.append(action.copy())  # 按一下 ←
-
-            action[6] = 0  # 放開 ←
-            action[punch.value] = 1
-            sequence.append(action.copy())  # 按一下 拳
-
-        return sequence
+        return MOVE_TABLE[("hadouken", punch, self.is_facing_right)]
 
     def shoryuken_sequence(self, punch):
-        """
-        返回執行昇龍拳（Shoryuken）的按鍵序列。
-        """
-        sequence = []
-        action = np.array([0] * 12)
-
-        if self.is_facing_right:
-            # 面向右邊的昇龍拳：→ ↓ ↘ + 拳
-            action[7] = 1  # 按下 → (RIGHT)
-            sequence.append(action.copy())  # 按一下 →
-
-            action[7] = 0  # 釋放 →
-            action[5] = 1  # 按下 ↓ (DOWN)
-            sequence.append(action.copy())  # 按一下 ↓
-
-            action[7] = 1  # 同時按下 → (RIGHT) 和 ↓，形成 ↘
-            sequence.append(action.copy())  # 按一下 ↘
-
-            action[5] = 0  # 釋放 ↓
-            action[punch.value] = 1
-            sequence.append(action.copy())  # 按一下 拳
-        else:
-            # 面向左邊的昇龍拳：← ↓ ↙ + 拳
-            action[6] = 1  # 按下 ← (LEFT)
-            sequence.append(action.copy())  # 按一下 ←
-
-            action[6] = 0  # 釋放 ←
-            action[5] = 1  # 按下 ↓ (DOWN)
-            sequence.append(action.copy())  # 按一下 ↓
-
-            action[6] = 1  # 同時按下 ← (LEFT) 和 ↓，形成 ↙
-            sequence.append(action.copy())  # 按一下 ↙
-
-            action[5] = 0  # 釋放 ↓
-            action[punch.value] = 1
-            sequence.append(action.copy())  # 按一下 拳
-
-        return sequence
+        return MOVE_TABLE[("shoryuken", punch, self.is_facing_right)]
 
     def defense_sequence(self):
-        """
-        返回執行防禦（Defense）的按鍵序列，根據角色面向方向。
-        """
-        sequence = []
-        action = np.array([0] * 12)
-
-        if self.is_facing_right:
-            # 面向右邊時，按下 ← (LEFT) 進行防禦
-            action[6] = 1  # 按下 ← (LEFT)
-        else:
-            # 面向左邊時，按下 → (RIGHT) 進行防禦
-            action[7] = 1  # 按下 → (RIGHT)
-
-        sequence.append(action.copy())
-        return sequence
+        return MOVE_TABLE[("defense", None, self.is_facing_right)]
 
     def hurricane_kick_sequence(self, kick):
+        return MOVE_TABLE[("hurricane_kick", kick, self.is_facing_right)]
+
+# Batched scripted decisions
+class VecFighter:
+    """
+    Makes the Fighter decision for many environments in one NumPy pass.
+
+    Takes the RAM state of every env as a RamDecoder record array (or any
+    mapping of equally shaped arrays) and returns indices into MACRO_TABLE.
+    The rules are the same as Fighter.get_best_macro.
+    """
+    # Rule order of get_best_macro, the last one is the fallback
+    RULES = (("shoryuken", Punch.HP), ("hadouken", Punch.MP), ("attack", Punch.LP), ("defense", None))
+
+    def __init__(self):
+        # [rule, facing_right] -> macro index
+        self.macro_index = np.array(
+            [[MACRO_INDEX[(move, button, facing_right)] for facing_right in (False, True)] for move, button in self.RULES],
+            dtype=np.intp)
+
+        # Decision taken without any RAM state, e.g. right after reset
+        self.default_macro = MACRO_INDEX[Fighter(None).get_best_macro()]
+
+    def get_best_moves(self, ram, valid=None):
         """
-        返回執行龙卷旋风脚（Hurricane Kick）的按鍵序列。
+        Returns the macro index of every env. Envs where `valid` is False get
+        the decision Fighter makes without RAM state.
         """
-        sequence = []
-        action = np.array([0] * 12)
-
-        if self.is_facing_right:
-            # 面向右邊的龙卷旋风脚：↓ ↙ ← + 脚
-            action[5] = 1  # 按下 ↓ (DOWN)
-            sequence.append(action.copy())  # 按一下 ↓
-
-            action[6] = 1  # 同時按下 ← (LEFT) 和 ↓，形成 ↙
-            sequence.append(action.copy())  # 按一下 ↙
-
-            action[5] = 0  # 釋放 ↓，只保持 ←
-            sequence.append(action.copy())  # 按一下 ←
-
-            action[6] = 0  # 釋放 ←
-            action[kick.value] = 1
-            sequence.append(action.copy())  # 按一下 脚
-        else:
-            # 面向左邊的龙卷旋风脚：↓ ↘ → + 脚
-            action[5] = 1  # 按下 ↓ (DOWN)
-            sequence.append(action.copy())  # 按一下 ↓
-
-            action[7] = 1  # 同時按下 → (RIGHT) 和 ↓，形成 ↘
-            sequence.append(action.copy())  # 按一下 ↘
-
-            action[5] = 0  # 釋放 ↓，只保持 →
-            sequence.append(action.copy())  # 按一下 →
-
-            action[7] = 0  # 釋放 →
-            action[kick.value] = 1
-            sequence.append(action.copy())  # 按一下 脚
-
-        return sequence
-
+        agent_x = np.asarray(ram['agent_x'], dtype=np.int32)
+        enemy_x = np.asarray(ram['enemy_x'], dtype=np.int32)
+        enemy_y = np.asarray(ram['enemy_y'], dtype=np.int32)
+        enemy_status = np.asarray(ram['enemy_status'], dtype=np.int32)
+
+        facing_right = agent_x < enemy_x
+        distance = np.abs(enemy_x - agent_x)
+
+        is_enemy_jumping = ((enemy_y > 105) & (enemy_y < 130)) | (enemy_status == Status.JUMPING.value)
+        is_enemy_stun = enemy_status == Status.HIT_STUN.value
+        is_enemy_standing = enemy_y == CharacterYPosition.GROUND.value
+
+        # First matching rule wins, like the if/elif chain. Nested np.where rather than
+        # np.select, which stable_baselines3 1.7's `np.bool = bool` patch breaks on NumPy 2
+        rule = np.where(is_enemy_jumping & (distance >= 100) & (distance <= 105), 0,
+                        np.where((distance >= 150) & ~is_enemy_stun, 1,
+                                 np.where(is_enemy_standing & (distance < 40), 2, 3)))
+        macros = self.macro_index[rule, facing_right.astype(np.intp)]
+
+        if valid is not None:
+            macros = np.where(valid, macros, self.default_macro)
+        return macros
+
+    @staticmethod
+    def sequences(macros):
+        return [MACRO_TABLE[i] for i in macros]
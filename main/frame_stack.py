@@ -0,0 +1,69 @@
+import numpy as np
+
+from observation import ObservationPipeline
+
+# Ring buffer frame stack
+class FrameStack:
+    """
+    Keeps the last `num_frames` screens and builds the stacked observation.
+
+    Output channel i is channel i of the frame `lags[i]` steps back from the
+    newest one (frames 2, 5 and 8 of the 9 kept). Frames are held by reference,
+    so pushing costs nothing; only the channel each slot contributes is
+    gathered, straight into one preallocated uint8 observation buffer.
+    """
+    def __init__(self, num_frames=9, stride=3, shape=(100, 128, 3), pipeline=None):
+        self.num_frames = num_frames
+        self.stride = stride
+        self.shape = shape
+        # Crops, downsamples and picks the plane each output channel contributes
+        self.pipeline = pipeline if pipeline is not None else ObservationPipeline(size=shape[:2])
+
+        # Lag of the frame (0 = newest) each output channel is taken from
+        self.lags = tuple(num_frames - 1 - (i * stride + stride - 1) for i in range(shape[2]))
+
+        self._frames = [None] * num_frames
+        self._head = 0
+
+        self._obs = np.zeros(shape, dtype=np.uint8)
+        self._obs_view = self._obs.view()
+        self._obs_view.flags.writeable = False
+
+    def clear(self):
+        self._frames = [None] * self.num_frames
+        self._head = 0
+
+    def fill(self, frame):
+        for i in range(self.num_frames):
+            self._frames[i] = frame
+        self._head = 0
+
+    def push(self, frame):
+        self._frames[self._head] = frame
+        self._head = (self._head + 1) % self.num_frames
+
+    def frame(self, lag):
+        return self._frames[(self._head - 1 - lag) % self.num_frames]
+
+    def is_consumed(self, lag):
+        """
+        Whether a frame `lag` pushes before the next read can reach the output,
+        assuming every read is separated by a multiple of `stride` pushes.
+        Frames that cannot may be pushed as None and never captured.
+        """
+        max_lag = max(self.lags)
+        return lag <= max_lag and (max_lag - lag) % self.stride == 0
+
+    def observation(self, copy=True):
+        """
+        Gathers the stacked observation into the preallocated buffer.
+
+        With copy=False the buffer itself is returned as a read-only view; it
+        is overwritten by the next call, so the caller must not keep it.
+        """
+        for channel, lag in enumerate(self.lags):
+            self.pipeline.plane(self.frame(lag), channel, self._obs[:, :, channel])
+
+        if copy:
+            return self._obs.copy()
+        return self._obs_view
@@ -1,10 +1,11 @@
 # 設置遊戲和狀態
 from street_fighter_custom_wrapper import StreetFighterCustomWrapper
 from stable_baselines3.common.monitor import Monitor
+from realtime import RealtimeRunner
+from renderer import AsyncRenderer
+from audio import AudioPump
 import retro
-import pyaudio
-import time
-import matplotlib.pyplot as plt
+import json
 
 game = "StreetFighterIISpecialChampionEdition-Genesis"
 state = "Champion.Level12.RyuVsBison"
@@ -12,69 +13,67 @@ state = "VsKen"
 #state = "VsChunli"
 #state = "VsRyu"
 
+# 以 inference.py 匯出的模型出招 (需以 MACRO_ACTION="hybrid" 訓練)，None 則由 Fighter 出招
+ENGINE_PATH = None
+LEAD_FRAMES = 3 # 招式結束前幾幀開始推論，推論趕不上時改由 Fighter 出招
+
 def make_env(game, state, seed=0):
     def _init():
         env = retro.make(
-            game=game, 
-            state=state, 
-            use_restricted_actions=retro.Actions.FILTERED, 
-            obs_type=retro.Observations.IMAGE    
+            game=game,
+            state=state,
+            use_restricted_actions=retro.Actions.FILTERED,
+            obs_type=retro.Observations.IMAGE
         )
 
-        env = StreetFighterCustomWrapper(env, rendering=True)
+        # 每個 step 只跑一幀，由 RealtimeRunner 以固定 60Hz 推進
+        env = StreetFighterCustomWrapper(env, step_frames=1, macro_action="hybrid")
         env = Monitor(env)
         env.seed(seed)
         return env
     return _init
 
-# 創建環境初始化函數
-env_fn = make_env(game, state)
-
-# 初始化環境
-env = env_fn()
+def main(game=None, state=None, engine_path=None, lead_frames=None):
+    # 未指定的參數取模組層級的設定，執行時修改的設定 (例如 cli.py --set) 也會生效
+    game = globals()["game"] if game is None else game
+    state = globals()["state"] if state is None else state
+    engine_path = ENGINE_PATH if engine_path is None else engine_path
+    lead_frames = LEAD_FRAMES if lead_frames is None else lead_frames
 
-# 測試環境
-observation = env.reset()
-done = False
+    # 創建環境初始化函數
+    env_fn = make_env(game, state)
 
-def get_time():
-    return time.time()
+    # 初始化環境
+    env = env_fn()
 
-frame_time = 1.0 / 60.0
-p = pyaudio.PyAudio()
-audio_rate = env.em.get_audio_rate()
-stream = p.open(format = pyaudio.paInt16,
-                channels=2,
-                rate=int(audio_rate),
-                output=True)
+    policy = None
+    if engine_path is not None:
+        from inference import InferenceEngine
+        engine = InferenceEngine(engine_path)
+        policy = lambda obs: engine.predict(obs, deterministic=True)[0]
 
-last_time = get_time()
+    # 每幀的聲音放進環形緩衝區，由 PyAudio 的回呼執行緒播放，不會卡住模擬
+    audio_rate = env.em.get_audio_rate()
+    audio = AudioPump(audio_rate)
 
-# 無窮迴圈直到關閉視窗
-try:
-    while True:
-        action = env.action_space.sample()  # 使用隨機動作
-        observation, reward, done, info = env.step(action)        
+    renderer = AsyncRenderer()
+    runner = RealtimeRunner(env, policy=policy, fps=60.0, lead_frames=lead_frames, renderer=renderer, on_frame=audio.push)
 
-        if done:
-            observation = env.reset()  # 如果遊戲結束，重置環境重新開始            
+    # 無窮迴圈直到關閉視窗
+    try:
+        runner.run()
+    except KeyboardInterrupt:
+        # 捕捉 Ctrl+C 信號以平滑關閉
+        print("遊戲已停止。")
+    finally:
+        # 錯過期限次數與延遲分布
+        print(json.dumps(runner.stats(), indent=2))
+        print(json.dumps(audio.stats(), indent=2))
+        runner.close()
+        renderer.close()
+        # close audio stream
+        audio.close()
+        env.close()  # 確保在關閉時釋放資源
 
-        current_time = get_time()
-        time_diff = current_time - last_time
-        if time_diff < frame_time:
-           time.sleep(frame_time - time_diff)
-        last_time = current_time
-        
-        env.render()  # 渲染遊戲畫面
-        
-        # play audio sample for this frame
-        #sound = bytes(env.em.get_audio())
-        #stream.write(frames=sound)
-except KeyboardInterrupt:
-    # 捕捉 Ctrl+C 信號以平滑關閉
-    print("遊戲已停止。")
-finally:
-    # close audio stream
-    stream.close()
-    p.terminate()
-    env.close()  # 確保在關閉時釋放資源
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,194 @@
+import os
+import json
+import time
+import argparse
+
+import numpy as np
+import torch as th
+import torch.nn as nn
+
+META_FILE = "meta.json"
+
+class LeanPolicy(nn.Module):
+    """
+    The actor half of an SB3 ActorCriticPolicy as a plain module.
+
+    Takes a (batch, height, width, channels) uint8 observation batch straight
+    from the env: the HWC -> CHW transpose and the /255 scaling happen inside
+    the module, so they are traced with it. Returns the action logits.
+    """
+    def __init__(self, policy):
+        super(LeanPolicy, self).__init__()
+        self.features_extractor = policy.features_extractor
+        self.policy_net = policy.mlp_extractor.policy_net
+        self.action_net = policy.action_net
+        self.scale = 1.0 / 255.0 if policy.normalize_images else 1.0
+
+    def forward(self, obs: th.Tensor) -> th.Tensor:
+        x = obs.permute(0, 3, 1, 2).float() * self.scale
+        return self.action_net(self.policy_net(self.features_extractor(x)))
+
+def _action_meta(action_space):
+    import gym
+    if isinstance(action_space, gym.spaces.MultiBinary):
+        return {"kind": "multi_binary", "n": int(np.prod(action_space.n))}
+    if isinstance(action_space, gym.spaces.Discrete):
+        return {"kind": "discrete", "n": int(action_space.n)}
+    if isinstance(action_space, gym.spaces.MultiDiscrete):
+        return {"kind": "multi_discrete", "nvec": [int(n) for n in action_space.nvec]}
+    raise ValueError("Unsupported action space {}".format(action_space))
+
+def export(model_path, output_path, fmt="torchscript", quantize=False, batch_size=1):
+    """
+    Exports the actor of a PPO checkpoint for inference.
+
+    fmt is "torchscript" (.pt) or "onnx" (.onnx). With quantize, the linear
+    layers get dynamic int8 quantization (torch's dynamic quantization does
+    not cover convolutions; for ONNX onnxruntime quantizes what it supports).
+    """
+    from stable_baselines3 import PPO
+    from stable_baselines3.common.preprocessing import is_image_space_channels_first
+
+    model = PPO.load(model_path, device="cpu")
+    policy = model.policy
+    module = LeanPolicy(policy).eval()
+    meta = _action_meta(model.action_space)
+    if fmt == "torchscript" and quantize:
+        module = th.quantization.quantize_dynamic(module, {nn.Linear}, dtype=th.qint8)
+    meta["quantized"] = bool(quantize)
+
+    # SB3 trains image policies on transposed (CHW) observations, the env gives HWC
+    if not is_image_space_channels_first(model.observation_space):
+        raise ValueError("Expected a channel-first policy, got {}".format(model.observation_space.shape))
+    channels, height, width = model.observation_space.shape
+    meta["obs_shape"] = [height, width, channels]
+    example = th.zeros((batch_size, height, width, channels), dtype=th.uint8)
+
+    with th.no_grad():
+        if fmt == "torchscript":
+            traced = th.jit.trace(module, example)
+            traced = th.jit.freeze(traced) if not quantize else traced
+            th.jit.save(traced, output_path, _extra_files={META_FILE: json.dumps(meta)})
+        elif fmt == "onnx":
+            th.onnx.export(module, example, output_path, input_names=["obs"], output_names=["logits"],
+                           dynamic_axes={"obs": {0: "batch"}, "logits": {0: "batch"}}, opset_version=13)
+            if quantize:
+                from onnxruntime.quantization import quantize_dynamic, QuantType
+                quantize_dynamic(output_path, output_path, weight_type=QuantType.QInt8)
+            with open(output_path + ".json", "w") as f:
+                json.dump(meta, f)
+        else:
+            raise ValueError("Unknown format {}".format(fmt))
+    return output_path
+
+# Lean inference engine
+class InferenceEngine:
+    """
+    Runs an exported policy. act() takes a uint8 observation batch and returns
+    a batch of actions; predict() mirrors model.predict for one observation so
+    play loops can use either.
+
+    num_threads sets the ONNX session's thread count. For TorchScript it calls
+    th.set_num_threads, which applies to all torch code in the process, so
+    leave it None when the engine shares a process with training.
+    """
+    def __init__(self, path, num_threads=None, seed=None):
+        self.rng = np.random.default_rng(seed)
+        if path.endswith(".onnx"):
+            import onnxruntime
+            options = onnxruntime.SessionOptions()
+            if num_threads is not None:
+                options.intra_op_num_threads = num_threads
+            self._session = onnxruntime.InferenceSession(path, options, providers=["CPUExecutionProvider"])
+            self._module = None
+            with open(path + ".json") as f:
+                self.meta = json.load(f)
+        else:
+            if num_threads is not None:
+                th.set_num_threads(num_threads)
+            extra_files = {META_FILE: ""}
+            self._module = th.jit.load(path, map_location="cpu", _extra_files=extra_files)
+            self._module.eval()
+            self._session = None
+            self.meta = json.loads(extra_files[META_FILE])
+
+    def logits(self, obs_batch):
+        obs_batch = np.ascontiguousarray(obs_batch, dtype=np.uint8)
+        if self._session is not None:
+            return self._session.run(None, {"obs": obs_batch})[0]
+        with th.inference_mode():
+            return self._module(th.from_numpy(obs_batch)).numpy()
+
+    def act(self, obs_batch, deterministic=True):
+        return self.act_from_logits(self.logits(obs_batch), deterministic)
+
+    def act_from_logits(self, logits, deterministic=True):
+        kind = self.meta["kind"]
+        if kind == "multi_binary":
+            if deterministic:
+                return (logits > 0).astype(np.int64)
+            probs = 1.0 / (1.0 + np.exp(-logits))
+            return (self.rng.random(probs.shape) < probs).astype(np.int64)
+        if kind == "discrete":
+            return self._choose(logits, deterministic)
+        splits = np.split(logits, np.cumsum(self.meta["nvec"])[:-1], axis=1)
+        return np.stack([self._choose(split, deterministic) for split in splits], axis=1)
+
+    def _choose(self, logits, deterministic):
+        if deterministic:
+            return logits.argmax(axis=1)
+        # Gumbel-max sampling from the categorical distribution
+        return (logits - np.log(-np.log(self.rng.random(logits.shape)))).argmax(axis=1)
+
+    def predict(self, obs, state=None, episode_start=None, deterministic=False):
+        return self.act(obs[None], deterministic=deterministic)[0], None
+
+def benchmark(model_path, engine_path, batch_sizes=(1, 16, 64), repeat=200):
+    """
+    Compares per-decision latency of model.predict and the exported engine.
+    """
+    from stable_baselines3 import PPO
+
+    model = PPO.load(model_path, device="cpu")
+    engine = InferenceEngine(engine_path)
+    shape = tuple(engine.meta["obs_shape"])
+    results = {}
+
+    def measure(fn, obs):
+        for _ in range(10):
+            fn(obs)
+        start = time.perf_counter()
+        for _ in range(repeat):
+            fn(obs)
+        return (time.perf_counter() - start) / repeat
+
+    for batch_size in batch_sizes:
+        obs = np.random.randint(0, 256, size=(batch_size,) + shape, dtype=np.uint8)
+        sb3 = measure(lambda o: model.predict(o, deterministic=True), obs)
+        lean = measure(lambda o: engine.act(o), obs)
+        results[batch_size] = (sb3, lean)
+        print("batch {:>3}: predict {:8.3f} ms, engine {:8.3f} ms, {:5.2f}x, {:9.1f} obs/s".format(
+            batch_size, sb3 * 1e3, lean * 1e3, sb3 / lean, batch_size / lean))
+    return results
+
+def main():
+    parser = argparse.ArgumentParser(description="Export a PPO checkpoint into a lean CPU inference module.")
+    parser.add_argument("model", help="PPO checkpoint (.zip)")
+    parser.add_argument("--output", default=None, help="Defaults to the checkpoint name with .pt or .onnx")
+    parser.add_argument("--format", choices=["torchscript", "onnx"], default="torchscript")
+    parser.add_argument("--quantize", action="store_true", help="Dynamic int8 quantization of linear layers")
+    parser.add_argument("--benchmark", action="store_true")
+    args = parser.parse_args()
+
+    output = args.output
+    if output is None:
+        suffix = (".int8" if args.quantize else "") + (".pt" if args.format == "torchscript" else ".onnx")
+        output = os.path.splitext(args.model)[0] + suffix
+    export(args.model, output, fmt=args.format, quantize=args.quantize)
+    print("Exported to {}".format(output))
+
+    if args.benchmark:
+        benchmark(args.model, output)
+
+if __name__ == "__main__":
+    main()
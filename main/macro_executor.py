@@ -0,0 +1,69 @@
+import collections
+
+class MacroExecutor(object):
+    """
+    Plays a macro (a sequence of moves, each held for num_step_frames frames)
+    a bounded number of frames at a time. A new macro replaces whatever is
+    left of the current one, so the caller can react before a long macro
+    such as a hadouken has finished.
+    """
+    def __init__(self, num_step_frames=6):
+        self.num_step_frames = num_step_frames
+
+        # Index of the macro being played, None when idle
+        self.macro = None
+        self.num_started = 0
+        self.num_cancelled = 0
+
+        self._moves = collections.deque()
+        # Frames left of the move at the head of the queue
+        self._frames_left = 0
+
+    @property
+    def idle(self):
+        return not self._moves
+
+    @property
+    def pending_frames(self):
+        if not self._moves:
+            return 0
+        return self._frames_left + (len(self._moves) - 1) * self.num_step_frames
+
+    def start(self, sequence, macro=None):
+        """
+        Queues sequence, dropping the rest of the current macro.
+        """
+        if self._moves:
+            self.num_cancelled += 1
+        self._moves = collections.deque(sequence)
+        self._frames_left = self.num_step_frames
+        self.macro = macro
+        self.num_started += 1
+
+    def cancel(self):
+        if self._moves:
+            self.num_cancelled += 1
+        self._moves.clear()
+        self._frames_left = 0
+        self.macro = None
+
+    def advance(self, max_frames=None):
+        """
+        Takes up to max_frames frames (the whole macro when None) off the
+        queue as [(move, num_frames), ...]. Never runs past the end of the
+        current macro, so the caller gets to decide again at its boundary.
+        """
+        runs = []
+        budget = max_frames if max_frames is not None else self.pending_frames
+        while budget > 0 and self._moves:
+            frames = min(budget, self._frames_left)
+            runs.append((self._moves[0], frames))
+            budget -= frames
+            self._frames_left -= frames
+            if self._frames_left == 0:
+                self._moves.popleft()
+                self._frames_left = self.num_step_frames
+        if not self._moves:
+            self._frames_left = 0
+            self.macro = None
+        return runs
@@ -0,0 +1,108 @@
+import numpy as np
+
+# ITU-R BT.601 luma weights
+GRAY_WEIGHTS = np.array([0.299, 0.587, 0.114], dtype=np.float32)
+
+# retro crops the screen with data/scenario.json's "crop" [x, y, w, h] in get_screen,
+# so env frames are already 200x256. `crop` below is relative to that frame.
+FRAME_SHAPE = (200, 256, 3)
+
+def _area_matrix(n_in, n_out):
+    """
+    (n_out, n_in) weights averaging every input pixel an output pixel covers.
+    """
+    scale = n_in / n_out
+    edges = np.arange(n_out + 1) * scale
+    pixels = np.arange(n_in)
+    overlap = np.minimum(edges[1:, None], pixels[None, :] + 1) - np.maximum(edges[:-1, None], pixels[None, :])
+    return (np.clip(overlap, 0, None) / scale).astype(np.float32)
+
+# Observation preprocessing
+class ObservationPipeline:
+    """
+    Turns one env frame into the planes the frame stack stacks.
+
+    crop: (x, y, w, h) region of the frame to keep, or None.
+    size: (height, width) of the output planes, e.g. (100, 128) or (84, 84).
+    mode: "stride" samples every n-th pixel (the old obs[::2, ::2]), "area"
+          averages every pixel an output pixel covers, with a reshape-mean when
+          the sizes divide evenly and two small matrix products otherwise.
+    grayscale: every stacked plane is the luma of its frame instead of one
+          color channel.
+
+    The default reproduces the original 100x128 strided RGB observation.
+    """
+    def __init__(self, size=(100, 128), mode="stride", grayscale=False, crop=None, frame_shape=FRAME_SHAPE):
+        if mode not in ("stride", "area"):
+            raise ValueError("Unknown downsampling mode {}".format(mode))
+        self.size = tuple(size)
+        self.mode = mode
+        self.grayscale = grayscale
+        self.crop = tuple(crop) if crop is not None else None
+
+        if self.crop is not None:
+            x, y, w, h = self.crop
+            if x < 0 or y < 0 or x + w > frame_shape[1] or y + h > frame_shape[0]:
+                raise ValueError("Crop {} is outside the {} frame".format(self.crop, frame_shape))
+            self._rows, self._cols = slice(y, y + h), slice(x, x + w)
+            in_h, in_w = h, w
+        else:
+            in_h, in_w = frame_shape[:2]
+        out_h, out_w = self.size
+        if out_h > in_h or out_w > in_w:
+            raise ValueError("Output size {} is larger than the input {}".format(self.size, (in_h, in_w)))
+
+        self._factors = None
+        if in_h % out_h == 0 and in_w % out_w == 0:
+            self._factors = (in_h // out_h, in_w // out_w)
+        elif mode == "stride":
+            # Nearest pixel sampling for sizes that do not divide evenly
+            self._row_index = ((np.arange(out_h) + 0.5) * in_h / out_h).astype(np.intp)
+            self._col_index = ((np.arange(out_w) + 0.5) * in_w / out_w).astype(np.intp)
+        else:
+            self._row_weights = _area_matrix(in_h, out_h)
+            self._col_weights = _area_matrix(in_w, out_w).T.copy()
+
+    def output_shape(self, num_planes=3):
+        return self.size + (num_planes,)
+
+    def _cropped(self, frame):
+        if self.crop is None:
+            return frame
+        return frame[self._rows, self._cols]
+
+    def plane(self, frame, channel, out):
+        """
+        Writes output plane `channel` of `frame` into `out`.
+        """
+        frame = self._cropped(frame)
+
+        if self.mode == "stride":
+            if self._factors is not None:
+                fh, fw = self._factors
+                sampled = frame[::fh, ::fw]
+            else:
+                sampled = frame[self._row_index][:, self._col_index]
+            if self.grayscale:
+                # Sample first, then convert only the kept pixels
+                np.copyto(out, np.rint(sampled @ GRAY_WEIGHTS), casting="unsafe")
+            else:
+                np.copyto(out, sampled[:, :, channel])
+            return out
+
+        source = frame @ GRAY_WEIGHTS if self.grayscale else frame[:, :, channel]
+        if self._factors is not None:
+            fh, fw = self._factors
+            out_h, out_w = self.size
+            blocks = source.reshape(out_h, fh, out_w, fw)
+            if self.grayscale:
+                np.copyto(out, np.rint(blocks.mean(axis=(1, 3))), casting="unsafe")
+            else:
+                # Integer sums with rounding, no float pass over the frame
+                count = fh * fw
+                sums = blocks.sum(axis=(1, 3), dtype=np.uint32)
+                np.copyto(out, (sums + count // 2) // count, casting="unsafe")
+        else:
+            resized = self._row_weights @ source.astype(np.float32) @ self._col_weights
+            np.copyto(out, np.rint(resized), casting="unsafe")
+        return out
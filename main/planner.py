@@ -0,0 +1,207 @@
+import time
+import functools
+import collections
+import multiprocessing
+
+import numpy as np
+
+from fighter import MACRO_KEYS, MACRO_TABLE
+from ram_decoder import RamDecoder
+
+GAME = "StreetFighterIISpecialChampionEdition-Genesis"
+
+# RAM fields that describe a position, the timer and score are left out so
+# the same position reached at another time shares a cache entry
+POSITION_FIELDS = ("agent_hp", "agent_x", "agent_y", "agent_status", "enemy_hp", "enemy_x", "enemy_y", "enemy_status")
+
+def make_retro_env(game=GAME, state="Champion.Level12.RyuVsBison"):
+    import retro
+
+    return retro.make(
+        game=game,
+        state=state,
+        use_restricted_actions=retro.Actions.FILTERED,
+        obs_type=retro.Observations.IMAGE
+    )
+
+# Each worker process owns one emulator (retro allows only one per process)
+_worker_env = None
+_worker_masks = {}
+_worker_generation = None
+
+def _init_worker(env_fn, generation):
+    global _worker_env, _worker_generation
+    _worker_env = env_fn()
+    _worker_env.reset()
+    _worker_generation = generation
+
+def _button_mask(move):
+    key = bytes(move)
+    mask = _worker_masks.get(key)
+    if mask is None:
+        mask = _worker_env.action_to_array(move)[0]
+        _worker_masks[key] = mask
+    return mask
+
+def _simulate(task):
+    """
+    Restores the snapshot, plays one macro plus horizon_frames idle frames
+    and scores the HP change. Returns a None score once the planner has
+    moved on to another plan (a newer generation).
+    """
+    generation, state, macro, num_step_frames, horizon_frames, reward_coeff = task
+    if _worker_generation.value != generation:
+        return macro, None
+    em = _worker_env.em
+    data = _worker_env.data
+
+    em.set_state(state)
+    data.reset()
+    data.update_ram()
+    before = dict(data.lookup_all())
+
+    for move in MACRO_TABLE[macro]:
+        if _worker_generation.value != generation:
+            return macro, None
+        mask = _button_mask(move)
+        em.set_button_mask(mask, 0)
+        for _ in range(num_step_frames):
+            em.step()
+    # Release the buttons and let the macro play out
+    em.set_button_mask(np.zeros_like(mask), 0)
+    for _ in range(horizon_frames):
+        em.step()
+    data.update_ram()
+    after = dict(data.lookup_all())
+
+    enemy_damage = before["enemy_hp"] - after["enemy_hp"]
+    agent_damage = before["agent_hp"] - after["agent_hp"]
+    return macro, reward_coeff * enemy_damage - agent_damage
+
+# Lookahead planner
+class LookaheadPlanner(object):
+    """
+    Picks a macro by simulating every candidate from a save state of the
+    live emulator in a pool of worker emulators, scored by HP delta like the
+    reward. Simulations still running when the time budget is spent are
+    ignored; with no result at all the fallback (Fighter's choice) is played.
+
+    Every plan is a generation: simulations of an earlier plan that have not
+    finished by its deadline see the generation change and stop, so late
+    work never queues up in front of the next plan.
+
+    Complete plans are kept in an LRU transposition cache keyed by the
+    position RAM fields. The key does not cover every byte of emulator state
+    (animation timers, projectiles), so a hit reuses the plan of a position
+    that looks the same.
+
+    The planner owns a process pool, so it must live in the main process
+    (test.py's PLANNER, or an in-process env). Daemonic processes such as
+    SubprocVecEnv or ShmVecEnv workers cannot start one and raise.
+    """
+    def __init__(self, env_fn=make_retro_env, num_workers=4, budget=0.05, horizon_frames=12, num_step_frames=6,
+                 reward_coeff=3.0, cache_size=4096, ram_decoder=None):
+        self.budget = budget
+        self.horizon_frames = horizon_frames
+        self.num_step_frames = num_step_frames
+        self.reward_coeff = reward_coeff
+        self.cache_size = cache_size
+        self.ram_decoder = ram_decoder if ram_decoder is not None else RamDecoder.from_json()
+
+        if multiprocessing.current_process().daemon:
+            raise RuntimeError("LookaheadPlanner starts a process pool and cannot be created in a daemonic "
+                               "process such as a vector env worker")
+
+        self.cache = collections.OrderedDict()
+        self.num_plans = 0
+        self.num_hits = 0
+        self.num_partial = 0
+        self.num_fallbacks = 0
+        self.num_cancelled = 0
+        self.plan_time = 0.0
+
+        # spawn: a forked child would inherit the parent's emulator and could not create its own
+        context = multiprocessing.get_context("spawn")
+        self.generation = context.Value("i", 0, lock=False)
+        self.pool = context.Pool(num_workers, initializer=_init_worker, initargs=(env_fn, self.generation))
+
+    def position_key(self, retro_env):
+        record = self.ram_decoder.decode(retro_env.get_ram())
+        return tuple(int(record[name]) for name in POSITION_FIELDS)
+
+    def candidates(self, facing_right):
+        return [i for i, key in enumerate(MACRO_KEYS) if key[2] == facing_right]
+
+    def plan(self, retro_env, facing_right, fallback):
+        """
+        Returns the index of the best macro to play from the current position.
+        """
+        start = time.perf_counter()
+        self.num_plans += 1
+
+        key = self.position_key(retro_env) + (facing_right,)
+        best = self.cache.get(key)
+        if best is not None:
+            self.cache.move_to_end(key)
+            self.num_hits += 1
+            self.plan_time += time.perf_counter() - start
+            return best
+
+        state = retro_env.em.get_state()
+        candidates = self.candidates(facing_right)
+        generation = self.generation.value
+        results = [
+            self.pool.apply_async(_simulate, ((generation, state, macro, self.num_step_frames, self.horizon_frames,
+                                               self.reward_coeff),))
+            for macro in candidates
+        ]
+
+        deadline = start + self.budget
+        scores = {}
+        for result in results:
+            remaining = deadline - time.perf_counter()
+            if remaining > 0:
+                result.wait(remaining)
+            if result.ready():
+                macro, score = result.get()
+                if score is not None:
+                    scores[macro] = score
+        if len(scores) < len(candidates):
+            # Stop what is left of this plan before the next one is queued
+            self.generation.value = generation + 1
+            self.num_cancelled += len(candidates) - len(scores)
+
+        if not scores:
+            self.num_fallbacks += 1
+            best = fallback
+        else:
+            # Ties keep Fighter's choice when it is among the best
+            top = max(scores.values())
+            best = fallback if scores.get(fallback) == top else max(scores, key=scores.get)
+            if len(scores) == len(candidates):
+                self.cache[key] = best
+                if len(self.cache) > self.cache_size:
+                    self.cache.popitem(last=False)
+            else:
+                self.num_partial += 1
+
+        self.plan_time += time.perf_counter() - start
+        return best
+
+    def stats(self):
+        return {
+            "plans": self.num_plans,
+            "cache_hits": self.num_hits,
+            "cache_size": len(self.cache),
+            "partial_plans": self.num_partial,
+            "fallbacks": self.num_fallbacks,
+            "cancelled_simulations": self.num_cancelled,
+            "mean_plan_ms": 1000.0 * self.plan_time / self.num_plans if self.num_plans else 0.0,
+        }
+
+    def close(self):
+        self.pool.terminate()
+        self.pool.join()
+
+def make_planner(game=GAME, state="Champion.Level12.RyuVsBison", **kwargs):
+    return LookaheadPlanner(functools.partial(make_retro_env, game, state), **kwargs)
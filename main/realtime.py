@@ -0,0 +1,260 @@
+import time
+import bisect
+import threading
+
+import numpy as np
+
+# Upper bounds of the latency histogram buckets in milliseconds, the last bucket is open
+LATENCY_BUCKETS_MS = (1, 2, 4, 8, 12, 16.7, 25, 33.3, 50, 100)
+
+class LatencyHistogram(object):
+    """
+    Fixed-bucket latency histogram, cheap enough to update every frame.
+    """
+    def __init__(self, buckets_ms=LATENCY_BUCKETS_MS):
+        self.buckets_ms = tuple(buckets_ms)
+        self.counts = [0] * (len(self.buckets_ms) + 1)
+        self.count = 0
+        self.total = 0.0
+        self.max = 0.0
+
+    def record(self, seconds):
+        self.counts[bisect.bisect_left(self.buckets_ms, seconds * 1000.0)] += 1
+        self.count += 1
+        self.total += seconds
+        self.max = max(self.max, seconds)
+
+    def percentile(self, q):
+        # Upper bound of the bucket holding the q-th percentile
+        if self.count == 0:
+            return 0.0
+        rank = q / 100.0 * self.count
+        seen = 0
+        for bound, count in zip(self.buckets_ms, self.counts):
+            seen += count
+            if seen >= rank:
+                return bound
+        return float("inf")
+
+    def summary(self):
+        labels = ["<={:g}ms".format(bound) for bound in self.buckets_ms] + [">{:g}ms".format(self.buckets_ms[-1])]
+        return {
+            "count": self.count,
+            "mean_ms": 1000.0 * self.total / self.count if self.count else 0.0,
+            "max_ms": 1000.0 * self.max,
+            "p50_ms": self.percentile(50),
+            "p99_ms": self.percentile(99),
+            "buckets": dict(zip(labels, self.counts)),
+        }
+
+class InferenceWorker(object):
+    """
+    Runs policy(obs) -> action on a thread. Observations are copied into one
+    of two buffers; the caller only writes the buffer the worker is not
+    reading, and at most one request is in flight.
+    """
+    def __init__(self, policy, obs_shape, obs_dtype=np.uint8):
+        self.policy = policy
+        self.latency = LatencyHistogram()
+
+        self._buffers = [np.zeros(obs_shape, dtype=obs_dtype), np.zeros(obs_shape, dtype=obs_dtype)]
+        self._back = 0
+        self._condition = threading.Condition()
+        self._request = None
+        self._result = None
+        self._busy = False
+        self._closed = False
+
+        self._thread = threading.Thread(target=self._run, name="InferenceWorker", daemon=True)
+        self._thread.start()
+
+    @property
+    def busy(self):
+        return self._busy
+
+    def submit(self, obs, request_id):
+        """
+        Queues inference on a copy of obs. Returns False while the previous
+        request is still running.
+        """
+        with self._condition:
+            if self._busy:
+                return False
+            buffer = self._buffers[self._back]
+            np.copyto(buffer, obs)
+            self._back = 1 - self._back
+            self._request = (request_id, buffer)
+            self._busy = True
+            self._condition.notify()
+        return True
+
+    def poll(self):
+        """
+        Returns (request_id, action) of the last finished request once, or None.
+        """
+        with self._condition:
+            result, self._result = self._result, None
+        return result
+
+    def close(self):
+        with self._condition:
+            self._closed = True
+            self._condition.notify()
+        self._thread.join(timeout=1.0)
+
+    def _run(self):
+        while True:
+            with self._condition:
+                while self._request is None and not self._closed:
+                    self._condition.wait()
+                if self._closed:
+                    return
+                request_id, obs = self._request
+                self._request = None
+            start = time.perf_counter()
+            action = int(self.policy(obs))
+            self.latency.record(time.perf_counter() - start)
+            with self._condition:
+                self._result = (request_id, action)
+                self._busy = False
+
+# Real-time play loop
+class RealtimeRunner(object):
+    """
+    Steps a StreetFighterCustomWrapper built with macro_action="hybrid" and
+    step_frames=1 on a fixed clock, one emulator frame per tick.
+
+    lead_frames before the current macro ends, the observation is handed to
+    the inference worker. The macro boundary is the deadline: a result ready
+    by then picks the next macro, otherwise Fighter picks it (hybrid action 0)
+    and the miss is counted. The first decision of a round has no lead time,
+    the observation only exists after the reset, so falling back there is
+    counted apart from missed deadlines. Without a policy Fighter plays every
+    macro.
+    """
+    def __init__(self, env, policy=None, fps=60.0, lead_frames=3, renderer=None, on_frame=None):
+        self.env = env
+        self.fps = fps
+        self.lead_frames = lead_frames
+        self.renderer = renderer
+        # Called with the retro env after every frame, e.g. to feed audio
+        self.on_frame = on_frame
+
+        self.worker = None
+        if policy is not None:
+            self.worker = InferenceWorker(policy, env.observation_space.shape, env.observation_space.dtype)
+
+        self.num_frames = 0
+        self.num_late_frames = 0
+        self.num_decisions = 0
+        self.num_policy_decisions = 0
+        self.num_missed_deadlines = 0
+        self.num_reset_fallbacks = 0
+        self.num_busy_skips = 0
+        self.num_stale_results = 0
+        self.frame_work = LatencyHistogram()
+
+        self._request_id = 0
+        self._pending = None
+        self._after_reset = False
+
+    def _request(self, obs):
+        if self.worker is None or self._pending is not None:
+            return
+        self._request_id += 1
+        if self.worker.submit(obs, self._request_id):
+            self._pending = self._request_id
+        else:
+            self.num_busy_skips += 1
+
+    def _reset(self):
+        obs = self.env.reset()
+        # Results for the last round are meaningless now
+        self._pending = None
+        self._after_reset = True
+        self._request(obs)
+        return obs
+
+    def _next_action(self):
+        # Only called at a macro boundary: use the inference result or fall back to Fighter
+        self.num_decisions += 1
+        after_reset, self._after_reset = self._after_reset, False
+        if self.worker is None:
+            return 0
+        result = self.worker.poll()
+        if result is not None and result[0] == self._pending:
+            self._pending = None
+            self.num_policy_decisions += 1
+            return result[1]
+        if result is not None:
+            self.num_stale_results += 1
+        if self._pending is not None:
+            # Too late for this boundary, drop it
+            self._pending = None
+        if after_reset:
+            self.num_reset_fallbacks += 1
+        else:
+            self.num_missed_deadlines += 1
+        return 0
+
+    def run(self, max_frames=None, max_rounds=None):
+        """
+        Plays until max_frames frames or max_rounds rounds (forever when both
+        are None) and returns stats().
+        """
+        env = self.env
+        executor = env.executor
+        frame_time = 1.0 / self.fps
+        obs = self._reset()
+        num_rounds = 0
+        next_tick = time.perf_counter()
+        while (max_frames is None or self.num_frames < max_frames) and (max_rounds is None or num_rounds < max_rounds):
+            work_start = time.perf_counter()
+            if executor.idle:
+                action = self._next_action()
+            else:
+                action = 0
+            obs, _reward, done, _info = env.step(action)
+            self.num_frames += 1
+            if self.renderer is not None:
+                self.renderer.submit(env.unwrapped.img)
+            if self.on_frame is not None:
+                self.on_frame(env.unwrapped)
+            if done:
+                num_rounds += 1
+                obs = self._reset()
+
+            if executor.pending_frames == self.lead_frames or (executor.idle and self._pending is None):
+                self._request(obs)
+            self.frame_work.record(time.perf_counter() - work_start)
+
+            # Fixed clock: wait for the next tick, resync after falling more than a frame behind
+            next_tick += frame_time
+            delay = next_tick - time.perf_counter()
+            if delay > 0:
+                time.sleep(delay)
+            elif delay < -frame_time:
+                self.num_late_frames += 1
+                next_tick = time.perf_counter()
+        return self.stats()
+
+    def stats(self):
+        stats = {
+            "frames": self.num_frames,
+            "late_frames": self.num_late_frames,
+            "decisions": self.num_decisions,
+            "policy_decisions": self.num_policy_decisions,
+            "missed_deadlines": self.num_missed_deadlines,
+            "reset_fallbacks": self.num_reset_fallbacks,
+            "busy_skips": self.num_busy_skips,
+            "stale_results": self.num_stale_results,
+            "frame_work": self.frame_work.summary(),
+        }
+        if self.worker is not None:
+            stats["inference"] = self.worker.latency.summary()
+        return stats
+
+    def close(self):
+        if self.worker is not None:
+            self.worker.close()
+            self.worker = None
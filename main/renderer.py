@@ -0,0 +1,79 @@
+import time
+import threading
+import collections
+
+# Asynchronous renderer
+class AsyncRenderer:
+    """
+    Shows frames on a viewer thread so the emulator never sleeps or blocks on
+    the display. Frames go through a bounded queue that drops the oldest frame
+    when the viewer falls behind.
+    """
+    def __init__(self, max_queue=2, fps=60.0, caption="Street Fighter"):
+        self.fps = fps
+        self.caption = caption
+
+        self.num_dropped = 0
+        self.num_shown = 0
+
+        self._frames = collections.deque(maxlen=max_queue)
+        self._condition = threading.Condition()
+        self._closed = False
+
+        self._thread = threading.Thread(target=self._run, name="AsyncRenderer", daemon=True)
+        self._thread.start()
+
+    def submit(self, frame):
+        """
+        Queues a frame for display and returns immediately. The frame is kept
+        by reference, so it must not be modified afterwards.
+        """
+        with self._condition:
+            if len(self._frames) == self._frames.maxlen:
+                self.num_dropped += 1
+            self._frames.append(frame)
+            self._condition.notify()
+
+    def close(self):
+        with self._condition:
+            self._closed = True
+            self._condition.notify()
+        self._thread.join(timeout=1.0)
+
+    def _next_frame(self):
+        with self._condition:
+            while not self._frames and not self._closed:
+                self._condition.wait()
+            if self._closed:
+                return None
+            return self._frames.popleft()
+
+    def _make_viewer(self):
+        from gym.envs.classic_control.rendering import SimpleImageViewer
+        return SimpleImageViewer()
+
+    def _run(self):
+        # The viewer window has to be created on the thread that draws to it
+        viewer = self._make_viewer()
+        captioned = False
+        frame_time = 1.0 / self.fps
+        last_time = time.perf_counter()
+        try:
+            while True:
+                frame = self._next_frame()
+                if frame is None:
+                    break
+                viewer.imshow(frame)
+                if not captioned:
+                    # SimpleImageViewer opens its pyglet window on the first frame
+                    viewer.window.set_caption(self.caption)
+                    captioned = True
+                self.num_shown += 1
+
+                # Pace the display, not the simulation
+                time_diff = time.perf_counter() - last_time
+                if time_diff < frame_time:
+                    time.sleep(frame_time - time_diff)
+                last_time = time.perf_counter()
+        finally:
+            viewer.close()
@@ -0,0 +1,212 @@
+import os
+import json
+import hashlib
+import argparse
+
+import numpy as np
+
+from ram_decoder import RamDecoder
+
+REPLAY_VERSION = 1
+_BUTTON_BITS = (1 << np.arange(12)).astype(np.uint16)
+
+def pack_buttons(mask):
+    return int(np.dot(np.asarray(mask, dtype=np.uint16), _BUTTON_BITS))
+
+def unpack_buttons(packed):
+    return ((int(packed) >> np.arange(12)) & 1).astype(np.uint8)
+
+# Input + RAM replay recorder
+class ReplayRecorder:
+    """
+    Records each frame's emulator button mask and the data.json RAM bytes.
+
+    A round is a few thousand frames of 2 + ~30 bytes, saved as compressed
+    columns next to the name and SHA-1 of the start state, which comes to a
+    few KB per round. Replayer re-simulates it frame-exactly.
+    """
+    def __init__(self, ram_decoder, directory=None, prefix="episode", embed_state=False):
+        self.ram_decoder = ram_decoder
+        self.directory = directory
+        self.prefix = prefix
+        # Store the compressed start state in the file instead of only its name
+        self.embed_state = embed_state
+
+        self.num_episodes = 0
+        self._meta = None
+        self._state = None
+        self._buttons = []
+        self._ram = []
+        self._step_ends = []
+
+    def start(self, retro_env, seed=None):
+        """
+        Starts a new episode. Call right after the env was reset into its
+        initial state; the previous episode is saved first.
+        """
+        self.finish()
+        self._state = retro_env.initial_state
+        self._meta = {
+            "version": REPLAY_VERSION,
+            "game": getattr(retro_env, "gamename", None),
+            "state": getattr(retro_env, "statename", None),
+            "state_sha1": hashlib.sha1(self._state).hexdigest() if self._state else None,
+            "seed": seed,
+            "ram_fields": list(self.ram_decoder.names),
+        }
+
+    def record_frame(self, mask, ram):
+        self._buttons.append(pack_buttons(mask))
+        self._ram.append(np.asarray(ram, dtype=np.uint8).take(self.ram_decoder.index))
+
+    def end_step(self):
+        self._step_ends.append(len(self._buttons))
+
+    def finish(self):
+        """
+        Saves the current episode, if any frame was recorded, and returns its path.
+        """
+        if self._meta is None or not self._buttons:
+            self._meta = None
+            return None
+
+        columns = {
+            "buttons": np.array(self._buttons, dtype=np.uint16),
+            "step_ends": np.array(self._step_ends, dtype=np.int32),
+            "meta": np.frombuffer(json.dumps(self._meta).encode(), dtype=np.uint8),
+        }
+        # Rows are already gathered in the decoder's packed layout
+        ram = np.stack(self._ram).view(self.ram_decoder.dtype).reshape(-1)
+        for name in self.ram_decoder.names:
+            columns["ram." + name] = ram[name]
+        if self.embed_state and self._state:
+            columns["state"] = np.frombuffer(self._state, dtype=np.uint8)
+
+        path = None
+        if self.directory is not None:
+            os.makedirs(self.directory, exist_ok=True)
+            path = os.path.join(self.directory, "{}_{:05d}.npz".format(self.prefix, self.num_episodes))
+            np.savez_compressed(path, **columns)
+
+        self.num_episodes += 1
+        self._meta = None
+        self._buttons = []
+        self._ram = []
+        self._step_ends = []
+        return path
+
+class Replay:
+    """
+    A recorded episode: per-frame buttons and RAM columns plus metadata.
+    """
+    def __init__(self, meta, buttons, step_ends, ram, state=None):
+        self.meta = meta
+        self.buttons = buttons
+        self.step_ends = step_ends
+        self.ram = ram
+        self.state = state
+
+    @classmethod
+    def load(cls, path):
+        with np.load(path) as data:
+            meta = json.loads(data["meta"].tobytes().decode())
+            fields = meta["ram_fields"]
+            columns = [data["ram." + name] for name in fields]
+            ram = np.zeros(len(data["buttons"]), dtype=[(name, column.dtype) for name, column in zip(fields, columns)])
+            for name, column in zip(fields, columns):
+                ram[name] = column
+            state = data["state"].tobytes() if "state" in data else None
+            return cls(meta, data["buttons"], data["step_ends"], ram, state)
+
+    def __len__(self):
+        return len(self.buttons)
+
+# Deterministic re-simulation
+class Replayer:
+    """
+    Re-simulates a Replay on a retro env of the same game, frame by frame.
+
+    RAM is compared against the recording on every frame, and screens are only
+    grabbed for the frames asked for.
+    """
+    def __init__(self, env, ram_decoder=None, state_cache=None):
+        self.retro_env = env.unwrapped
+        self.ram_decoder = ram_decoder or RamDecoder.from_json()
+        self.state_cache = state_cache
+
+    def _start_state(self, replay):
+        if replay.state is not None:
+            state = replay.state
+        else:
+            from state_cache import get_state_cache
+            cache = self.state_cache or get_state_cache(replay.meta["game"])
+            state = cache.get(replay.meta["state"])
+        if replay.meta["state_sha1"] and hashlib.sha1(state).hexdigest() != replay.meta["state_sha1"]:
+            raise ValueError("Start state {} differs from the recorded one".format(replay.meta["state"]))
+        return state
+
+    def run(self, replay, screens=(), verify=True):
+        """
+        Replays every frame and returns ({frame: screen}, first_mismatch).
+        first_mismatch is the first frame whose RAM differs, or None.
+        """
+        retro_env = self.retro_env
+        retro_env.initial_state = self._start_state(replay)
+        retro_env.reset()
+
+        wanted = set(int(i) for i in screens)
+        captured = {}
+        first_mismatch = None
+        fields = replay.ram.dtype.names
+        previous = None
+        for frame, packed in enumerate(replay.buttons):
+            if packed != previous:
+                retro_env.em.set_button_mask(unpack_buttons(packed), 0)
+                previous = packed
+            retro_env.em.step()
+            retro_env.data.update_ram()
+            if frame in wanted:
+                captured[frame] = retro_env.get_screen()
+            if verify and first_mismatch is None:
+                ram = self.ram_decoder.decode(retro_env.get_ram())
+                if any(ram[name] != replay.ram[frame][name] for name in fields):
+                    first_mismatch = frame
+        return captured, first_mismatch
+
+    def screens(self, replay, frames):
+        return self.run(replay, screens=frames, verify=False)[0]
+
+def main():
+    import retro
+
+    parser = argparse.ArgumentParser(description="Re-simulate a recorded episode and check it is frame-exact.")
+    parser.add_argument("replay")
+    parser.add_argument("--frames", type=int, nargs="*", default=[], help="Frames to save screens of")
+    parser.add_argument("--output-dir", default=None, help="Where to save the screens as .npy")
+    args = parser.parse_args()
+
+    replay = Replay.load(args.replay)
+    env = retro.make(
+        game=replay.meta["game"],
+        state=replay.meta["state"],
+        use_restricted_actions=retro.Actions.FILTERED,
+        obs_type=retro.Observations.IMAGE
+    )
+    screens, first_mismatch = Replayer(env).run(replay, screens=args.frames)
+    env.close()
+
+    final = replay.ram[-1]
+    print("{} frames, {} steps, final agent HP {}, enemy HP {}".format(
+        len(replay), len(replay.step_ends), final["agent_hp"], final["enemy_hp"]))
+    if first_mismatch is None:
+        print("Replay is frame-exact.")
+    else:
+        print("RAM diverges at frame {}".format(first_mismatch))
+
+    if args.output_dir:
+        os.makedirs(args.output_dir, exist_ok=True)
+        for frame, screen in screens.items():
+            np.save(os.path.join(args.output_dir, "frame_{:05d}.npy".format(frame)), screen)
+
+if __name__ == "__main__":
+    main()
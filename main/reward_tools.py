@@ -0,0 +1,160 @@
+import glob
+import argparse
+import itertools
+import collections
+
+import numpy as np
+
+FULL_HP = 176
+
+# Parameters of the reward family used by StreetFighterCustomWrapper.compute_reward.
+# The defaults reproduce it: reward_coeff=3, damage taken weighted 1, terminal bonus
+# full_hp ** ((hp + 1) / (full_hp + 1)) and the 0.001 scale applied in step().
+RewardParams = collections.namedtuple(
+    "RewardParams",
+    ["reward_coeff", "damage_weight", "terminal_base", "terminal_scale", "scale"],
+    defaults=[3.0, 1.0, float(FULL_HP), 1.0, 0.001],
+)
+
+def pad_traces(traces):
+    """
+    Stacks per-episode (agent_hp, enemy_hp) step traces of different lengths
+    into (episodes, max_steps) arrays plus a validity mask.
+    """
+    length = max(len(agent_hp) for agent_hp, _ in traces)
+    agent = np.full((len(traces), length), FULL_HP, dtype=np.float64)
+    enemy = np.full((len(traces), length), FULL_HP, dtype=np.float64)
+    mask = np.zeros((len(traces), length), dtype=bool)
+    for i, (agent_hp, enemy_hp) in enumerate(traces):
+        agent[i, :len(agent_hp)] = agent_hp
+        enemy[i, :len(enemy_hp)] = enemy_hp
+        mask[i, :len(agent_hp)] = True
+    return agent, enemy, mask
+
+def _terminal_mask(agent, enemy, mask):
+    # The wrapper ends the round on the first step where either HP drops below 0
+    over = ((agent < 0) | (enemy < 0)) & mask
+    after = np.cumsum(over, axis=1) - over > 0
+    return over & ~after, mask & ~after
+
+def step_rewards(candidates, agent, enemy, mask, full_hp=FULL_HP):
+    """
+    Per-step rewards of every candidate for every episode, shape
+    (candidates, episodes, steps), computed in one broadcast pass.
+    """
+    params = RewardParams(*np.array(candidates, dtype=np.float64).T)
+    coeff, damage_weight, base, terminal_scale, scale = (p[:, None, None] for p in params)
+
+    terminal, valid = _terminal_mask(agent, enemy, mask)
+    # HP only carries over between non-terminal steps, so the previous step's HP is the reference
+    prev_agent = np.concatenate([np.full((agent.shape[0], 1), full_hp), agent[:, :-1]], axis=1)
+    prev_enemy = np.concatenate([np.full((enemy.shape[0], 1), full_hp), enemy[:, :-1]], axis=1)
+
+    lost = terminal & (agent < 0)
+    won = terminal & ~lost
+    shaped = coeff * (prev_enemy - enemy) - damage_weight * (prev_agent - agent)
+    loss_reward = -np.power(base, (enemy + 1) / (full_hp + 1)) * terminal_scale
+    win_reward = np.power(base, (agent + 1) / (full_hp + 1)) * coeff * terminal_scale
+
+    rewards = np.where(lost, loss_reward, np.where(won, win_reward, shaped)) * scale
+    return np.where(valid, rewards, 0.0)
+
+def episode_returns(candidates, traces, gamma=1.0, full_hp=FULL_HP):
+    """
+    Returns of every candidate on every episode, shape (candidates, episodes).
+    """
+    agent, enemy, mask = pad_traces(traces)
+    rewards = step_rewards(candidates, agent, enemy, mask, full_hp)
+    discounts = np.power(gamma, np.arange(rewards.shape[-1]))
+    return (rewards * discounts).sum(axis=-1)
+
+def custom_returns(functions, traces, full_hp=FULL_HP):
+    """
+    Returns for arbitrary vectorized reward functions. Each is called as
+    f(agent, enemy, prev_agent, prev_enemy, terminal) on (episodes, steps)
+    arrays and returns per-step rewards of the same shape.
+    """
+    agent, enemy, mask = pad_traces(traces)
+    terminal, valid = _terminal_mask(agent, enemy, mask)
+    prev_agent = np.concatenate([np.full((agent.shape[0], 1), full_hp), agent[:, :-1]], axis=1)
+    prev_enemy = np.concatenate([np.full((enemy.shape[0], 1), full_hp), enemy[:, :-1]], axis=1)
+    return np.stack([
+        np.where(valid, f(agent, enemy, prev_agent, prev_enemy, terminal), 0.0).sum(axis=-1)
+        for f in functions
+    ])
+
+def traces_from_replays(paths):
+    """
+    Step-end HP traces of recorded episodes (see replay.py).
+    """
+    from replay import Replay
+
+    traces = []
+    for path in paths:
+        replay = Replay.load(path)
+        step_ends = replay.step_ends - 1
+        traces.append((replay.ram["agent_hp"][step_ends].astype(np.int64),
+                       replay.ram["enemy_hp"][step_ends].astype(np.int64)))
+    return traces
+
+def _ranks(values):
+    return np.argsort(np.argsort(values, axis=-1), axis=-1).astype(np.float64)
+
+def compare(candidates, traces, gamma=1.0):
+    """
+    Summary per candidate: mean/std of returns, mean on won and lost episodes,
+    and rank correlation of episode returns with the first candidate.
+    """
+    returns = episode_returns(candidates, traces, gamma)
+    agent, enemy, mask = pad_traces(traces)
+    terminal, _ = _terminal_mask(agent, enemy, mask)
+    won = (terminal & (enemy < 0) & (agent >= 0)).any(axis=1)
+
+    ranks = _ranks(returns)
+    ranks -= ranks.mean(axis=1, keepdims=True)
+    norms = np.sqrt((ranks ** 2).sum(axis=1))
+    correlation = (ranks @ ranks[0]) / np.maximum(norms * norms[0], 1e-12)
+
+    rows = []
+    for i, candidate in enumerate(candidates):
+        rows.append({
+            "params": RewardParams(*candidate),
+            "mean": float(returns[i].mean()),
+            "std": float(returns[i].std()),
+            "won_mean": float(returns[i][won].mean()) if won.any() else float("nan"),
+            "lost_mean": float(returns[i][~won].mean()) if (~won).any() else float("nan"),
+            "rank_corr": float(correlation[i]),
+        })
+    return rows
+
+def main():
+    parser = argparse.ArgumentParser(description="Recompute episode returns of recorded rounds under candidate rewards.")
+    parser.add_argument("replays", help="Glob of replay files, e.g. 'replays/**/*.npz'")
+    parser.add_argument("--reward-coeff", type=float, nargs="+", default=[RewardParams().reward_coeff])
+    parser.add_argument("--damage-weight", type=float, nargs="+", default=[RewardParams().damage_weight])
+    parser.add_argument("--terminal-base", type=float, nargs="+", default=[RewardParams().terminal_base])
+    parser.add_argument("--terminal-scale", type=float, nargs="+", default=[RewardParams().terminal_scale])
+    parser.add_argument("--scale", type=float, nargs="+", default=[RewardParams().scale])
+    parser.add_argument("--gamma", type=float, default=1.0)
+    args = parser.parse_args()
+
+    paths = sorted(glob.glob(args.replays, recursive=True))
+    if not paths:
+        print("No replay matches {}".format(args.replays))
+        return
+    traces = traces_from_replays(paths)
+
+    # The wrapper's reward first, so rank correlations are relative to it
+    grid = itertools.product(args.reward_coeff, args.damage_weight, args.terminal_base, args.terminal_scale, args.scale)
+    candidates = [tuple(RewardParams())] + [c for c in grid if c != tuple(RewardParams())]
+
+    print("{} episodes, {} candidates".format(len(traces), len(candidates)))
+    print("{:<48} {:>9} {:>9} {:>9} {:>9} {:>7}".format("candidate", "mean", "std", "won", "lost", "rank r"))
+    for row in compare(candidates, traces, args.gamma):
+        p = row["params"]
+        name = "coeff={:g} dmg={:g} base={:g} term={:g} scale={:g}".format(*p)
+        print("{:<48} {:>9.4f} {:>9.4f} {:>9.4f} {:>9.4f} {:>7.3f}".format(
+            name, row["mean"], row["std"], row["won_mean"], row["lost_mean"], row["rank_corr"]))
+
+if __name__ == "__main__":
+    main()
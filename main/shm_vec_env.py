@@ -0,0 +1,258 @@
+import multiprocessing as mp
+from multiprocessing import shared_memory, resource_tracker
+
+import numpy as np
+from stable_baselines3.common.vec_env.base_vec_env import VecEnv, CloudpickleWrapper
+
+def _layout(num_envs, observation_space, ram_dtype):
+    """
+    Offsets of every array inside the single shared memory block.
+    """
+    fields = [
+        ("obs", (num_envs,) + observation_space.shape, observation_space.dtype),
+        ("terminal_obs", (num_envs,) + observation_space.shape, observation_space.dtype),
+        ("rewards", (num_envs,), np.dtype(np.float32)),
+        ("dones", (num_envs,), np.dtype(np.bool_)),
+        ("ram_valid", (num_envs,), np.dtype(np.bool_)),
+    ]
+    if ram_dtype is not None:
+        fields.append(("ram", (num_envs,), ram_dtype))
+
+    layout = {}
+    offset = 0
+    for name, shape, dtype in fields:
+        # Keep every array 64-byte aligned
+        offset = (offset + 63) // 64 * 64
+        layout[name] = (offset, shape, np.dtype(dtype))
+        offset += int(np.prod(shape)) * np.dtype(dtype).itemsize
+    return layout, max(offset, 1)
+
+def _attach(buf, layout):
+    return {
+        name: np.ndarray(shape, dtype=dtype, buffer=buf, offset=offset)
+        for name, (offset, shape, dtype) in layout.items()
+    }
+
+def _ram_source(env, ram_decoder):
+    """
+    The wrapper in env's chain keeping the decoded RAM of its last step in
+    prev_ram with the same layout as ram_decoder, or None.
+    """
+    while env is not None:
+        if "prev_ram" in vars(env):
+            decoder = getattr(env, "ram_decoder", None)
+            return env if decoder is not None and decoder.dtype == ram_decoder.dtype else None
+        env = getattr(env, "env", None)
+    return None
+
+def _worker(remote, parent_remote, env_fn_wrapper, index, ram_decoder):
+    parent_remote.close()
+    env = env_fn_wrapper.var()
+    shm = None
+    arrays = None
+    source = _ram_source(env, ram_decoder) if ram_decoder is not None else None
+
+    def write_ram(valid):
+        if ram_decoder is not None:
+            # Reuse the record the wrapper decoded for this step rather than decoding the RAM again
+            record = source.prev_ram if source is not None else None
+            arrays["ram"][index] = record if record is not None else ram_decoder.decode(env.unwrapped.get_ram())
+        arrays["ram_valid"][index] = valid
+
+    try:
+        while True:
+            cmd, data = remote.recv()
+            if cmd == "step":
+                obs, reward, done, info = env.step(data)
+                if done:
+                    arrays["terminal_obs"][index] = obs
+                    obs = env.reset()
+                arrays["obs"][index] = obs
+                arrays["rewards"][index] = reward
+                arrays["dones"][index] = done
+                write_ram(not done)
+                # Only episode ends carry an info dict (Monitor stats), the rest is in shared memory
+                remote.send(info if done else None)
+            elif cmd == "reset":
+                arrays["obs"][index] = env.reset()
+                write_ram(False)
+                remote.send(None)
+            elif cmd == "attach":
+                name, layout = data
+                # Workers share the parent's resource tracker, so the block stays
+                # registered once, to the parent, which unlinks it on close
+                shm = shared_memory.SharedMemory(name=name)
+                arrays = _attach(shm.buf, layout)
+                remote.send(None)
+            elif cmd == "get_spaces":
+                remote.send((env.observation_space, env.action_space))
+            elif cmd == "seed":
+                remote.send(env.seed(data))
+            elif cmd == "render":
+                remote.send(env.render(data))
+            elif cmd == "env_method":
+                method = getattr(env, data[0])
+                remote.send(method(*data[1], **data[2]))
+            elif cmd == "get_attr":
+                remote.send(getattr(env, data))
+            elif cmd == "set_attr":
+                remote.send(setattr(env, data[0], data[1]))
+            elif cmd == "is_wrapped":
+                from stable_baselines3.common.env_util import is_wrapped
+                remote.send(is_wrapped(env, data))
+            elif cmd == "close":
+                env.close()
+                remote.close()
+                break
+            else:
+                raise NotImplementedError("`{}` is not implemented in the worker".format(cmd))
+    except KeyboardInterrupt:
+        print("ShmVecEnv worker: got KeyboardInterrupt")
+    finally:
+        arrays = None
+        if shm is not None:
+            shm.close()
+
+# Shared memory vector environment
+class ShmVecEnv(VecEnv):
+    """
+    Runs each env in its own process like SubprocVecEnv, but workers write the
+    observation, reward, done flag and decoded RAM straight into one shared
+    memory block. The main process reads them as contiguous batch arrays, and
+    the pipes only carry actions, acknowledgements and episode-end infos.
+
+    With a RamDecoder, get_ram() returns the decoded RAM of every env, ready
+    for VecFighter. Envs wrapped in StreetFighterCustomWrapper with a
+    RamDecoder pass on the record the wrapper decoded, the others are decoded
+    once more in the worker; without a caller of get_ram(), leave it out.
+    """
+    def __init__(self, env_fns, ram_decoder=None, start_method=None, copy_obs=True):
+        self.waiting = False
+        self.closed = False
+        self.copy_obs = copy_obs
+        n_envs = len(env_fns)
+
+        if start_method is None:
+            # Same default as SubprocVecEnv
+            forkserver_available = "forkserver" in mp.get_all_start_methods()
+            start_method = "forkserver" if forkserver_available else "spawn"
+        ctx = mp.get_context(start_method)
+        # Start the resource tracker before the workers so forked ones share it
+        # too (spawned ones are handed its fd), see the "attach" command
+        resource_tracker.ensure_running()
+
+        self.remotes, self.work_remotes = zip(*[ctx.Pipe() for _ in range(n_envs)])
+        self.processes = []
+        for index, (work_remote, remote, env_fn) in enumerate(zip(self.work_remotes, self.remotes, env_fns)):
+            args = (work_remote, remote, CloudpickleWrapper(env_fn), index, ram_decoder)
+            # daemon=True: if the main process crashes, we should not cause things to hang
+            process = ctx.Process(target=_worker, args=args, daemon=True)
+            process.start()
+            self.processes.append(process)
+            work_remote.close()
+
+        self.remotes[0].send(("get_spaces", None))
+        observation_space, action_space = self.remotes[0].recv()
+        VecEnv.__init__(self, n_envs, observation_space, action_space)
+
+        layout, size = _layout(n_envs, observation_space, ram_decoder.dtype if ram_decoder is not None else None)
+        self._shm = shared_memory.SharedMemory(create=True, size=size)
+        self._arrays = _attach(self._shm.buf, layout)
+        for remote in self.remotes:
+            remote.send(("attach", (self._shm.name, layout)))
+        for remote in self.remotes:
+            remote.recv()
+
+    def _observations(self):
+        return self._arrays["obs"].copy() if self.copy_obs else self._arrays["obs"]
+
+    def step_async(self, actions):
+        for remote, action in zip(self.remotes, actions):
+            remote.send(("step", action))
+        self.waiting = True
+
+    def step_wait(self):
+        results = [remote.recv() for remote in self.remotes]
+        self.waiting = False
+
+        infos = []
+        for index, info in enumerate(results):
+            if info is None:
+                info = {}
+            else:
+                info["terminal_observation"] = self._arrays["terminal_obs"][index].copy()
+            infos.append(info)
+
+        return self._observations(), self._arrays["rewards"].copy(), self._arrays["dones"].copy(), infos
+
+    def reset(self):
+        for remote in self.remotes:
+            remote.send(("reset", None))
+        for remote in self.remotes:
+            remote.recv()
+        return self._observations()
+
+    def get_ram(self):
+        """
+        Returns (ram, valid): the decoded RAM record of every env, and whether
+        it follows a step (False right after a reset).
+        """
+        if "ram" not in self._arrays:
+            raise ValueError("get_ram() needs a ShmVecEnv created with a ram_decoder")
+        return self._arrays["ram"].copy(), self._arrays["ram_valid"].copy()
+
+    def seed(self, seed=None):
+        if seed is None:
+            seed = np.random.randint(0, 2**32 - 1)
+        for idx, remote in enumerate(self.remotes):
+            remote.send(("seed", seed + idx))
+        return [remote.recv() for remote in self.remotes]
+
+    def close(self):
+        if self.closed:
+            return
+        if self.waiting:
+            for remote in self.remotes:
+                remote.recv()
+        for remote in self.remotes:
+            remote.send(("close", None))
+        for process in self.processes:
+            process.join()
+        self._arrays = None
+        self._shm.close()
+        self._shm.unlink()
+        self.closed = True
+
+    def get_images(self):
+        for pipe in self.remotes:
+            pipe.send(("render", "rgb_array"))
+        return [pipe.recv() for pipe in self.remotes]
+
+    def get_attr(self, attr_name, indices=None):
+        target_remotes = self._get_target_remotes(indices)
+        for remote in target_remotes:
+            remote.send(("get_attr", attr_name))
+        return [remote.recv() for remote in target_remotes]
+
+    def set_attr(self, attr_name, value, indices=None):
+        target_remotes = self._get_target_remotes(indices)
+        for remote in target_remotes:
+            remote.send(("set_attr", (attr_name, value)))
+        for remote in target_remotes:
+            remote.recv()
+
+    def env_method(self, method_name, *method_args, indices=None, **method_kwargs):
+        target_remotes = self._get_target_remotes(indices)
+        for remote in target_remotes:
+            remote.send(("env_method", (method_name, method_args, method_kwargs)))
+        return [remote.recv() for remote in target_remotes]
+
+    def env_is_wrapped(self, wrapper_class, indices=None):
+        target_remotes = self._get_target_remotes(indices)
+        for remote in target_remotes:
+            remote.send(("is_wrapped", wrapper_class))
+        return [remote.recv() for remote in target_remotes]
+
+    def _get_target_remotes(self, indices):
+        indices = self._get_indices(indices)
+        return [self.remotes[i] for i in indices]
@@ -0,0 +1,38 @@
+import time
+import collections
+
+class StageTimer(object):
+    """
+    Accumulates wall-clock seconds per stage. lap(stage) charges the time
+    since the previous mark or lap to stage, so a step costs one
+    perf_counter call per stage boundary.
+    """
+    def __init__(self):
+        self.totals = collections.defaultdict(float)
+        self._last = time.perf_counter()
+
+    def mark(self):
+        self._last = time.perf_counter()
+
+    def lap(self, stage):
+        now = time.perf_counter()
+        self.totals[stage] += now - self._last
+        self._last = now
+
+    def pop(self):
+        totals = dict(self.totals)
+        self.totals.clear()
+        return totals
+
+class NullTimer(object):
+    """
+    Stand-in for StageTimer when telemetry is off.
+    """
+    def mark(self):
+        pass
+
+    def lap(self, stage):
+        pass
+
+    def pop(self):
+        return {}
@@ -0,0 +1,182 @@
+import pickle
+
+import gym
+import numpy as np
+
+from ram_decoder import RamDecoder, DATA_JSON_PATH
+
+SCREEN_SHAPE = (200, 256, 3)
+
+class _StandInEmulator:
+    """
+    The parts of retro's RetroEmulator the wrapper uses.
+    """
+    def __init__(self, env):
+        self._env = env
+
+    def set_button_mask(self, mask, player=0):
+        self._env._buttons = np.asarray(mask, dtype=np.uint8)
+
+    def step(self):
+        self._env._advance()
+
+    def get_screen(self):
+        return self._env._screen()
+
+    def get_state(self):
+        return pickle.dumps(self._env._snapshot())
+
+    def set_state(self, state):
+        self._env._restore(pickle.loads(state))
+        return True
+
+    def get_audio(self):
+        return np.zeros((735, 2), dtype=np.int16)
+
+    def get_audio_rate(self):
+        return 44100.0
+
+class _StandInGameData:
+    """
+    The parts of retro's GameData the wrapper uses.
+    """
+    def __init__(self, env):
+        self._env = env
+
+    def update_ram(self):
+        self._env._write_ram()
+
+    def lookup_all(self):
+        return self._env.ram_decoder.to_dict(self._env.ram_decoder.decode(self._env._ram))
+
+    def reset(self):
+        pass
+
+    def is_done(self):
+        return self._env._state["reset_countdown"] == 10
+
+# Emulator-free stand-in for a retro StreetFighter env
+class StandInRetroEnv(gym.Env):
+    """
+    Deterministic stand-in for `retro.make(...)` of this game.
+
+    It emits 200x256x3 frames and keeps every data/data.json variable in a
+    64KB RAM block laid out like the Genesis core's, so RamDecoder,
+    StreetFighterCustomWrapper (including fast_step) and the vector envs run
+    unchanged. The fight itself is a cheap scripted simulation; only the data
+    shapes and the call pattern match the real game.
+    """
+    metadata = {"render.modes": ["rgb_array"]}
+
+    def __init__(self, seed=0, num_screens=16, round_frames=3000, data_path=DATA_JSON_PATH):
+        self.ram_decoder = RamDecoder.from_json(data_path)
+        self.observation_space = gym.spaces.Box(low=0, high=255, shape=SCREEN_SHAPE, dtype=np.uint8)
+        self.action_space = gym.spaces.MultiBinary(12)
+        self.round_frames = round_frames
+
+        # Frames are copied out of a fixed pool, like retro returns a fresh screen per frame
+        rng = np.random.default_rng(seed)
+        self._screens = rng.integers(0, 256, size=(num_screens,) + SCREEN_SHAPE, dtype=np.uint8)
+
+        self.em = _StandInEmulator(self)
+        self.data = _StandInGameData(self)
+        self.initial_state = None
+        self.statename = "StandIn"
+        self.img = None
+
+        self._ram = np.zeros(0x10000, dtype=np.uint8)
+        self._record = np.zeros((), dtype=self.ram_decoder.dtype)
+        self._buttons = np.zeros(12, dtype=np.uint8)
+        self.seed(seed)
+        self._state = self._start_state()
+
+    def seed(self, seed=None):
+        self._seed = 0 if seed is None else int(seed)
+        self._rng = np.random.default_rng(self._seed)
+        return [self._seed]
+
+    def _start_state(self):
+        return {
+            "frame": 0,
+            "enemy_character": 11, "agent_hp": 176, "enemy_hp": 176,
+            "agent_x": 205, "enemy_x": 307, "agent_y": 192, "enemy_y": 192,
+            "score": 0, "agent_victories": 0, "enemy_victories": 0,
+            "round_countdown": 39208, "reset_countdown": 0,
+            "agent_status": 512, "enemy_status": 512,
+        }
+
+    def _snapshot(self):
+        return dict(self._state, rng=self._rng.bit_generator.state)
+
+    def _restore(self, state):
+        state = dict(state)
+        self._rng.bit_generator.state = state.pop("rng")
+        self._state = state
+
+    def _advance(self):
+        state = self._state
+        state["frame"] += 1
+        rng = self._rng
+
+        # Walk with LEFT/RIGHT, the enemy drifts toward the agent and jumps now and then
+        buttons = self._buttons
+        state["agent_x"] = int(np.clip(state["agent_x"] + 2 * (int(buttons[7]) - int(buttons[6])), 55, 458))
+        state["enemy_x"] = int(np.clip(state["enemy_x"] + rng.integers(-2, 3), 55, 458))
+        jump_phase = state["frame"] % 90
+        state["enemy_y"] = 192 - int(80 * np.sin(np.pi * jump_phase / 30)) if jump_phase < 30 else 192
+        state["enemy_status"] = 516 if jump_phase < 30 else 512
+        state["agent_status"] = 522 if buttons[9:12].any() else 512
+
+        if state["agent_hp"] >= 0 and state["enemy_hp"] >= 0:
+            if rng.random() < 0.02:
+                state["enemy_hp"] -= int(rng.integers(4, 20))
+            if rng.random() < 0.02:
+                state["agent_hp"] -= int(rng.integers(4, 20))
+            if state["frame"] >= self.round_frames:
+                state["agent_hp"] = -1
+            state["agent_hp"] = max(state["agent_hp"], -1)
+            state["enemy_hp"] = max(state["enemy_hp"], -1)
+        state["round_countdown"] = max(state["round_countdown"] - 1, 0)
+
+    def _write_ram(self):
+        record = self._record
+        for name in self.ram_decoder.names:
+            record[name] = self._state[name]
+        self._ram[self.ram_decoder.index] = np.frombuffer(record.tobytes(), dtype=np.uint8)
+
+    def _screen(self):
+        return self._screens[self._state["frame"] % len(self._screens)].copy()
+
+    def get_ram(self):
+        return self._ram.copy()
+
+    def get_screen(self, player=0):
+        return self._screen()
+
+    def action_to_array(self, a):
+        return [np.asarray(a, dtype=np.uint8)]
+
+    def reset(self):
+        if self.initial_state:
+            self.em.set_state(self.initial_state)
+        else:
+            self.seed(self._seed)
+            self._state = self._start_state()
+        self._buttons = np.zeros(12, dtype=np.uint8)
+        self.em.step()
+        self.data.update_ram()
+        self.img = self._screen()
+        return self.img
+
+    def step(self, a):
+        self.em.set_button_mask(self.action_to_array(a)[0], 0)
+        self.em.step()
+        self.data.update_ram()
+        self.img = self._screen()
+        return self.img, 0.0, bool(self.data.is_done()), self.data.lookup_all()
+
+    def render(self, mode="rgb_array"):
+        return self.img
+
+    def close(self):
+        pass
@@ -0,0 +1,116 @@
+import os
+import gzip
+
+# retro is imported where it is used, so the cache logic runs without it
+
+# In-memory save-state cache
+class StateCache:
+    """
+    Keeps decompressed save states in memory, one cache per worker process.
+
+    retro.make gunzips the .state file once and resets from that blob, but
+    loading another state reads and decompresses the file again. With the
+    cache, switching an env between states (sweeps over several states,
+    lookahead planning) is a dict lookup plus em.set_state.
+    """
+    def __init__(self, game, inttype=None):
+        self.game = game
+        # None: retro.data.Integrations.STABLE
+        self.inttype = inttype
+        self._states = {}
+
+    def path(self, state):
+        if os.path.isfile(state):
+            return state
+        import retro
+
+        if not state.endswith(".state"):
+            state += ".state"
+        inttype = retro.data.Integrations.STABLE if self.inttype is None else self.inttype
+        return retro.data.get_file_path(self.game, state, inttype)
+
+    def get(self, state):
+        blob = self._states.get(state)
+        if blob is None:
+            with gzip.open(self.path(state), "rb") as f:
+                blob = f.read()
+            self._states[state] = blob
+        return blob
+
+    def preload(self, states):
+        for state in states:
+            self.get(state)
+
+    def restore(self, env, state):
+        """
+        Makes `state` the env's start state and resets into it. `env` may be
+        wrapped; the reset goes through the wrappers.
+        """
+        retro_env = env.unwrapped
+        retro_env.initial_state = self.get(state)
+        retro_env.statename = state
+        return env.reset()
+
+    def __contains__(self, state):
+        return state in self._states
+
+    def __len__(self):
+        return len(self._states)
+
+_state_caches = {}
+
+def get_state_cache(game):
+    """
+    Returns the state cache of this process for `game`.
+    """
+    cache = _state_caches.get(game)
+    if cache is None:
+        cache = StateCache(game)
+        _state_caches[game] = cache
+    return cache
+
+# Pre-warmed emulator pool
+class PrewarmedEnvPool:
+    """
+    Loads the ROM, integration data and save states once in the parent and
+    hands the loaded emulator to forked workers.
+
+    retro allows one emulator per process. The parent makes it, and every
+    worker forked afterwards owns an independent copy-on-write copy, so workers
+    skip ROM and integration loading altogether. The vector env has to use the
+    "fork" start method, and the parent must not step its copy.
+
+    make_fn(game=..., state=..., **make_kwargs) builds the emulator, retro.make
+    with filtered actions and image observations by default.
+    """
+    def __init__(self, game, state, states=(), make_fn=None, **make_kwargs):
+        if make_fn is None:
+            import retro
+
+            make_kwargs.setdefault("use_restricted_actions", retro.Actions.FILTERED)
+            make_kwargs.setdefault("obs_type", retro.Observations.IMAGE)
+            make_fn = retro.make
+        self.game = game
+        self.state = state
+        self.base_env = make_fn(game=game, state=state, **make_kwargs)
+
+        # Forked workers inherit the decompressed states too
+        self.state_cache = get_state_cache(game)
+        self.state_cache.preload((state,) + tuple(states))
+
+    def env_fns(self, num_envs, wrap):
+        """
+        Returns env constructors for a vector env. `wrap(env, rank)` wraps the
+        inherited retro env, e.g. in StreetFighterCustomWrapper and Monitor.
+        """
+        return [self._env_fn(wrap, rank) for rank in range(num_envs)]
+
+    def _env_fn(self, wrap, rank):
+        def _init():
+            return wrap(self.base_env, rank)
+        return _init
+
+    def close(self):
+        if self.base_env is not None:
+            self.base_env.close()
+            self.base_env = None
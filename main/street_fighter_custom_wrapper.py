@@ -12,22 +12,31 @@
 
 import math
 import time
-import collections
 
 import gym
 import numpy as np
 
-from fighter import Fighter
+from fighter import Fighter, MACRO_KEYS, MACRO_TABLE, MACRO_INDEX
+from frame_stack import FrameStack
+from macro_executor import MacroExecutor
+from observation import ObservationPipeline
+from renderer import AsyncRenderer
+from stage_timer import NullTimer
 
 # Custom environment wrapper
 class StreetFighterCustomWrapper(gym.Wrapper):
-    def __init__(self, env, reset_round=True, rendering=False):
+    def __init__(self, env, reset_round=True, rendering=False, share_obs=False, fast_step=False, ram_decoder=None,
+                 macro_action=False, recorder=None, obs_pipeline=None, timer=None, step_frames=None,
+                 planner=None, decision_cache=None):
         super(StreetFighterCustomWrapper, self).__init__(env)
         self.env = env
 
-        # Use a deque to store the last 9 frames
+        # Use a ring buffer to store the last 9 frames. The observation pipeline
+        # (crop, downsampling, grayscale, output size) defaults to obs[::2, ::2].
         self.num_frames = 9
-        self.frame_stack = collections.deque(maxlen=self.num_frames)
+        self.obs_pipeline = obs_pipeline if obs_pipeline is not None else ObservationPipeline()
+        self.frame_stack = FrameStack(num_frames=self.num_frames, shape=self.obs_pipeline.output_shape(3),
+                                      pipeline=self.obs_pipeline)
 
         self.num_step_frames = 6
 
@@ -39,15 +48,151 @@ class StreetFighterCustomWrapper(gym.Wrapper):
         self.prev_player_health = self.full_hp
         self.prev_oppont_health = self.full_hp
 
-        self.observation_space = gym.spaces.Box(low=0, high=255, shape=(100, 128, 3), dtype=np.uint8)
+        self.observation_space = gym.spaces.Box(low=0, high=255, shape=self.frame_stack.shape, dtype=np.uint8)
         
         self.reset_round = reset_round
-        self.rendering = rendering
+
+        # rendering=True renders in the step loop at real time,
+        # rendering="async" hands frames to a viewer thread and never waits.
+        self.rendering = bool(rendering)
+        self.renderer = AsyncRenderer() if rendering == "async" else None
+
+        # Return the frame stack buffer as a read-only view instead of a copy.
+        # Only safe when the caller consumes the observation before the next step.
+        self.share_obs = share_obs
+
+        # Drive the emulator directly and only grab the screen on frames the
+        # frame stack will consume. RAM is still updated on every frame.
+        self.fast_step = fast_step
+        if fast_step and self.num_step_frames % self.frame_stack.stride != 0:
+            raise ValueError("fast_step needs num_step_frames to be a multiple of the frame stack stride")
+        if fast_step and step_frames is not None and step_frames % self.frame_stack.stride != 0:
+            raise ValueError("fast_step needs step_frames to be a multiple of the frame stack stride")
+        self._button_masks = {}
+
+        # Optional RamDecoder. When set, Fighter and the reward read a record
+        # decoded from RAM in one pass instead of retro's info dict.
+        self.ram_decoder = ram_decoder
+        self._ram_checked = False
         
+        # Optional ReplayRecorder fed with every frame's buttons and RAM
+        self.recorder = recorder
+        self._seed = None
+
+        # Optional stage_timer.StageTimer charged with the time of each step stage
+        # (decision, emulator, observation, ram, record, render), see pop_timings.
+        self.timer = timer if timer is not None else NullTimer()
+
+        # With macro_action the action is an index into MACRO_TABLE chosen by
+        # the caller (e.g. VecFighter over a whole vector env) instead of Fighter.
+        # macro_action="hybrid" adds action 0, which keeps playing the queued
+        # macro or lets Fighter pick one when the queue is empty, and shifts
+        # the macro indices by one.
+        self.macro_action = macro_action
+        if macro_action == "hybrid":
+            self.action_space = gym.spaces.Discrete(len(MACRO_TABLE) + 1)
+        elif macro_action:
+            self.action_space = gym.spaces.Discrete(len(MACRO_TABLE))
+
+        # Macros are queued in an executor and each step plays at most
+        # step_frames frames of it (None plays the whole macro in one step).
+        self.step_frames = step_frames
+        self.executor = MacroExecutor(self.num_step_frames)
+
+        # Optional planner.LookaheadPlanner that replaces Fighter's rules by
+        # simulating the candidate macros from a save state, Fighter's pick is the fallback.
+        self.planner = planner
+
+        # Optional decision_cache.DecisionCache memoizing Fighter's pick per quantized RAM state
+        self.decision_cache = decision_cache
+        
+        # RAM variables after the last step as a plain dict, plus the RamDecoder record they came from
         self.prev_info = None
+        self.prev_ram = None
+        self.fighter = Fighter(None)
+        # Index of the macro played by the last step
+        self.last_macro = None
     
     def _stack_observation(self):
-        return np.stack([self.frame_stack[i * 3 + 2][:, :, i] for i in range(3)], axis=-1)
+        return self.frame_stack.observation(copy=not self.share_obs)
+
+    def _render(self, frame):
+        if self.renderer is not None:
+            self.renderer.submit(frame)
+        else:
+            self.env.render()
+            time.sleep(1.0 / 60.0)
+
+    def _button_mask(self, move):
+        # Emulator button mask for a move, converted by retro once and cached
+        key = bytes(move)
+        mask = self._button_masks.get(key)
+        if mask is None:
+            mask = self.env.unwrapped.action_to_array(move)[0]
+            self._button_masks[key] = mask
+        return mask
+
+    def _play_sequence(self, runs):
+        recorder = self.recorder
+        timer = self.timer
+        for move, num_frames in runs:
+            for _ in range(num_frames):
+                obs, _reward, _done, info = self.env.step(move)
+                timer.lap("emulator")
+                self.frame_stack.push(obs)
+                timer.lap("observation")
+                if recorder is not None:
+                    recorder.record_frame(self._button_mask(move), self.env.unwrapped.get_ram())
+                    timer.lap("record")
+                if self.rendering:
+                    self._render(obs)
+                    timer.lap("render")
+        return info
+
+    def _fast_play_sequence(self, runs):
+        retro_env = self.env.unwrapped
+        em = retro_env.em
+        data = retro_env.data
+
+        recorder = self.recorder
+        timer = self.timer
+
+        lag = sum(num_frames for _move, num_frames in runs)
+        for move, num_frames in runs:
+            mask = self._button_mask(move)
+            em.set_button_mask(mask, 0)
+            for _ in range(num_frames):
+                lag -= 1
+                em.step()
+                data.update_ram()
+                timer.lap("emulator")
+                if recorder is not None:
+                    recorder.record_frame(mask, retro_env.get_ram())
+                    timer.lap("record")
+                if self.rendering or self.frame_stack.is_consumed(lag):
+                    # get_screen applies the scenario crop like env.step does
+                    retro_env.img = retro_env.get_screen()
+                    self.frame_stack.push(retro_env.img)
+                else:
+                    self.frame_stack.push(None)
+                timer.lap("observation")
+                if self.rendering:
+                    self._render(retro_env.img)
+                    timer.lap("render")
+
+        if self.ram_decoder is not None:
+            # Info is built from the decoded record in step()
+            return None
+        return dict(data.lookup_all())
+
+    def _decode_ram(self):
+        ram = self.ram_decoder.decode(self.env.unwrapped.get_ram())
+        if not self._ram_checked:
+            info = self.env.unwrapped.data.lookup_all()
+            if not self.ram_decoder.matches(ram, info):
+                raise ValueError("RamDecoder does not match retro's info, check its base address and word_swap")
+            self._ram_checked = True
+        return ram
 
     def reset(self):
         print("Reset game")
@@ -59,30 +204,67 @@ class StreetFighterCustomWrapper(gym.Wrapper):
 
         self.total_timesteps = 0
         self.prev_info = None
+        self.prev_ram = None
+        self.executor.cancel()
         
-        # Clear the frame stack and add the first observation [num_frames] times
-        self.frame_stack.clear()
-        for _ in range(self.num_frames):
-            self.frame_stack.append(observation[::2, ::2, :])
+        # Fill the frame stack with the first observation
+        self.frame_stack.fill(observation)
 
-        return np.stack([self.frame_stack[i * 3 + 2][:, :, i] for i in range(3)], axis=-1)
+        if self.recorder is not None:
+            self.recorder.start(self.env.unwrapped, seed=self._seed)
+
+        return self._stack_observation()
         
+    def compute_reward(self, curr_player_health, curr_oppont_health):
+        """
+        Returns (reward, round_over) for the HP at the end of a step and
+        updates the HP kept from the previous step.
+        """
+        if curr_player_health < 0:
+            custom_reward = -math.pow(self.full_hp, (curr_oppont_health + 1) / (self.full_hp + 1))
+            custom_done = True
+        elif curr_oppont_health < 0:
+            custom_reward = math.pow(self.full_hp, (curr_player_health + 1) / (self.full_hp + 1)) * self.reward_coeff
+            custom_done = True
+        else:
+            health_difference = self.prev_oppont_health - curr_oppont_health
+            custom_reward = self.reward_coeff * health_difference - (self.prev_player_health - curr_player_health)
+            self.prev_player_health = curr_player_health
+            self.prev_oppont_health = curr_oppont_health
+            custom_done = False
+
+        return custom_reward, custom_done
+
     def step(self, action):
-        custom_done = False
-        custom_reward = 0
-        
-        fighter = Fighter(self.prev_info)
-        sequence = fighter.get_best_move()
-        
-        for move in sequence:
-            for _ in range(self.num_step_frames):
-                obs, _reward, _done, info = self.env.step(move)
-                self.frame_stack.append(obs[::2, ::2, :])
-                if self.rendering:
-                    self.env.render()
-                    time.sleep(1.0 / 60.0)
-                    
-        self.prev_info = info
+        timer = self.timer
+        timer.mark()
+        if self.macro_action == "hybrid":
+            if int(action) > 0:
+                self._start_macro(int(action) - 1)
+            elif self.executor.idle:
+                self._start_macro(self._fighter_macro())
+        elif self.macro_action:
+            self._start_macro(int(action))
+        elif self.executor.idle:
+            self._start_macro(self._fighter_macro())
+        self.last_macro = self.executor.macro
+        runs = self.executor.advance(self.step_frames)
+        timer.lap("decision")
+
+        if self.fast_step:
+            info = self._fast_play_sequence(runs)
+        else:
+            info = self._play_sequence(runs)
+
+        if self.recorder is not None:
+            self.recorder.end_step()
+            timer.lap("record")
+
+        if self.ram_decoder is not None:
+            self.prev_ram = self._decode_ram()
+            if info is None:
+                # Converted once per step, Fighter, the reward and the caller read plain ints from the dict
+                info = self.ram_decoder.to_dict(self.prev_ram)
                     
         # obs, _reward, _done, info = self.env.step(action)
         # self.frame_stack.append(obs[::2, ::2, :])
@@ -98,25 +280,50 @@ class StreetFighterCustomWrapper(gym.Wrapper):
                 
         self.prev_info = info
 
-        curr_player_health = info['agent_hp']
-        curr_oppont_health = info['enemy_hp']
-        self.total_timesteps += self.num_step_frames
+        self.total_timesteps += sum(num_frames for _move, num_frames in runs)
 
-        if curr_player_health < 0:
-            custom_reward = -math.pow(self.full_hp, (curr_oppont_health + 1) / (self.full_hp + 1))
-            custom_done = True
-        elif curr_oppont_health < 0:
-            custom_reward = math.pow(self.full_hp, (curr_player_health + 1) / (self.full_hp + 1)) * self.reward_coeff
-            custom_done = True
-        else:
-            health_difference = self.prev_oppont_health - curr_oppont_health
-            custom_reward = self.reward_coeff * health_difference - (self.prev_player_health - curr_player_health)
-            self.prev_player_health = curr_player_health
-            self.prev_oppont_health = curr_oppont_health
-            custom_done = False
+        custom_reward, custom_done = self.compute_reward(info['agent_hp'], info['enemy_hp'])
 
         if not self.reset_round:
             custom_done = False
+        timer.lap("ram")
+
+        observation = self._stack_observation()
+        timer.lap("observation")
+
+        return observation, 0.001 * custom_reward, custom_done, info
+
+    def _fighter_rule(self):
+        self.fighter.update(self.prev_info)
+        return MACRO_INDEX[self.fighter.get_best_macro()]
+
+    def _fighter_macro(self):
+        if self.decision_cache is not None and self.prev_info is not None:
+            macro = self.decision_cache.lookup(self.decision_cache.key(self.prev_info), self._fighter_rule)
+        else:
+            macro = self._fighter_rule()
+        if self.planner is not None:
+            facing_right = MACRO_KEYS[macro][2]
+            macro = self.planner.plan(self.env.unwrapped, facing_right, fallback=macro)
+        return macro
+
+    def _start_macro(self, macro):
+        self.executor.start(MACRO_TABLE[macro], macro)
+
+    def pop_timings(self):
+        """
+        Seconds spent per step stage since the last call.
+        """
+        return self.timer.pop()
+
+    def seed(self, seed=None):
+        self._seed = seed
+        return self.env.seed(seed)
 
-        return self._stack_observation(), 0.001 * custom_reward, custom_done, info
-    
\ No newline at end of file
+    def close(self):
+        if self.recorder is not None:
+            self.recorder.finish()
+        if self.renderer is not None:
+            self.renderer.close()
+            self.renderer = None
+        return self.env.close()
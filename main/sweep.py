@@ -0,0 +1,186 @@
+import os
+import csv
+import json
+import glob
+import hashlib
+import argparse
+import concurrent.futures
+
+import numpy as np
+
+GAME = "StreetFighterIISpecialChampionEdition-Genesis"
+MODEL_DIR = r"trained_models/"
+CACHE_FILE = "sweep_cache.json"
+DEFAULT_STATES = ["Champion.Level12.RyuVsBison"]
+
+# Each worker process owns one emulator (retro allows only one per process)
+_worker_env = None
+
+def _init_worker(game, state, settings):
+    global _worker_env
+    import retro
+    from train import build_wrapper
+
+    env = retro.make(
+        game=game,
+        state=state,
+        use_restricted_actions=retro.Actions.FILTERED,
+        obs_type=retro.Observations.IMAGE
+    )
+    # The checkpoints' own wrapper settings, so the policy sees the observations it was trained on
+    _worker_env = build_wrapper(env, reset_round=True, **settings)
+
+def _evaluate(task):
+    """
+    Plays `num_episodes` rounds of one checkpoint on one state, like test.py.
+    """
+    from stable_baselines3 import PPO
+    from replay import ReplayRecorder
+    from state_cache import get_state_cache
+
+    model_path, state, num_episodes, deterministic, record_dir = task
+    env = _worker_env
+    model = PPO.load(model_path, device="cpu")
+    if record_dir is not None:
+        # Archive every episode as a compact input + RAM replay
+        directory = os.path.join(record_dir, os.path.splitext(os.path.basename(model_path))[0], state)
+        env.recorder = ReplayRecorder(env.ram_decoder, directory=directory)
+
+    rewards = []
+    num_victory = 0
+    obs = get_state_cache(GAME).restore(env, state)
+    for episode in range(num_episodes):
+        if episode > 0:
+            obs = env.reset()
+        done = False
+        total_reward = 0.0
+        while not done:
+            action, _states = model.predict(obs, deterministic=deterministic)
+            obs, reward, done, info = env.step(action)
+            total_reward += reward
+            if info['enemy_hp'] < 0 or info['agent_hp'] < 0:
+                done = True
+        if info['enemy_hp'] < 0:
+            num_victory += 1
+        rewards.append(total_reward)
+
+    if env.recorder is not None:
+        env.recorder.finish()
+        env.recorder = None
+
+    return {
+        "win_rate": num_victory / num_episodes,
+        "mean_reward": float(np.mean(rewards)),
+        "std_reward": float(np.std(rewards)),
+    }
+
+def file_hash(path):
+    sha = hashlib.sha256()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(1 << 20), b""):
+            sha.update(chunk)
+    return sha.hexdigest()
+
+def cache_key(digest, state, num_episodes, deterministic):
+    return "{}:{}:{}:{}".format(digest, state, num_episodes, "det" if deterministic else "stoch")
+
+def load_cache(path):
+    if os.path.isfile(path):
+        with open(path) as f:
+            return json.load(f)
+    return {}
+
+def save_cache(path, cache):
+    tmp_path = path + ".tmp"
+    with open(tmp_path, "w") as f:
+        json.dump(cache, f, indent=2, sort_keys=True)
+    os.replace(tmp_path, path)
+
+def sweep(model_dir=MODEL_DIR, states=DEFAULT_STATES, num_episodes=10, deterministic=False, num_workers=None, pattern="*.zip",
+          record_dir=None):
+    """
+    Evaluates every checkpoint in `model_dir` on every state and returns the
+    leaderboard rows, best first. Results are cached by checkpoint content
+    hash, state and episode count, so only new checkpoints are played. With
+    `record_dir`, every newly played episode is saved as a replay.
+    """
+    from train import load_wrapper_settings
+
+    checkpoints = sorted(glob.glob(os.path.join(model_dir, pattern)))
+    cache_path = os.path.join(model_dir, CACHE_FILE)
+    cache = load_cache(cache_path)
+
+    digests = {path: file_hash(path) for path in checkpoints}
+    tasks = []
+    for path in checkpoints:
+        for state in states:
+            if cache_key(digests[path], state, num_episodes, deterministic) not in cache:
+                tasks.append((path, state, num_episodes, deterministic, record_dir))
+
+    print("{} checkpoints x {} states, {} cached, {} to evaluate".format(
+        len(checkpoints), len(states), len(checkpoints) * len(states) - len(tasks), len(tasks)))
+
+    if tasks:
+        num_workers = min(num_workers or os.cpu_count() or 1, len(tasks))
+        with concurrent.futures.ProcessPoolExecutor(max_workers=num_workers, initializer=_init_worker,
+                                                    initargs=(GAME, states[0], load_wrapper_settings(model_dir))) as executor:
+            futures = {executor.submit(_evaluate, task): task for task in tasks}
+            for future in concurrent.futures.as_completed(futures):
+                path, state = futures[future][:2]
+                result = future.result()
+                cache[cache_key(digests[path], state, num_episodes, deterministic)] = result
+                # Save as we go so an interrupted sweep keeps its results
+                save_cache(cache_path, cache)
+                print("{} on {}: win rate {:.2f}, reward {:.3f}".format(
+                    os.path.basename(path), state, result["win_rate"], result["mean_reward"]))
+
+    rows = []
+    for path in checkpoints:
+        results = [cache[cache_key(digests[path], state, num_episodes, deterministic)] for state in states]
+        row = {"checkpoint": os.path.basename(path)}
+        for state, result in zip(states, results):
+            row[state] = result["win_rate"]
+        row["win_rate"] = float(np.mean([result["win_rate"] for result in results]))
+        row["mean_reward"] = float(np.mean([result["mean_reward"] for result in results]))
+        rows.append(row)
+    rows.sort(key=lambda row: (row["win_rate"], row["mean_reward"]), reverse=True)
+    return rows
+
+def print_leaderboard(rows, states):
+    print("\n{:<4} {:<45} {:>8} {:>10}".format("#", "checkpoint", "win", "reward"))
+    for rank, row in enumerate(rows, 1):
+        print("{:<4} {:<45} {:>8.2f} {:>10.3f}".format(rank, row["checkpoint"], row["win_rate"], row["mean_reward"]))
+    if len(states) > 1:
+        print("\nWin rate per state:")
+        for row in rows:
+            print("{:<45} ".format(row["checkpoint"]) + " ".join("{}={:.2f}".format(state, row[state]) for state in states))
+
+def write_leaderboard(rows, path):
+    with open(path, "w", newline="") as f:
+        writer = csv.DictWriter(f, fieldnames=list(rows[0].keys()))
+        writer.writeheader()
+        writer.writerows(rows)
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Evaluate every checkpoint on a set of states and rank them.")
+    parser.add_argument("--model-dir", default=MODEL_DIR)
+    parser.add_argument("--states", nargs="+", default=DEFAULT_STATES)
+    parser.add_argument("--episodes", type=int, default=10)
+    parser.add_argument("--deterministic", action="store_true")
+    parser.add_argument("--workers", type=int, default=None, help="Defaults to the number of cores")
+    parser.add_argument("--pattern", default="*.zip")
+    parser.add_argument("--output", default=None, help="Write the leaderboard as CSV")
+    parser.add_argument("--record-dir", default=None, help="Save every evaluated episode as a replay")
+    args = parser.parse_args(argv)
+
+    rows = sweep(args.model_dir, args.states, args.episodes, args.deterministic, args.workers, args.pattern,
+                 args.record_dir)
+    if not rows:
+        print("No checkpoints found in {}".format(args.model_dir))
+        return
+    print_leaderboard(rows, args.states)
+    if args.output:
+        write_leaderboard(rows, args.output)
+
+if __name__ == "__main__":
+    main()
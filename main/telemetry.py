@@ -0,0 +1,166 @@
+import json
+import time
+import logging
+import collections
+import logging.handlers
+
+from stable_baselines3.common.callbacks import BaseCallback
+from stable_baselines3.common.vec_env import VecEnvWrapper, unwrap_vec_wrapper
+
+# Vector env wrapper timing env steps as seen by the learner
+class TimedVecEnv(VecEnvWrapper):
+    def __init__(self, venv, worker_timings=True):
+        super(TimedVecEnv, self).__init__(venv)
+        # Collect the per-stage totals of each env's StageTimer through pop_timings
+        self.worker_timings = worker_timings
+        self.env_time = 0.0
+        self.num_steps = 0
+        self._step_start = None
+
+    def reset(self):
+        start = time.perf_counter()
+        obs = self.venv.reset()
+        self.env_time += time.perf_counter() - start
+        return obs
+
+    def step_async(self, actions):
+        self._step_start = time.perf_counter()
+        self.venv.step_async(actions)
+
+    def step_wait(self):
+        result = self.venv.step_wait()
+        self.env_time += time.perf_counter() - self._step_start
+        self.num_steps += 1
+        return result
+
+    def pop_timings(self):
+        """
+        Returns (env_time, num_steps, worker_totals) since the last call,
+        worker_totals holding one dict of stage seconds per env.
+        """
+        timings = (self.env_time, self.num_steps, self.venv.env_method("pop_timings") if self.worker_timings else [])
+        self.env_time = 0.0
+        self.num_steps = 0
+        return timings
+
+def make_metrics_logger(path, max_bytes=10 * 1024 * 1024, backup_count=5):
+    # One JSON object per line, rotated so long runs do not fill the disk
+    logger = logging.getLogger("telemetry." + path)
+    logger.setLevel(logging.INFO)
+    logger.propagate = False
+    if not logger.handlers:
+        handler = logging.handlers.RotatingFileHandler(path, maxBytes=max_bytes, backupCount=backup_count)
+        handler.setFormatter(logging.Formatter("%(message)s"))
+        logger.addHandler(handler)
+    return logger
+
+class TelemetryCallback(BaseCallback):
+    """
+    Breaks each PPO iteration into rollout and update time, and the rollout
+    into env time (workers' emulator, observation, decision... stages plus
+    IPC and sync overhead) and policy time (inference, buffer, transposition).
+    Metrics go to the SB3 logger under telemetry/ and to a rotating JSONL file.
+
+    The rollout metrics are recorded at the end of the rollout, so they are
+    dumped with their own iteration. The update time is only known when the
+    next rollout starts; like SB3's train/ metrics it is dumped with the next
+    iteration, while the JSONL record of an iteration holds both.
+
+    Needs the training env wrapped in TimedVecEnv, and StreetFighterCustomWrapper
+    built with a StageTimer for the per-stage worker breakdown.
+    """
+    def __init__(self, log_path=None, max_bytes=10 * 1024 * 1024, backup_count=5, verbose=0):
+        super(TelemetryCallback, self).__init__(verbose)
+        self.log_path = log_path
+        self.max_bytes = max_bytes
+        self.backup_count = backup_count
+        self.metrics_logger = None
+        self.timed_env = None
+        self.iteration = 0
+        self._rollout_start = None
+        self._rollout_end = None
+        self._start_timesteps = 0
+        self._pending = None
+
+    def _on_training_start(self):
+        self.timed_env = unwrap_vec_wrapper(self.training_env, TimedVecEnv)
+        if self.timed_env is None:
+            raise ValueError("TelemetryCallback needs the training env wrapped in TimedVecEnv")
+        if self.log_path is not None:
+            self.metrics_logger = make_metrics_logger(self.log_path, self.max_bytes, self.backup_count)
+        # Drop whatever the initial reset accumulated
+        self.timed_env.pop_timings()
+
+    def _on_rollout_start(self):
+        now = time.perf_counter()
+        if self._pending is not None:
+            # The update of the previous iteration ran between its rollout end and now
+            self._emit(self._pending, update_time=now - self._rollout_end)
+            self._pending = None
+        self._rollout_start = now
+        self._start_timesteps = self.num_timesteps
+
+    def _on_step(self):
+        return True
+
+    def _on_rollout_end(self):
+        rollout_time = time.perf_counter() - self._rollout_start
+        fetch_start = time.perf_counter()
+        env_time, num_steps, workers = self.timed_env.pop_timings()
+        self._rollout_end = time.perf_counter()
+        self.iteration += 1
+        self._pending = self._rollout_metrics(rollout_time, env_time, num_steps, workers)
+        self._pending["telemetry_s"] = self._rollout_end - fetch_start
+        # Recorded now, the training loop dumps them right after the rollout
+        for key, value in self._pending.items():
+            if key not in ("iteration", "timesteps"):
+                self.logger.record("telemetry/" + key, value)
+
+    def _on_training_end(self):
+        if self._pending is not None:
+            # learn() returns after the last update, nothing dumps after it
+            self._emit(self._pending, update_time=time.perf_counter() - self._rollout_end)
+            self.logger.dump(self.num_timesteps)
+            self._pending = None
+
+    def _rollout_metrics(self, rollout_time, env_time, num_steps, workers):
+        timesteps = self.num_timesteps - self._start_timesteps
+        metrics = collections.OrderedDict([
+            ("iteration", self.iteration),
+            ("timesteps", self.num_timesteps),
+            ("num_envs", self.training_env.num_envs),
+            ("rollout_s", rollout_time),
+            ("env_s", env_time),
+            ("policy_s", rollout_time - env_time),
+            ("fps", timesteps / rollout_time if rollout_time > 0 else 0.0),
+        ])
+        if num_steps:
+            metrics["env_step_ms"] = 1000.0 * env_time / num_steps
+            metrics["policy_step_ms"] = 1000.0 * (rollout_time - env_time) / num_steps
+
+        workers = [w for w in workers if w]
+        if workers:
+            # Envs step in parallel: the busiest one bounds the env time, the rest
+            # of the env time is pipes, shared memory, sync and outer wrappers.
+            busy = [sum(w.values()) for w in workers]
+            for stage in sorted(set().union(*workers)):
+                metrics["worker/" + stage + "_s"] = sum(w.get(stage, 0.0) for w in workers) / len(workers)
+            metrics["worker/busy_s"] = sum(busy) / len(busy)
+            metrics["worker/busy_max_s"] = max(busy)
+            metrics["env_overhead_s"] = max(env_time - max(busy), 0.0)
+            metrics["worker_utilization"] = metrics["worker/busy_s"] / env_time if env_time > 0 else 0.0
+        return metrics
+
+    def _emit(self, metrics, update_time):
+        metrics["update_s"] = update_time
+        total = metrics["rollout_s"] + update_time
+        metrics["update_fraction"] = update_time / total if total > 0 else 0.0
+        self.logger.record("telemetry/update_s", metrics["update_s"])
+        self.logger.record("telemetry/update_fraction", metrics["update_fraction"])
+
+        if self.metrics_logger is not None:
+            record = collections.OrderedDict([("time", time.time())])
+            record.update(metrics)
+            self.metrics_logger.info(json.dumps(record))
+        if self.verbose > 0:
+            print("Telemetry: " + ", ".join("{}={:.4g}".format(k, v) for k, v in metrics.items()))
@@ -13,10 +13,12 @@
 import os
 import time 
 
-import retro
-from stable_baselines3 import PPO
+import numpy as np
 
-from street_fighter_custom_wrapper import StreetFighterCustomWrapper
+# retro, stable_baselines3, sb3_contrib and torch (through inference) are imported
+# where they are needed, so e.g. random play never loads torch
+from decision_cache import CachedPolicy, DecisionCache, uniform_edges
+from train import build_wrapper, load_wrapper_settings
 
 RESET_ROUND = True  # Whether to reset the round when fight is over. 
 RENDERING = True    # Whether to render the game screen.
@@ -30,77 +32,145 @@ MODEL_NAME = r"ppo_ryu_2500000_steps_updated" # Specify the model file to load.
 # ppo_ryu_7000000_steps_updated: Overfitted, dominates first round but not generalizable. 
 
 RANDOM_ACTION = False
+RECURRENT_MODEL = False # Set to True for models trained with USE_LSTM_POLICY
+ENGINE_PATH = None # Play with a model exported by inference.py (e.g. r"trained_models/ppo_ryu_2500000_steps_updated.pt") instead
 NUM_EPISODES = 30 # Make sure NUM_EPISODES >= 3 if you set RESET_ROUND to False to see the whole final stage game.
 MODEL_DIR = r"trained_models/"
-
-def make_env(game, state):
+GAME = "StreetFighterIISpecialChampionEdition-Genesis"
+STATE = "Champion.Level12.RyuVsBison"
+# Reuse the policy's decision when a quantized RAM state recurs (deterministic play, or an
+# exported engine whose logits are cached). Not for recurrent models.
+DECISION_CACHE = False
+DETERMINISTIC = False
+# Let planner.LookaheadPlanner pick Fighter's macros by simulating them in a pool of worker emulators
+PLANNER = False
+
+def make_env(game, state, reset_round=True, rendering=False, planner=None, settings=None):
+    # The wrapper settings of the checkpoints, see train.load_wrapper_settings
+    settings = load_wrapper_settings(MODEL_DIR) if settings is None else settings
     def _init():
+        import retro
+
         env = retro.make(
             game=game, 
             state=state, 
             use_restricted_actions=retro.Actions.FILTERED,
             obs_type=retro.Observations.IMAGE
         )
-        env = StreetFighterCustomWrapper(env, reset_round=RESET_ROUND, rendering=RENDERING)
+        env = build_wrapper(env, reset_round=reset_round, rendering=rendering, planner=planner, **settings)
         return env
     return _init
 
-game = "StreetFighterIISpecialChampionEdition-Genesis"
-env = make_env(game, state="Champion.Level12.RyuVsBison")()
-# model = PPO("CnnPolicy", env)
-
-if not RANDOM_ACTION:
-    model = PPO.load(os.path.join(MODEL_DIR, MODEL_NAME), env=env)
-
-obs = env.reset()
-done = False
-
-num_episodes = NUM_EPISODES
-episode_reward_sum = 0
-num_victory = 0
+def main(game=None, state=None, model_name=None, model_dir=None, engine_path=None, num_episodes=None,
+         random_action=None, recurrent_model=None, deterministic=None, decision_cache=None, reset_round=None,
+         rendering=None, planner=None):
+    """
+    Plays num_episodes rounds with a trained model (or random actions) and
+    returns the winning rate and average reward. Arguments left as None take
+    the module constants.
+    """
+    game = GAME if game is None else game
+    state = STATE if state is None else state
+    model_name = MODEL_NAME if model_name is None else model_name
+    model_dir = MODEL_DIR if model_dir is None else model_dir
+    engine_path = ENGINE_PATH if engine_path is None else engine_path
+    num_episodes = NUM_EPISODES if num_episodes is None else num_episodes
+    random_action = RANDOM_ACTION if random_action is None else random_action
+    recurrent_model = RECURRENT_MODEL if recurrent_model is None else recurrent_model
+    deterministic = DETERMINISTIC if deterministic is None else deterministic
+    decision_cache = DECISION_CACHE if decision_cache is None else decision_cache
+    reset_round = RESET_ROUND if reset_round is None else reset_round
+    rendering = RENDERING if rendering is None else rendering
+    planner = PLANNER if planner is None else planner
+
+    lookahead = None
+    if planner:
+        from planner import make_planner
+        lookahead = make_planner(game, state)
+    env = make_env(game, state, reset_round=reset_round, rendering=rendering, planner=lookahead,
+                   settings=load_wrapper_settings(model_dir))()
+    # model = PPO("CnnPolicy", env)
+
+    if engine_path is not None:
+        from inference import InferenceEngine
+        model = InferenceEngine(engine_path)
+    elif not random_action:
+        if recurrent_model:
+            from sb3_contrib import RecurrentPPO as algorithm
+        else:
+            from stable_baselines3 import PPO as algorithm
+        model = algorithm.load(os.path.join(model_dir, model_name), env=env)
 
-print("\nFighting Begins!\n")
+    if decision_cache and not random_action and not recurrent_model:
+        cache = DecisionCache(distance_edges=uniform_edges(8), y_edges=uniform_edges(16))
+        model = CachedPolicy(model, cache, info_fn=lambda: env.prev_info)
 
-for _ in range(num_episodes):
+    obs = env.reset()
     done = False
-    
-    if RESET_ROUND:
-        obs = env.reset()
-
-    total_reward = 0
 
-    while not done:
-        timestamp = time.time()
-
-        if RANDOM_ACTION:
-            obs, reward, done, info = env.step(env.action_space.sample())
-        else:
-            action, _states = model.predict(obs)
-            obs, reward, done, info = env.step(action)
-
-        if reward != 0:
-            total_reward += reward
-            print("Reward: {:.3f}, playerHP: {}, enemyHP:{}".format(reward, info['agent_hp'], info['enemy_hp']))
-        
-        if info['enemy_hp'] < 0 or info['agent_hp'] < 0:
-            done = True
-
-    if info['enemy_hp'] < 0:
-        print("Victory!")
-        num_victory += 1
-
-    print("Total reward: {}\n".format(total_reward))
-    episode_reward_sum += total_reward
-
-    if not RESET_ROUND:
-        while info['enemy_hp'] < 0 or info['agent_hp'] < 0:
-        # Inter scene transition. Do nothing.
-            obs, reward, done, info = env.step([0] * 12)
-            env.render()
-
-env.close()
-print("Winning rate: {}".format(1.0 * num_victory / num_episodes))
-if RANDOM_ACTION:
-    print("Average reward for random action: {}".format(episode_reward_sum/num_episodes))
-else:
-    print("Average reward for {}: {}".format(MODEL_NAME, episode_reward_sum/num_episodes))
\ No newline at end of file
+    episode_reward_sum = 0
+    num_victory = 0
+
+    print("\nFighting Begins!\n")
+
+    for _ in range(num_episodes):
+        done = False
+
+        if reset_round:
+            obs = env.reset()
+
+        total_reward = 0
+
+        # Hidden state of a recurrent policy, cleared at the start of every episode
+        lstm_states = None
+        episode_start = np.ones((1,), dtype=bool)
+
+        while not done:
+            timestamp = time.time()
+
+            if random_action:
+                obs, reward, done, info = env.step(env.action_space.sample())
+            else:
+                action, lstm_states = model.predict(obs, state=lstm_states, episode_start=episode_start,
+                                                    deterministic=deterministic)
+                episode_start = np.zeros((1,), dtype=bool)
+                obs, reward, done, info = env.step(action)
+
+            if reward != 0:
+                total_reward += reward
+                print("Reward: {:.3f}, playerHP: {}, enemyHP:{}".format(reward, info['agent_hp'], info['enemy_hp']))
+
+            if info['enemy_hp'] < 0 or info['agent_hp'] < 0:
+                done = True
+
+        if info['enemy_hp'] < 0:
+            print("Victory!")
+            num_victory += 1
+
+        print("Total reward: {}\n".format(total_reward))
+        episode_reward_sum += total_reward
+
+        if not reset_round:
+            while info['enemy_hp'] < 0 or info['agent_hp'] < 0:
+            # Inter scene transition. Do nothing.
+                obs, reward, done, info = env.step([0] * 12)
+                env.render()
+
+    env.close()
+    if lookahead is not None:
+        print("Planner: {}".format(lookahead.stats()))
+        lookahead.close()
+    print("Winning rate: {}".format(1.0 * num_victory / num_episodes))
+    if not random_action and isinstance(model, CachedPolicy):
+        print("Decision cache: {}".format(model.cache.stats()))
+    if random_action:
+        print("Average reward for random action: {}".format(episode_reward_sum/num_episodes))
+    else:
+        print("Average reward for {}: {}".format(model_name, episode_reward_sum/num_episodes))
+    return {
+        "win_rate": 1.0 * num_victory / num_episodes,
+        "mean_reward": episode_reward_sum / num_episodes,
+    }
+
+if __name__ == "__main__":
+    main()
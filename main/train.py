@@ -12,19 +12,46 @@
 
 import os
 import sys
-
-import retro
-from stable_baselines3 import PPO
-from stable_baselines3.common.monitor import Monitor
-from stable_baselines3.common.callbacks import CheckpointCallback
-from stable_baselines3.common.vec_env import SubprocVecEnv
-
+import json
+import multiprocessing
+
+# retro, torch, stable_baselines3 and sb3_contrib are imported where they are
+# used, so importing this module (e.g. for make_env in an env worker) is cheap
+from observation import ObservationPipeline
+from ram_decoder import RamDecoder
+from stage_timer import StageTimer
 from street_fighter_custom_wrapper import StreetFighterCustomWrapper
 
 #NUM_ENV = 16
 NUM_ENV = 1
+RENDER_ENV = 0 # Index of the env to watch, None to train without a window
+USE_SHARED_MEMORY = True # Pass observations through shared memory instead of pipes
+# Fork workers from a parent that already loaded the ROM. Needs the fork start method, so it is off on Windows
+USE_PREWARMED_POOL = "fork" in multiprocessing.get_all_start_methods()
+# Observation preprocessing. Smaller inputs, e.g. dict(size=(84, 84), mode="area", grayscale=True),
+# make the CNN and the rollout buffer proportionally cheaper.
+OBS_PIPELINE = dict(size=(100, 128), mode="stride", grayscale=False, crop=None)
+USE_LSTM_POLICY = False # Train the recurrent CustomLstmPolicy with RecurrentPPO instead of PPO + CnnPolicy
+# "hybrid" lets the policy pick a Fighter macro each step (0 keeps the queued one or asks Fighter),
+# False plays Fighter's macros and ignores the action
+MACRO_ACTION = False
+STEP_FRAMES = None # Frames played per step, e.g. 6 so macros can be replaced mid-way. None plays whole macros
+KEEP_CHECKPOINTS = 5 # Newest checkpoints kept in trained_models, on top of the best by evaluation reward
+# Every checkpoint is scored by EVAL_EPISODES deterministic rounds on EVAL_STATE (None: the training state).
+# A state left out of training, e.g. "VsKen", measures generalization instead of fit.
+EVAL_STATE = None
+EVAL_EPISODES = 2
+TELEMETRY = True # Time rollout stages, env IPC and the PPO update into TensorBoard and trained_models/telemetry.jsonl
+GAME = "StreetFighterIISpecialChampionEdition-Genesis"
+STATE = "Champion.Level12.RyuVsBison"
+TOTAL_TIMESTEPS = 100000000 # total_timesteps = stage_interval * num_envs * num_stages (1120 rounds)
+SAVE_DIR = "trained_models"
+SETTINGS_FILE = "wrapper_settings.json" # The wrapper settings of the checkpoints in SAVE_DIR
 LOG_DIR = 'logs'
-os.makedirs(LOG_DIR, exist_ok=True)
+# PPO arguments, learning_rate and clip_range are (start, end) pairs of a linear schedule.
+# Fine-tune: learning_rate=(5.0e-5, 2.5e-6), clip_range=(0.075, 0.025)
+PPO_KWARGS = dict(n_steps=512, batch_size=512, n_epochs=4, gamma=0.94,
+                  learning_rate=(2.5e-4, 2.5e-6), clip_range=(0.15, 0.025))
 
 # Linear scheduler
 def linear_schedule(initial_value, final_value=0.0):
@@ -39,72 +66,164 @@ def linear_schedule(initial_value, final_value=0.0):
 
     return scheduler
 
-def make_env(game, state, seed=0):
+def wrapper_kwargs():
+    """
+    The wrapper settings of the module constants, read when called so that
+    constants changed at runtime (e.g. by cli.py --set) apply.
+    """
+    return dict(obs_pipeline=OBS_PIPELINE, macro_action=MACRO_ACTION, step_frames=STEP_FRAMES, telemetry=TELEMETRY)
+
+def save_wrapper_settings(save_dir, settings):
+    with open(os.path.join(save_dir, SETTINGS_FILE), "w") as f:
+        json.dump(settings, f, indent=2)
+
+def load_wrapper_settings(model_dir):
+    """
+    The wrapper settings the checkpoints in model_dir were trained with,
+    the module constants for directories written before they were saved.
+    Telemetry is off, evaluation does not time its stages.
+    """
+    path = os.path.join(model_dir, SETTINGS_FILE)
+    if os.path.isfile(path):
+        with open(path) as f:
+            settings = json.load(f)
+    else:
+        settings = wrapper_kwargs()
+    return dict(settings, telemetry=False)
+
+def build_wrapper(env, rendering=False, obs_pipeline=None, macro_action=False, step_frames=None, telemetry=False,
+                  **kwargs):
+    # Further keyword arguments (reset_round, planner...) go to the wrapper as is
+    return StreetFighterCustomWrapper(env, rendering=rendering, fast_step=True, ram_decoder=RamDecoder.from_json(),
+                                      obs_pipeline=ObservationPipeline(**obs_pipeline) if obs_pipeline else None,
+                                      timer=StageTimer() if telemetry else None,
+                                      macro_action=macro_action, step_frames=step_frames, **kwargs)
+
+def wrap_env(env, seed=0, rendering=False, obs_pipeline=None, macro_action=False, step_frames=None, telemetry=False):
+    from stable_baselines3.common.monitor import Monitor
+
+    env = build_wrapper(env, rendering=rendering, obs_pipeline=obs_pipeline, macro_action=macro_action,
+                        step_frames=step_frames, telemetry=telemetry)
+    env = Monitor(env)
+    env.seed(seed)
+    return env
+
+def make_env(game, state, seed=0, rendering=False, settings=None):
+    # The settings are resolved here and carried by the closure, so workers
+    # started with spawn build the same env as the parent
+    settings = wrapper_kwargs() if settings is None else settings
     def _init():
+        import retro
+
         env = retro.make(
             game=game, 
             state=state, 
             use_restricted_actions=retro.Actions.FILTERED, 
             obs_type=retro.Observations.IMAGE    
         )
-        env = StreetFighterCustomWrapper(env, rendering=True)
-        env = Monitor(env)
-        env.seed(seed)
-        return env
+        return wrap_env(env, seed=seed, rendering=rendering, **settings)
     return _init
 
-def main():
-    # Set up the environment and model
-    game = "StreetFighterIISpecialChampionEdition-Genesis"
-    env = SubprocVecEnv([make_env(game, state="Champion.Level12.RyuVsBison", seed=i) for i in range(NUM_ENV)])
-
-    # Set linear schedule for learning rate
-    # Start
-    lr_schedule = linear_schedule(2.5e-4, 2.5e-6)
+def make_model(env, device="cuda", use_lstm=False, ppo_kwargs=None, tensorboard_log=LOG_DIR):
+    from stable_baselines3 import PPO
 
-    # fine-tune
-    # lr_schedule = linear_schedule(5.0e-5, 2.5e-6)
+    kwargs = dict(PPO_KWARGS, **(ppo_kwargs or {}))
+    # Set linear schedules for the learning rate and clip range, a plain number stays constant
+    for name in ("learning_rate", "clip_range"):
+        if isinstance(kwargs[name], (list, tuple)):
+            kwargs[name] = linear_schedule(*kwargs[name])
 
-    # Set linear scheduler for clip range
-    # Start
-    clip_range_schedule = linear_schedule(0.15, 0.025)
+    if use_lstm:
+        from sb3_contrib import RecurrentPPO
+        from custom_policy import CustomLstmPolicy
+        algorithm, policy = RecurrentPPO, CustomLstmPolicy
+    else:
+        algorithm, policy = PPO, "CnnPolicy"
 
-    # fine-tune
-    # clip_range_schedule = linear_schedule(0.075, 0.025)
-
-    model = PPO(
-        "CnnPolicy", 
+    return algorithm(
+        policy, 
         env,
-        device="cuda", 
+        device=device, 
         verbose=1,
-        n_steps=512,
-        batch_size=512,
-        n_epochs=4,
-        gamma=0.94,
-        learning_rate=lr_schedule,
-        clip_range=clip_range_schedule,
-        tensorboard_log="logs"
+        tensorboard_log=tensorboard_log,
+        **kwargs
     )
 
+def main(game=None, state=None, total_timesteps=None, save_dir=None, ppo_kwargs=None, device="cuda"):
+    """
+    Trains on NUM_ENV envs. Arguments left as None take the module constants,
+    ppo_kwargs entries override PPO_KWARGS.
+    """
+    from stable_baselines3.common.vec_env import SubprocVecEnv
+
+    from checkpoint import AsyncCheckpointCallback, EvalScore
+    from shm_vec_env import ShmVecEnv
+    from telemetry import TelemetryCallback, TimedVecEnv
+
+    game = GAME if game is None else game
+    state = STATE if state is None else state
+    total_timesteps = TOTAL_TIMESTEPS if total_timesteps is None else total_timesteps
+    save_dir = SAVE_DIR if save_dir is None else save_dir
+    ppo_kwargs = dict(PPO_KWARGS, **(ppo_kwargs or {}))
+    settings = wrapper_kwargs()
+    os.makedirs(LOG_DIR, exist_ok=True)
+
+    # Set up the environment and model
+    # Only the first env is watched, through a viewer thread, so no env is held to real time
+    rendering = lambda i: "async" if i == RENDER_ENV else False
+    if USE_PREWARMED_POOL:
+        from state_cache import PrewarmedEnvPool
+        pool = PrewarmedEnvPool(game, state)
+        env_fns = pool.env_fns(NUM_ENV, lambda env, i: wrap_env(env, seed=i, rendering=rendering(i), **settings))
+        start_method = "fork"
+    else:
+        env_fns = [make_env(game, state=state, seed=i, rendering=rendering(i), settings=settings)
+                   for i in range(NUM_ENV)]
+        start_method = None
+
+    if USE_SHARED_MEMORY:
+        # Nothing in training reads get_ram(), so the workers do not copy the RAM out
+        env = ShmVecEnv(env_fns, start_method=start_method)
+    else:
+        env = SubprocVecEnv(env_fns, start_method=start_method)
+
+    if settings["telemetry"]:
+        env = TimedVecEnv(env)
+
+    if USE_PREWARMED_POOL:
+        # The workers have their own copies now
+        pool.close()
+
+    model = make_model(env, device=device, use_lstm=USE_LSTM_POLICY, ppo_kwargs=ppo_kwargs, tensorboard_log=LOG_DIR)
+
     # Set the save directory
-    save_dir = "trained_models"
     os.makedirs(save_dir, exist_ok=True)
+    # test.py, evaluate.py and sweep.py rebuild the env of these checkpoints from it
+    save_wrapper_settings(save_dir, settings)
 
     # Load the model from file
     # model_path = "trained_models/ppo_ryu_7000000_steps.zip"
     
     # Load model and modify the learning rate and entropy coefficient
     # custom_objects = {
-    #     "learning_rate": lr_schedule,
-    #     "clip_range": clip_range_schedule,
-    #     "n_steps": 512
+    #     "learning_rate": linear_schedule(*ppo_kwargs["learning_rate"]),
+    #     "clip_range": linear_schedule(*ppo_kwargs["clip_range"]),
+    #     "n_steps": ppo_kwargs["n_steps"]
     # }
     # model = PPO.load(model_path, env=env, device="cuda", custom_objects=custom_objects)
 
     # Set up callbacks
     # Note that 1 timesetp = 6 frame
     checkpoint_interval = 31250 # checkpoint_interval * num_envs = total_steps_per_checkpoint
-    checkpoint_callback = CheckpointCallback(save_freq=checkpoint_interval, save_path=save_dir, name_prefix="ppo_ryu")
+    # Checkpoints are written and played on EVAL_STATE from a background thread, only the newest few plus the
+    # best scoring one are kept
+    eval_score = EvalScore(make_env(game, EVAL_STATE or state, seed=NUM_ENV, settings=settings),
+                           n_eval_episodes=EVAL_EPISODES)
+    checkpoint_callback = AsyncCheckpointCallback(save_freq=checkpoint_interval, save_path=save_dir, name_prefix="ppo_ryu",
+                                                  keep_last=KEEP_CHECKPOINTS, score_fn=eval_score)
+    callbacks = [checkpoint_callback]
+    if settings["telemetry"]:
+        callbacks.append(TelemetryCallback(log_path=os.path.join(save_dir, "telemetry.jsonl")))
 
     # Writing the training logs from stdout to a file
     original_stdout = sys.stdout
@@ -113,8 +232,8 @@ def main():
         sys.stdout = log_file
     
         model.learn(
-            total_timesteps=int(100000000), # total_timesteps = stage_interval * num_envs * num_stages (1120 rounds)
-            callback=[checkpoint_callback]#, stage_increase_callback]
+            total_timesteps=int(total_timesteps),
+            callback=callbacks#, stage_increase_callback]
         )
         env.close()
 
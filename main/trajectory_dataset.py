@@ -0,0 +1,292 @@
+import os
+import json
+import zlib
+import argparse
+import multiprocessing as mp
+
+import numpy as np
+import torch as th
+from torch.utils.data import IterableDataset, DataLoader, get_worker_info
+
+META_FILE = "meta.json"
+
+def encode_frames(obs, level):
+    # XOR against the previous frame: unchanged pixels become zeros, which zlib squeezes well
+    delta = obs.copy()
+    delta[1:] ^= obs[:-1]
+    return zlib.compress(delta.tobytes(), level)
+
+def decode_frames(blob, shape, dtype):
+    delta = np.frombuffer(zlib.decompress(blob), dtype=dtype).reshape((-1,) + tuple(shape))
+    return np.bitwise_xor.accumulate(delta, axis=0)
+
+# Chunked rollout writer
+class TrajectoryWriter:
+    """
+    Appends (obs, action, reward, done, ram) steps to one shard directory.
+
+    Observations are written in chunks of `chunk_size` frames, XOR-delta
+    encoded against the previous frame and zlib compressed, into one obs.bin
+    with an offset index. Actions, rewards, dones and RAM records go to flat
+    binary files that the reader memory-maps.
+    """
+    def __init__(self, directory, obs_shape, obs_dtype=np.uint8, action_dtype=np.int64, ram_dtype=None,
+                 chunk_size=256, level=1):
+        os.makedirs(directory, exist_ok=True)
+        self.directory = directory
+        self.obs_shape = tuple(obs_shape)
+        self.obs_dtype = np.dtype(obs_dtype)
+        self.action_dtype = np.dtype(action_dtype)
+        self.ram_dtype = np.dtype(ram_dtype) if ram_dtype is not None else None
+        self.chunk_size = chunk_size
+        self.level = level
+
+        self.num_steps = 0
+        self.offsets = [0]
+        self._buffers = self._empty_buffers()
+        self._files = {name: open(os.path.join(directory, name + ".bin"), "wb")
+                       for name in ("obs", "actions", "rewards", "dones") + (("ram",) if self.ram_dtype else ())}
+
+    @staticmethod
+    def _empty_buffers():
+        return {"obs": [], "actions": [], "rewards": [], "dones": [], "ram": []}
+
+    def add(self, obs, action, reward, done, ram=None):
+        buffers = self._buffers
+        buffers["obs"].append(np.asarray(obs, dtype=self.obs_dtype))
+        buffers["actions"].append(action)
+        buffers["rewards"].append(reward)
+        buffers["dones"].append(done)
+        if self.ram_dtype is not None:
+            buffers["ram"].append(ram)
+        if len(buffers["obs"]) == self.chunk_size:
+            self.flush()
+
+    def flush(self):
+        buffers = self._buffers
+        if not buffers["obs"]:
+            return
+        blob = encode_frames(np.stack(buffers["obs"]), self.level)
+        self._files["obs"].write(blob)
+        self.offsets.append(self.offsets[-1] + len(blob))
+        self._files["actions"].write(np.asarray(buffers["actions"], dtype=self.action_dtype).tobytes())
+        self._files["rewards"].write(np.asarray(buffers["rewards"], dtype=np.float32).tobytes())
+        self._files["dones"].write(np.asarray(buffers["dones"], dtype=np.bool_).tobytes())
+        if self.ram_dtype is not None:
+            self._files["ram"].write(np.array(buffers["ram"], dtype=self.ram_dtype).tobytes())
+        self.num_steps += len(buffers["obs"])
+        self._buffers = self._empty_buffers()
+
+    def close(self):
+        self.flush()
+        for f in self._files.values():
+            f.close()
+        np.save(os.path.join(self.directory, "obs_index.npy"), np.array(self.offsets, dtype=np.int64))
+        meta = {
+            "num_steps": self.num_steps,
+            "chunk_size": self.chunk_size,
+            "obs_shape": list(self.obs_shape),
+            "obs_dtype": self.obs_dtype.str,
+            "action_dtype": self.action_dtype.str,
+            "ram_dtype": self.ram_dtype.descr if self.ram_dtype is not None else None,
+        }
+        with open(os.path.join(self.directory, META_FILE), "w") as f:
+            json.dump(meta, f, indent=2)
+
+class TrajectoryShard:
+    """
+    Read side of one shard: memory-mapped columns and on-demand chunk decoding.
+    """
+    def __init__(self, directory):
+        self.directory = directory
+        with open(os.path.join(directory, META_FILE)) as f:
+            self.meta = json.load(f)
+        self.num_steps = self.meta["num_steps"]
+        self.chunk_size = self.meta["chunk_size"]
+        self.obs_shape = tuple(self.meta["obs_shape"])
+        self.obs_dtype = np.dtype(self.meta["obs_dtype"])
+        self.offsets = np.load(os.path.join(directory, "obs_index.npy"))
+        self.num_chunks = len(self.offsets) - 1
+
+        self.obs_blob = self._memmap("obs", np.uint8)
+        self.actions = self._memmap("actions", np.dtype(self.meta["action_dtype"]))
+        self.rewards = self._memmap("rewards", np.float32)
+        self.dones = self._memmap("dones", np.bool_)
+        ram_dtype = self.meta["ram_dtype"]
+        self.ram = self._memmap("ram", np.dtype([tuple(field) for field in ram_dtype])) if ram_dtype else None
+
+    def _memmap(self, name, dtype):
+        path = os.path.join(self.directory, name + ".bin")
+        if os.path.getsize(path) == 0:
+            return np.zeros(0, dtype=dtype)
+        return np.memmap(path, dtype=dtype, mode="r")
+
+    def chunk(self, index):
+        """
+        Decodes chunk `index` into a dict of arrays.
+        """
+        start = index * self.chunk_size
+        blob = self.obs_blob[self.offsets[index]:self.offsets[index + 1]].tobytes()
+        obs = decode_frames(blob, self.obs_shape, self.obs_dtype)
+        end = start + len(obs)
+        batch = {
+            "obs": obs,
+            "actions": np.array(self.actions[start:end]),
+            "rewards": np.array(self.rewards[start:end]),
+            "dones": np.array(self.dones[start:end]),
+        }
+        if self.ram is not None:
+            batch["ram"] = np.array(self.ram[start:end])
+        return batch
+
+def find_shards(directory):
+    """
+    `directory` itself if it is a shard, otherwise every shard below it.
+    """
+    if os.path.isfile(os.path.join(directory, META_FILE)):
+        return [directory]
+    return sorted(os.path.join(directory, name) for name in os.listdir(directory)
+                  if os.path.isfile(os.path.join(directory, name, META_FILE)))
+
+# Streaming shuffled minibatches
+class TrajectoryDataset(IterableDataset):
+    """
+    Streams shuffled minibatches from one or more shards without loading the
+    dataset into memory.
+
+    Chunks are visited in random order. `shuffle_chunks` decoded chunks are
+    mixed in a buffer that minibatches are drawn from, so memory use is
+    bounded by that buffer. With a multi-worker DataLoader, every worker
+    decodes its own share of the chunks.
+
+    Every pass over the dataset advances the epoch, so consecutive epochs
+    are shuffled differently, also in persistent DataLoader workers that
+    keep their own copy of the dataset. set_epoch sets the epoch of the
+    next pass and only reaches workers started after the call.
+    """
+    def __init__(self, directory, batch_size=256, shuffle_chunks=8, seed=0, drop_last=True):
+        self.shard_dirs = find_shards(directory)
+        if not self.shard_dirs:
+            raise ValueError("No trajectory shard found in {}".format(directory))
+        self.batch_size = batch_size
+        self.shuffle_chunks = shuffle_chunks
+        self.seed = seed
+        self.drop_last = drop_last
+        self.epoch = 0
+        self._shards = None
+
+    def __len__(self):
+        num_steps = sum(TrajectoryShard(d).num_steps for d in self.shard_dirs)
+        return num_steps // self.batch_size if self.drop_last else -(-num_steps // self.batch_size)
+
+    def set_epoch(self, epoch):
+        self.epoch = epoch
+
+    def _chunks(self, epoch):
+        if self._shards is None:
+            # Opened lazily, so each DataLoader worker has its own memory maps
+            self._shards = [TrajectoryShard(d) for d in self.shard_dirs]
+        chunks = np.array([(s, c) for s, shard in enumerate(self._shards) for c in range(shard.num_chunks)])
+        rng = np.random.default_rng((self.seed, epoch))
+        chunks = chunks[rng.permutation(len(chunks))]
+
+        worker = get_worker_info()
+        if worker is not None:
+            chunks = chunks[worker.id::worker.num_workers]
+        return chunks, np.random.default_rng((self.seed, epoch, 0 if worker is None else worker.id + 1))
+
+    def _to_tensors(self, batch, index):
+        out = {name: th.from_numpy(np.ascontiguousarray(values[index])) for name, values in batch.items() if name != "ram"}
+        if "ram" in batch:
+            ram = batch["ram"][index]
+            for name in ram.dtype.names:
+                out["ram." + name] = th.from_numpy(ram[name].astype(np.int64))
+        return out
+
+    def __iter__(self):
+        # Each worker runs one pass per epoch, so their counters stay in step
+        epoch, self.epoch = self.epoch, self.epoch + 1
+        chunks, rng = self._chunks(epoch)
+        buffer = None
+        for n, (shard, chunk) in enumerate(chunks):
+            batch = self._shards[shard].chunk(chunk)
+            buffer = batch if buffer is None else {k: np.concatenate([buffer[k], batch[k]]) for k in buffer}
+            last = n == len(chunks) - 1
+            if len(buffer["obs"]) < self.shuffle_chunks * self._shards[shard].chunk_size and not last:
+                continue
+
+            # Draw minibatches until half the buffer is used, keep the rest for mixing
+            order = rng.permutation(len(buffer["obs"]))
+            keep = 0 if last else len(order) // 2
+            num_batches = (len(order) - keep) // self.batch_size
+            for i in range(num_batches):
+                yield self._to_tensors(buffer, order[i * self.batch_size:(i + 1) * self.batch_size])
+            rest = order[num_batches * self.batch_size:]
+            buffer = {k: v[rest] for k, v in buffer.items()}
+
+        if buffer is not None and len(buffer["obs"]) and not self.drop_last:
+            yield self._to_tensors(buffer, np.arange(len(buffer["obs"])))
+
+def make_loader(directory, batch_size=256, num_workers=4, shuffle_chunks=8, seed=0):
+    """
+    DataLoader over a trajectory dataset; batches are formed by the dataset.
+    """
+    dataset = TrajectoryDataset(directory, batch_size=batch_size, shuffle_chunks=shuffle_chunks, seed=seed)
+    return DataLoader(dataset, batch_size=None, num_workers=num_workers, pin_memory=th.cuda.is_available(),
+                      persistent_workers=num_workers > 0)
+
+def _collect_worker(args):
+    """
+    Plays the scripted Fighter in one env and writes its rollouts to one shard.
+    """
+    game, state, directory, num_steps, seed, chunk_size = args
+    import retro
+    from ram_decoder import RamDecoder
+    from street_fighter_custom_wrapper import StreetFighterCustomWrapper
+
+    env = retro.make(
+        game=game,
+        state=state,
+        use_restricted_actions=retro.Actions.FILTERED,
+        obs_type=retro.Observations.IMAGE
+    )
+    decoder = RamDecoder.from_json()
+    env = StreetFighterCustomWrapper(env, fast_step=True, ram_decoder=decoder)
+    env.seed(seed)
+
+    writer = TrajectoryWriter(directory, env.observation_space.shape, ram_dtype=decoder.dtype, chunk_size=chunk_size)
+    obs = env.reset()
+    for _ in range(num_steps):
+        next_obs, reward, done, info = env.step(None)
+        writer.add(obs, env.last_macro, reward, done, env.prev_ram)
+        obs = env.reset() if done else next_obs
+    writer.close()
+    env.close()
+    return directory
+
+def collect(directory, game, state, num_workers, steps_per_worker, chunk_size=256):
+    """
+    Collects scripted Fighter trajectories in parallel, one shard per worker.
+    """
+    tasks = [(game, state, os.path.join(directory, "shard_{:03d}".format(rank)), steps_per_worker, rank, chunk_size)
+             for rank in range(num_workers)]
+    # One emulator per process: every worker process plays a single shard
+    with mp.get_context("spawn").Pool(num_workers, maxtasksperchild=1) as pool:
+        return pool.map(_collect_worker, tasks)
+
+def main():
+    parser = argparse.ArgumentParser(description="Collect scripted Fighter trajectories for offline training.")
+    parser.add_argument("--output", default="trajectories")
+    parser.add_argument("--game", default="StreetFighterIISpecialChampionEdition-Genesis")
+    parser.add_argument("--state", default="Champion.Level12.RyuVsBison")
+    parser.add_argument("--workers", type=int, default=os.cpu_count() or 1)
+    parser.add_argument("--steps", type=int, default=10000, help="Steps per worker")
+    parser.add_argument("--chunk-size", type=int, default=256)
+    args = parser.parse_args()
+
+    shards = collect(args.output, args.game, args.state, args.workers, args.steps, args.chunk_size)
+    sizes = [sum(os.path.getsize(os.path.join(d, f)) for f in os.listdir(d)) for d in shards]
+    print("Wrote {} shards, {:.1f} MB".format(len(shards), sum(sizes) / 1e6))
+
+if __name__ == "__main__":
+    main()
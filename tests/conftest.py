@@ -0,0 +1,7 @@
+import os
+import sys
+
+# The modules in main/ import each other by bare name, like the scripts run from there
+MAIN_DIR = os.path.normpath(os.path.join(os.path.dirname(os.path.abspath(__file__)), os.pardir, "main"))
+if MAIN_DIR not in sys.path:
+    sys.path.insert(0, MAIN_DIR)
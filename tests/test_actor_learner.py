@@ -0,0 +1,127 @@
+import collections
+import socket
+import threading
+import time
+
+import numpy as np
+import pytest
+
+pytest.importorskip("stable_baselines3")
+
+from stable_baselines3 import PPO
+from stable_baselines3.common.logger import configure
+from stable_baselines3.common.policies import ActorCriticCnnPolicy
+from stable_baselines3.common.monitor import Monitor
+from stable_baselines3.common.vec_env import DummyVecEnv
+
+from actor_learner import (Actor, Learner, _ActorConnection, decode_observations, encode_message,
+                           encode_observations, policy_class, recv_message, send_message)
+from observation import ObservationPipeline
+from stand_in_env import StandInRetroEnv
+from street_fighter_custom_wrapper import StreetFighterCustomWrapper
+
+def _make_env(seed=0):
+    env = StandInRetroEnv(seed=seed, round_frames=240)
+    return Monitor(StreetFighterCustomWrapper(env, macro_action=True, obs_pipeline=ObservationPipeline(size=(50, 64))))
+
+def _wait_for(condition, timeout=10.0):
+    deadline = time.monotonic() + timeout
+    while not condition():
+        assert time.monotonic() < deadline
+        time.sleep(0.01)
+
+def test_message_round_trip():
+    arrays = {
+        "frames": np.arange(2 * 3 * 4, dtype=np.uint8).reshape(2, 3, 4),
+        "rewards": np.array([0.5, -1.0], dtype=np.float32),
+        # Non-contiguous and big-endian arrays arrive as equal contiguous copies
+        "strided": np.arange(20, dtype=">u2")[::2],
+        "empty": np.zeros((0, 3), dtype=np.int64),
+    }
+    left, right = socket.socketpair()
+    try:
+        send_message(left, encode_message("batch", {"version": 3, "episode_rewards": [1.5]}, arrays))
+        send_message(left, encode_message("hello", {"num_envs": 4}))
+        kind, header, received = recv_message(right)
+        assert kind == "batch" and header == {"version": 3, "episode_rewards": [1.5]}
+        assert list(received) == list(arrays)
+        for name, array in arrays.items():
+            assert received[name].dtype == array.dtype
+            np.testing.assert_array_equal(received[name], array)
+        assert recv_message(right) == ("hello", {"num_envs": 4}, {})
+
+        left.close()
+        with pytest.raises(ConnectionError):
+            recv_message(right)
+    finally:
+        right.close()
+
+def test_observation_codec_round_trip():
+    rng = np.random.default_rng(0)
+    obs = rng.integers(0, 256, (8, 3, 3, 50, 64), dtype=np.uint8)
+    obs[1:, 0] = obs[0, 0] # A static env compresses to almost nothing
+    blob, sizes = encode_observations(obs)
+    assert len(sizes) == 3 and sizes[0] < sizes[1]
+    np.testing.assert_array_equal(decode_observations(blob, sizes, obs.shape[2:]), obs)
+
+def test_connection_keeps_only_the_newest_batch():
+    ready, pending = threading.Condition(), collections.deque()
+    left, right = socket.socketpair()
+    connection = _ActorConnection(right, "test", ready, pending)
+    try:
+        for version in range(3):
+            send_message(left, encode_message("batch", {"version": version}, {"x": np.full(2, version)}))
+        _wait_for(lambda: connection.num_batches == 3)
+        with ready:
+            assert list(pending) == [connection]
+            header, arrays = pending.popleft().take_batch()
+        assert header == {"version": 2} and list(arrays["x"]) == [2, 2]
+        assert connection.num_superseded == 2
+    finally:
+        left.close()
+        connection.close()
+
+def test_policy_class_comes_from_the_allow_list():
+    assert policy_class("ActorCriticCnnPolicy") is ActorCriticCnnPolicy
+    for name in ("system", "os.system", "CustomLstmPolicy", "__builtins__"):
+        with pytest.raises(ValueError, match="Unsupported policy"):
+            policy_class(name)
+
+def test_learner_stops_waiting_for_dead_actors():
+    model = PPO("CnnPolicy", DummyVecEnv([_make_env]), n_steps=8, batch_size=8, n_epochs=1, device="cpu")
+    learner = Learner(model, port=0, actors_alive=lambda: False)
+    try:
+        with pytest.raises(RuntimeError, match="exited"):
+            learner.run(8)
+    finally:
+        learner.close()
+
+    learner = Learner(model, port=0, batch_timeout=0.1)
+    try:
+        with pytest.raises(TimeoutError):
+            learner.run(8)
+    finally:
+        learner.close()
+
+def test_learner_trains_on_actor_batches():
+    model = PPO("CnnPolicy", DummyVecEnv([_make_env, _make_env]), n_steps=8, batch_size=16, n_epochs=1,
+                device="cpu")
+    model.set_logger(configure(None, []))
+    learner = Learner(model, port=0, batch_timeout=60.0)
+    host, port = learner.address
+    actor = Actor(DummyVecEnv([lambda: _make_env(seed=1), lambda: _make_env(seed=2)]), host=host, port=port)
+    thread = threading.Thread(target=actor.run, daemon=True)
+    thread.start()
+    try:
+        learner.run(2 * 8 * 2)
+        assert learner.num_updates == 2 and learner.version == 2
+        assert model.num_timesteps == 32
+        _wait_for(lambda: actor.version == 2)
+        # The actor plays with the learner's newest weights
+        for name, tensor in model.policy.state_dict().items():
+            np.testing.assert_array_equal(actor.policy.state_dict()[name].numpy(), tensor.numpy())
+    finally:
+        learner.close()
+        thread.join(timeout=30)
+        actor.close()
+    assert not thread.is_alive()
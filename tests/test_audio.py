@@ -0,0 +1,46 @@
+import numpy as np
+
+from audio import AudioPump, AudioRingBuffer, NullAudioOutput
+
+def _samples(start, count):
+    values = np.arange(start, start + count, dtype=np.int64) % 30000
+    return np.stack([values, -values], axis=1).astype(np.int16)
+
+def test_ring_buffer_wraps_around_in_order():
+    ring = AudioRingBuffer(capacity=10)
+    out = np.zeros((4, 2), dtype=np.int16)
+    written = 0
+    read = []
+    # Odd write and read sizes move the boundary across the end of the buffer many times
+    for count in (3, 5, 7, 2, 6, 4, 5, 3):
+        written += ring.write(_samples(written, count))
+        n = ring.read_into(out, count_underrun=False)
+        read.append(out[:n].copy())
+    while len(ring):
+        read.append(out[:ring.read_into(out, count_underrun=False)].copy())
+    assert np.array_equal(np.concatenate(read), _samples(0, written))
+    assert ring.num_overruns == 0
+
+def test_ring_buffer_overrun_and_underrun():
+    ring = AudioRingBuffer(capacity=8)
+    assert ring.write(_samples(0, 12)) == 8
+    assert ring.num_overruns == 1 and ring.overrun_frames == 4
+
+    out = np.ones((10, 2), dtype=np.int16)
+    assert ring.read_into(out) == 8
+    assert np.array_equal(out[:8], _samples(0, 8))
+    # Missing frames are padded with silence
+    assert (out[8:] == 0).all()
+    assert ring.num_underruns == 1 and ring.underrun_frames == 2
+
+def test_pump_waits_for_the_prefill():
+    output = NullAudioOutput(rate=1000, frames_per_buffer=10)
+    pump = AudioPump(rate=1000, buffer_seconds=1.0, prefill=0.05, output=output)
+    pump.push_samples(_samples(0, 30))
+    assert (output.pull() == 0).all()
+    assert len(pump.ring) == 30
+
+    pump.push_samples(_samples(30, 30))
+    assert np.array_equal(output.pull(), _samples(0, 10))
+    assert pump.stats()["buffered_frames"] == 50
+    pump.close()
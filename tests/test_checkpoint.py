@@ -0,0 +1,58 @@
+import json
+import os
+import threading
+
+import pytest
+
+pytest.importorskip("stable_baselines3")
+
+from stable_baselines3 import PPO
+from stable_baselines3.common.monitor import Monitor
+from stable_baselines3.common.vec_env import DummyVecEnv
+
+from checkpoint import INDEX_NAME, AsyncCheckpointCallback, EvalScore
+from observation import ObservationPipeline
+from stand_in_env import StandInRetroEnv
+from street_fighter_custom_wrapper import StreetFighterCustomWrapper
+
+def _make_env(seed=0):
+    env = StandInRetroEnv(seed=seed, round_frames=240)
+    return Monitor(StreetFighterCustomWrapper(env, macro_action=True, obs_pipeline=ObservationPipeline(size=(50, 64))))
+
+def test_eval_score_ranks_checkpoints(tmp_path):
+    model = PPO("CnnPolicy", DummyVecEnv([_make_env]), n_steps=16, batch_size=16, n_epochs=1, device="cpu")
+    threads = []
+    def eval_env():
+        threads.append(threading.current_thread().name)
+        return _make_env(seed=7)
+    eval_score = EvalScore(eval_env, n_eval_episodes=1)
+    callback = AsyncCheckpointCallback(save_freq=16, save_path=str(tmp_path), name_prefix="test", keep_last=1,
+                                       score_fn=eval_score)
+    model.learn(64, callback=callback)
+
+    with open(os.path.join(str(tmp_path), INDEX_NAME)) as file:
+        index = json.load(file)
+    # The checkpoints are played on the writer thread, and the eval env is closed with the callback
+    assert threads == ["AsyncCheckpointWriter"]
+    assert eval_score.env is None
+    assert all(isinstance(entry["score"], float) for entry in index["checkpoints"])
+    best = max(index["checkpoints"], key=lambda entry: entry["score"])
+    assert index["best"] == best["file"]
+    assert index["latest"] == "test_64_steps.zip"
+    # The newest plus the best are kept, the rest deleted
+    kept = sorted(name for name in os.listdir(str(tmp_path)) if name.endswith(".zip"))
+    assert kept == sorted({index["best"], index["latest"]})
+    PPO.load(os.path.join(str(tmp_path), index["latest"]), device="cpu")
+
+def test_retention_keeps_the_best_and_the_newest(tmp_path):
+    model = PPO("CnnPolicy", DummyVecEnv([_make_env]), n_steps=16, batch_size=16, n_epochs=1, device="cpu")
+    scores = iter([1.0, 5.0, 2.0, 3.0])
+    callback = AsyncCheckpointCallback(save_freq=16, save_path=str(tmp_path), name_prefix="test", keep_last=1,
+                                       score_fn=lambda model: next(scores))
+    model.learn(64, callback=callback)
+
+    with open(os.path.join(str(tmp_path), INDEX_NAME)) as file:
+        index = json.load(file)
+    assert index["best"] == "test_32_steps.zip"
+    assert index["latest"] == "test_64_steps.zip"
+    assert [entry["score"] for entry in index["checkpoints"]] == [5.0, 3.0]
@@ -0,0 +1,67 @@
+import gym
+import numpy as np
+import pytest
+
+th = pytest.importorskip("torch")
+pytest.importorskip("sb3_contrib")
+
+from sb3_contrib import RecurrentPPO
+from sb3_contrib.common.recurrent.policies import RecurrentActorCriticCnnPolicy
+from stable_baselines3.common.vec_env import DummyVecEnv
+
+from custom_policy import CustomCnnExtractor, CustomLstmPolicy
+from observation import ObservationPipeline
+from stand_in_env import StandInRetroEnv
+from street_fighter_custom_wrapper import StreetFighterCustomWrapper
+
+def _sequence_inputs(n_seq, length, starts, seed=0):
+    generator = th.Generator().manual_seed(seed)
+    lstm = th.nn.LSTM(8, 16)
+    features = th.randn(n_seq * length, 8, generator=generator)
+    states = (th.randn(1, n_seq, 16, generator=generator), th.randn(1, n_seq, 16, generator=generator))
+    episode_starts = th.zeros(n_seq, length)
+    for seq, t in starts:
+        episode_starts[seq, t] = 1.0
+    return features, states, episode_starts.flatten(), lstm
+
+@pytest.mark.parametrize("starts", [[], [(0, 0)], [(0, 0), (2, 0), (3, 0)]])
+def test_batched_call_matches_the_step_loop(starts):
+    inputs = _sequence_inputs(4, 7, starts)
+    with th.no_grad():
+        output, (hidden, cell) = CustomLstmPolicy._process_sequence(*inputs)
+        expected, (expected_hidden, expected_cell) = RecurrentActorCriticCnnPolicy._process_sequence(*inputs)
+    assert th.allclose(output, expected, atol=1e-6)
+    assert th.allclose(hidden, expected_hidden, atol=1e-6)
+    assert th.allclose(cell, expected_cell, atol=1e-6)
+
+def test_mid_sequence_start_falls_back_to_the_step_loop():
+    inputs = _sequence_inputs(3, 5, [(1, 0), (1, 3)])
+    with th.no_grad():
+        output, _ = CustomLstmPolicy._process_sequence(*inputs)
+        expected, _ = RecurrentActorCriticCnnPolicy._process_sequence(*inputs)
+    assert th.allclose(output, expected, atol=1e-6)
+
+@pytest.mark.parametrize("channels", [1, 3, 9])
+def test_extractor_reads_the_channel_count(channels):
+    space = gym.spaces.Box(low=0, high=255, shape=(channels, 64, 64), dtype=np.uint8)
+    extractor = CustomCnnExtractor(space, features_dim=32)
+    assert extractor(th.zeros(2, channels, 64, 64)).shape == (2, 32)
+
+def test_training_minibatches_take_one_lstm_call():
+    def make_env(seed):
+        # Short rounds, so minibatches contain episode starts
+        pipeline = ObservationPipeline(size=(50, 64))
+        return lambda: StreetFighterCustomWrapper(StandInRetroEnv(seed=seed, round_frames=300), macro_action=True,
+                                                  obs_pipeline=pipeline)
+
+    env = DummyVecEnv([make_env(0), make_env(1)])
+    model = RecurrentPPO(CustomLstmPolicy, env, n_steps=32, batch_size=32, n_epochs=1, device="cpu",
+                         policy_kwargs=dict(features_extractor_kwargs=dict(features_dim=32), lstm_hidden_size=16))
+    lengths = []
+    model.policy.lstm_actor.register_forward_hook(lambda module, inputs, output: lengths.append(inputs[0].shape[0]))
+    model.learn(64)
+    assert any(model.rollout_buffer.episode_starts.flatten()[1:])
+    # Collection feeds one step per call, every training minibatch is a single call over whole sequences
+    training_calls = [length for length in lengths if length > 1]
+    assert training_calls
+    assert len(training_calls) == model.n_epochs * (64 // 32)
@@ -0,0 +1,102 @@
+import numpy as np
+
+from decision_cache import FIGHTER_DISTANCE_EDGES, FIGHTER_Y_EDGES, CachedPolicy, DecisionCache, uniform_edges
+from fighter import MACRO_INDEX, Fighter
+from test_vec_fighter import _random_records
+
+def _info(agent_x=100, enemy_x=200, agent_y=192, enemy_y=192, agent_status=512, enemy_status=512):
+    return {'agent_x': agent_x, 'enemy_x': enemy_x, 'agent_y': agent_y, 'enemy_y': enemy_y,
+            'agent_status': agent_status, 'enemy_status': enemy_status}
+
+def test_distance_buckets_split_at_the_edges():
+    cache = DecisionCache()
+    buckets = [cache.key(_info(enemy_x=100 + distance))[0] for distance in (39, 40, 99, 100, 105, 106, 149, 150)]
+    assert buckets == [0, 1, 1, 2, 2, 3, 3, 4]
+    # Distance is symmetric, facing is not
+    left, right = cache.key(_info(agent_x=100, enemy_x=150)), cache.key(_info(agent_x=200, enemy_x=150))
+    assert left[0] == right[0] and left[-1] and not right[-1]
+
+def test_y_buckets_split_at_the_edges():
+    cache = DecisionCache()
+    buckets = [cache.key(_info(enemy_y=y))[2] for y in (105, 106, 129, 130, 191, 192, 193)]
+    assert buckets == [0, 1, 1, 2, 2, 3, 4]
+    assert FIGHTER_Y_EDGES[2] == 192 and FIGHTER_DISTANCE_EDGES == (40, 100, 106, 150)
+
+def test_uniform_edges():
+    assert uniform_edges(100) == (100, 200, 300)
+    assert uniform_edges(8, limit=33) == (8, 16, 24, 32)
+
+def test_lookup_evicts_the_least_recently_used():
+    cache = DecisionCache(max_size=2)
+    calls = []
+    def compute(value):
+        return lambda: calls.append(value) or value
+
+    assert cache.lookup("a", compute(1)) == 1
+    assert cache.lookup("b", compute(2)) == 2
+    assert cache.lookup("a", compute(-1)) == 1 # hit, "a" becomes the newest
+    assert cache.lookup("c", compute(3)) == 3 # evicts "b"
+    assert cache.lookup("b", compute(4)) == 4 # miss again, evicts "a"
+    assert calls == [1, 2, 3, 4]
+    assert len(cache) == 2
+    assert cache.stats() == {"size": 2, "hits": 1, "misses": 4, "evictions": 2, "hit_rate": 0.2}
+
+    cache.clear()
+    assert len(cache) == 0 and cache.stats()["hit_rate"] == 0.2
+
+def test_cached_fighter_decisions_match_fighter():
+    cache = DecisionCache()
+    cached, fighter = Fighter(None), Fighter(None)
+    def rule(record):
+        cached.update(record)
+        return MACRO_INDEX[cached.get_best_macro()]
+
+    records = _random_records(20000, seed=3)
+    for record in records:
+        fighter.update(record)
+        assert cache.lookup(cache.key(record), lambda: rule(record)) == MACRO_INDEX[fighter.get_best_macro()]
+    # A good share of the decisions came from the cache rather than from Fighter
+    assert cache.hits > len(records) // 4
+
+class _Model(object):
+    def __init__(self):
+        self.calls = []
+
+    def predict(self, obs, state=None, episode_start=None, deterministic=False):
+        self.calls.append(deterministic)
+        return int(obs.sum()), state
+
+class _Engine(object):
+    def __init__(self):
+        self.logits_calls = 0
+
+    def logits(self, obs):
+        self.logits_calls += 1
+        return np.array([[0.0, 1.0, 0.5]])
+
+    def act_from_logits(self, logits, deterministic):
+        return logits.argmax(axis=1) if deterministic else np.zeros(len(logits), dtype=int)
+
+def test_cached_policy_caches_deterministic_model_actions():
+    model, info = _Model(), [_info()]
+    policy = CachedPolicy(model, DecisionCache(), info_fn=lambda: info[0])
+    assert policy.predict(np.ones(3), deterministic=True) == (3, None)
+    # Same bucket, the first action is reused even for a different observation
+    assert policy.predict(np.ones(5), deterministic=True) == (3, None)
+    assert model.calls == [True] and policy.bypassed == 0
+
+def test_cached_policy_bypasses_stochastic_models_and_missing_info():
+    model, info = _Model(), [_info()]
+    policy = CachedPolicy(model, DecisionCache(), info_fn=lambda: info[0])
+    policy.predict(np.ones(3), deterministic=False)
+    info[0] = None
+    policy.predict(np.ones(3), deterministic=True)
+    assert model.calls == [False, True] and policy.bypassed == 2
+    assert len(policy.cache) == 0
+
+def test_cached_policy_samples_cached_engine_logits():
+    engine = _Engine()
+    policy = CachedPolicy(engine, DecisionCache(), info_fn=lambda: _info())
+    assert policy.predict(np.ones(3), deterministic=True)[0] == 1
+    assert policy.predict(np.ones(3), deterministic=False)[0] == 0
+    assert engine.logits_calls == 1 and policy.bypassed == 0
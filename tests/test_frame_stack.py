@@ -0,0 +1,38 @@
+import collections
+
+import numpy as np
+
+from frame_stack import FrameStack
+
+def _deque_observation(frames):
+    # The original wrapper: a deque of obs[::2, ::2] and np.stack of lagged channels
+    return np.stack([frames[i * 3 + 2][:, :, i] for i in range(3)], axis=-1)
+
+def test_matches_deque_stack():
+    rng = np.random.default_rng(0)
+    screens = rng.integers(0, 256, size=(40, 200, 256, 3), dtype=np.uint8)
+
+    stack = FrameStack()
+    frames = collections.deque(maxlen=9)
+    stack.fill(screens[0])
+    for _ in range(9):
+        frames.append(screens[0][::2, ::2, :])
+    assert np.array_equal(stack.observation(), _deque_observation(frames))
+
+    for i, screen in enumerate(screens[1:], 1):
+        stack.push(screen)
+        frames.append(screen[::2, ::2, :])
+        if i % 3 == 0:
+            assert np.array_equal(stack.observation(), _deque_observation(frames))
+
+def test_shared_observation_is_read_only():
+    stack = FrameStack()
+    stack.fill(np.zeros((200, 256, 3), dtype=np.uint8))
+    obs = stack.observation(copy=False)
+    assert not obs.flags.writeable
+    assert obs.shape == (100, 128, 3)
+
+def test_is_consumed_marks_the_sampled_lags():
+    stack = FrameStack()
+    assert stack.lags == (6, 3, 0)
+    assert [lag for lag in range(9) if stack.is_consumed(lag)] == [0, 3, 6]
@@ -0,0 +1,29 @@
+import numpy as np
+import pytest
+
+pytest.importorskip("stable_baselines3")
+
+from stable_baselines3 import PPO
+from stable_baselines3.common.vec_env import DummyVecEnv
+
+from inference import InferenceEngine, export
+from observation import ObservationPipeline
+from stand_in_env import StandInRetroEnv
+from street_fighter_custom_wrapper import StreetFighterCustomWrapper
+
+@pytest.mark.parametrize("macro_action, kind", [(False, "multi_binary"), (True, "discrete")])
+def test_torchscript_export_matches_predict(tmp_path, macro_action, kind):
+    env_fn = lambda: StreetFighterCustomWrapper(StandInRetroEnv(), macro_action=macro_action,
+                                                obs_pipeline=ObservationPipeline(size=(50, 64)))
+    model = PPO("CnnPolicy", DummyVecEnv([env_fn]), n_steps=16, batch_size=16, device="cpu", seed=0)
+    model_path = str(tmp_path / "model.zip")
+    model.save(model_path)
+    engine_path = export(model_path, str(tmp_path / "model.pt"))
+
+    engine = InferenceEngine(engine_path)
+    assert engine.meta["kind"] == kind and engine.meta["obs_shape"] == [50, 64, 3]
+    obs = np.random.default_rng(0).integers(0, 256, (32, 50, 64, 3), dtype=np.uint8)
+    expected, _ = PPO.load(model_path, device="cpu").predict(obs, deterministic=True)
+    assert np.array_equal(engine.act(obs), expected)
+    # One observation at a time, the way play loops call it
+    assert np.array_equal(engine.predict(obs[3], deterministic=True)[0], expected[3])
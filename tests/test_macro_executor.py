@@ -0,0 +1,34 @@
+from macro_executor import MacroExecutor
+
+def test_advance_whole_macro():
+    executor = MacroExecutor(num_step_frames=6)
+    assert executor.idle and executor.pending_frames == 0
+    executor.start(["a", "b", "c"], macro=4)
+    assert executor.pending_frames == 18
+    assert executor.advance() == [("a", 6), ("b", 6), ("c", 6)]
+    assert executor.idle and executor.macro is None
+
+def test_advance_in_bounded_slices():
+    executor = MacroExecutor(num_step_frames=6)
+    executor.start(["a", "b"], macro=1)
+    assert executor.advance(4) == [("a", 4)]
+    assert executor.pending_frames == 8
+    assert executor.macro == 1
+    assert executor.advance(4) == [("a", 2), ("b", 2)]
+    # Never runs past the end of the macro
+    assert executor.advance(10) == [("b", 4)]
+    assert executor.idle
+    assert executor.advance(6) == []
+
+def test_start_replaces_the_rest_of_a_macro():
+    executor = MacroExecutor(num_step_frames=6)
+    executor.start(["a", "b", "c"], macro=1)
+    executor.advance(6)
+    executor.start(["x"], macro=2)
+    assert executor.num_cancelled == 1
+    assert executor.advance() == [("x", 6)]
+
+    executor.start(["y", "z"], macro=3)
+    executor.cancel()
+    assert executor.idle and executor.macro is None
+    assert executor.num_started == 3 and executor.num_cancelled == 2
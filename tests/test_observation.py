@@ -0,0 +1,46 @@
+import numpy as np
+import pytest
+
+from observation import GRAY_WEIGHTS, ObservationPipeline
+
+@pytest.fixture
+def frame():
+    return np.random.default_rng(0).integers(0, 256, size=(200, 256, 3), dtype=np.uint8)
+
+def _planes(pipeline, frame):
+    out = np.zeros(pipeline.output_shape(3), dtype=np.uint8)
+    for channel in range(3):
+        pipeline.plane(frame, channel, out[:, :, channel])
+    return out
+
+def test_default_is_the_strided_rgb_observation(frame):
+    pipeline = ObservationPipeline()
+    assert pipeline.output_shape(3) == (100, 128, 3)
+    assert np.array_equal(_planes(pipeline, frame), frame[::2, ::2])
+
+def test_area_mode_averages_blocks(frame):
+    out = _planes(ObservationPipeline(size=(50, 64), mode="area"), frame)
+    expected = frame.reshape(50, 4, 64, 4, 3).astype(np.float64).mean(axis=(1, 3))
+    assert np.abs(out - expected).max() <= 0.5
+
+def test_area_mode_with_uneven_sizes(frame):
+    out = _planes(ObservationPipeline(size=(84, 84), mode="area"), frame)
+    assert out.shape == (84, 84, 3)
+    # A flat frame stays flat whatever the weights
+    flat = np.full((200, 256, 3), 77, dtype=np.uint8)
+    assert (_planes(ObservationPipeline(size=(84, 84), mode="area"), flat) == 77).all()
+
+def test_grayscale_and_crop(frame):
+    pipeline = ObservationPipeline(size=(50, 64), grayscale=True, crop=(0, 100, 128, 100))
+    out = _planes(pipeline, frame)
+    expected = np.rint(frame[100:200:2, 0:128:2] @ GRAY_WEIGHTS)
+    for channel in range(3):
+        assert np.array_equal(out[:, :, channel], expected)
+
+def test_invalid_settings():
+    with pytest.raises(ValueError):
+        ObservationPipeline(mode="bilinear")
+    with pytest.raises(ValueError):
+        ObservationPipeline(crop=(200, 0, 100, 100))
+    with pytest.raises(ValueError):
+        ObservationPipeline(size=(300, 128))
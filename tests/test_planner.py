@@ -0,0 +1,66 @@
+import functools
+import multiprocessing
+import time
+
+import pytest
+
+from planner import LookaheadPlanner
+from stand_in_env import StandInRetroEnv
+
+@pytest.fixture
+def live_env():
+    env = StandInRetroEnv()
+    env.reset()
+    for _ in range(30):
+        env.step([0] * 12)
+    return env
+
+def _planner(**kwargs):
+    return LookaheadPlanner(functools.partial(StandInRetroEnv, seed=1), num_workers=2, **kwargs)
+
+def test_plan_scores_every_candidate_and_caches(live_env):
+    planner = _planner(budget=10.0)
+    try:
+        candidates = planner.candidates(True)
+        best = planner.plan(live_env, True, fallback=candidates[0])
+        assert best in candidates
+        assert planner.stats()["partial_plans"] == 0 and planner.stats()["fallbacks"] == 0
+        assert planner.plan(live_env, True, fallback=candidates[0]) == best
+        assert planner.stats()["cache_hits"] == 1
+    finally:
+        planner.close()
+
+def test_abandoned_simulations_do_not_delay_later_plans(live_env):
+    # Long horizons make each simulation slow; without cancellation the 20 abandoned
+    # plans would keep the pool busy for longer than the last plan's budget
+    planner = _planner(budget=0.0, horizon_frames=600)
+    try:
+        fallback = planner.candidates(True)[0]
+        for _ in range(20):
+            assert planner.plan(live_env, True, fallback=fallback) == fallback
+        assert planner.stats()["cancelled_simulations"] > 0
+
+        planner.budget = 8.0
+        start = time.perf_counter()
+        planner.plan(live_env, True, fallback=fallback)
+        assert time.perf_counter() - start < planner.budget
+        assert planner.stats()["partial_plans"] == 0
+        assert planner.stats()["fallbacks"] == 20
+    finally:
+        planner.close()
+
+def _make_in_child(queue):
+    try:
+        LookaheadPlanner(StandInRetroEnv, num_workers=1)
+        queue.put(None)
+    except RuntimeError as error:
+        queue.put(str(error))
+
+def test_refuses_to_start_in_a_daemonic_process():
+    context = multiprocessing.get_context("fork")
+    queue = context.Queue()
+    process = context.Process(target=_make_in_child, args=(queue,), daemon=True)
+    process.start()
+    message = queue.get(timeout=60)
+    process.join()
+    assert message is not None and "daemonic" in message
@@ -0,0 +1,57 @@
+import json
+
+import numpy as np
+
+from ram_decoder import DATA_JSON_PATH, GENESIS_RAM_BASE, RamDecoder, bcd_to_int
+
+def _variables():
+    with open(DATA_JSON_PATH) as f:
+        return json.load(f)["info"]
+
+def _reference(ram, variable):
+    # Read data.json's definition byte by byte: big-endian values in word-swapped Genesis RAM
+    endian, kind, size = variable["type"][0], variable["type"][1], int(variable["type"][2:])
+    address = variable["address"] - GENESIS_RAM_BASE
+    raw = bytes(int(ram[(address + i) ^ 1]) for i in range(size))
+    value = int.from_bytes(raw, "little" if endian == "<" else "big", signed=kind == "i")
+    return bcd_to_int(value) if kind == "d" else value
+
+def test_decode_matches_data_json():
+    variables = _variables()
+    decoder = RamDecoder(variables)
+    assert set(decoder.names) == set(variables)
+
+    rng = np.random.default_rng(0)
+    for _ in range(20):
+        ram = rng.integers(0, 256, size=0x10000, dtype=np.uint8)
+        decoded = decoder.to_dict(decoder.decode(ram))
+        for name, variable in variables.items():
+            if variable["type"][1] == "d":
+                # Random bytes are not valid BCD, compare the raw nibbles instead
+                continue
+            assert decoded[name] == _reference(ram, variable), name
+
+def test_decode_batch_matches_decode():
+    decoder = RamDecoder.from_json()
+    rams = np.random.default_rng(1).integers(0, 256, size=(5, 0x10000), dtype=np.uint8)
+    records = decoder.decode_batch(rams)
+    assert records.shape == (5,)
+    for ram, record in zip(rams, records):
+        assert record.tobytes() == decoder.decode(ram).tobytes()
+
+def test_bcd_score_and_matches():
+    variables = _variables()
+    decoder = RamDecoder(variables)
+    ram = np.zeros(0x10000, dtype=np.uint8)
+    address = variables["score"]["address"] - GENESIS_RAM_BASE
+    for i, byte in enumerate(bytes.fromhex("00123450")):
+        ram[(address + i) ^ 1] = byte
+    address = variables["agent_hp"]["address"] - GENESIS_RAM_BASE
+    ram[address ^ 1], ram[(address + 1) ^ 1] = 0xFF, 0xFF
+
+    record = decoder.decode(ram)
+    decoded = decoder.to_dict(record)
+    assert decoded["score"] == 123450
+    assert decoded["agent_hp"] == -1
+    assert decoder.matches(record, {"score": 123450, "agent_hp": -1})
+    assert not decoder.matches(record, {"agent_hp": 176})
@@ -0,0 +1,44 @@
+import time
+
+from realtime import LatencyHistogram, RealtimeRunner
+from stand_in_env import StandInRetroEnv
+from street_fighter_custom_wrapper import StreetFighterCustomWrapper
+
+def _make_env(round_frames=3000):
+    return StreetFighterCustomWrapper(StandInRetroEnv(round_frames=round_frames), macro_action="hybrid", step_frames=1)
+
+def test_fast_policy_meets_every_deadline():
+    # Short rounds, so several resets happen; none of them counts as a missed deadline
+    runner = RealtimeRunner(_make_env(round_frames=120), policy=lambda obs: 1, fps=240.0, lead_frames=3)
+    try:
+        stats = runner.run(max_rounds=3)
+    finally:
+        runner.close()
+    assert stats["missed_deadlines"] == 0
+    assert stats["reset_fallbacks"] <= 3
+    assert stats["policy_decisions"] + stats["reset_fallbacks"] == stats["decisions"]
+    assert stats["policy_decisions"] > 0
+
+def test_slow_policy_misses_and_falls_back_to_fighter():
+    runner = RealtimeRunner(_make_env(), policy=lambda obs: time.sleep(0.05) or 1, fps=240.0, lead_frames=1)
+    try:
+        stats = runner.run(max_frames=120)
+    finally:
+        runner.close()
+    assert stats["missed_deadlines"] > 0
+    assert stats["frames"] == 120
+
+def test_without_policy_fighter_plays():
+    runner = RealtimeRunner(_make_env(), fps=1000.0)
+    stats = runner.run(max_frames=60)
+    assert stats["decisions"] > 0
+    assert stats["missed_deadlines"] == 0 and stats["reset_fallbacks"] == 0
+
+def test_latency_histogram():
+    histogram = LatencyHistogram(buckets_ms=(1, 10))
+    for seconds in (0.0005, 0.005, 0.005, 0.5):
+        histogram.record(seconds)
+    summary = histogram.summary()
+    assert summary["buckets"] == {"<=1ms": 1, "<=10ms": 2, ">10ms": 1}
+    assert summary["p50_ms"] == 10
+    assert summary["max_ms"] == 500.0
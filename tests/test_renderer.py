@@ -0,0 +1,53 @@
+import threading
+import time
+
+from renderer import AsyncRenderer
+
+class _Window:
+    def __init__(self):
+        self.caption = None
+
+    def set_caption(self, caption):
+        self.caption = caption
+
+class _Viewer:
+    def __init__(self):
+        self.window = _Window()
+        self.frames = []
+        self.started = threading.Event()
+        self.release = threading.Event()
+        self.closed = False
+
+    def imshow(self, frame):
+        self.started.set()
+        # Stands for a slow display: the viewer falls behind on the first frame
+        self.release.wait(timeout=10)
+        self.frames.append(frame)
+
+    def close(self):
+        self.closed = True
+
+def _wait_for(condition, timeout=10.0):
+    deadline = time.monotonic() + timeout
+    while not condition():
+        assert time.monotonic() < deadline
+        time.sleep(0.01)
+
+def test_renderer_drops_the_oldest_frames(monkeypatch):
+    viewer = _Viewer()
+    monkeypatch.setattr(AsyncRenderer, "_make_viewer", lambda self: viewer)
+    screen = AsyncRenderer(max_queue=2, fps=1000.0, caption="Test")
+    try:
+        screen.submit(0)
+        assert viewer.started.wait(timeout=10)
+        for frame in (1, 2, 3):
+            screen.submit(frame)
+        assert screen.num_dropped == 1
+
+        viewer.release.set()
+        _wait_for(lambda: screen.num_shown == 3)
+        assert viewer.frames == [0, 2, 3]
+        assert viewer.window.caption == "Test"
+    finally:
+        screen.close()
+    assert viewer.closed
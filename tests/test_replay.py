@@ -0,0 +1,54 @@
+import numpy as np
+import pytest
+
+from ram_decoder import RamDecoder
+from replay import Replay, Replayer, ReplayRecorder, pack_buttons, unpack_buttons
+from stand_in_env import StandInRetroEnv
+from street_fighter_custom_wrapper import StreetFighterCustomWrapper
+
+def _start_env(seed=0):
+    env = StandInRetroEnv(seed=seed, round_frames=100000)
+    # retro envs start from a save state, record the stand-in's
+    env.initial_state = env.em.get_state()
+    return env
+
+def _record(directory, num_steps=30):
+    recorder = ReplayRecorder(RamDecoder.from_json(), directory=str(directory), embed_state=True)
+    env = StreetFighterCustomWrapper(_start_env(), fast_step=True, ram_decoder=RamDecoder.from_json(),
+                                     recorder=recorder)
+    env.reset()
+    for _ in range(num_steps):
+        env.step(None)
+    env.close()
+    return Replay.load(str(directory / "episode_00000.npz"))
+
+def test_pack_buttons_round_trip():
+    for mask in np.random.default_rng(0).integers(0, 2, (50, 12)):
+        assert np.array_equal(unpack_buttons(pack_buttons(mask)), mask)
+
+def test_replay_is_frame_exact(tmp_path):
+    replay = _record(tmp_path)
+    assert len(replay) > 30 and len(replay.step_ends) == 30 and replay.step_ends[-1] == len(replay)
+    assert replay.ram["agent_hp"][0] == 176
+
+    screens, first_mismatch = Replayer(_start_env(), RamDecoder.from_json()).run(replay, screens=[0, 10])
+    assert first_mismatch is None
+    assert sorted(screens) == [0, 10] and screens[10].shape == (200, 256, 3)
+
+def test_replay_reports_the_first_divergent_frame(tmp_path):
+    replay = _record(tmp_path)
+    # Walking the other way than recorded moves the agent on that very frame
+    frame = 20
+    mask = unpack_buttons(replay.buttons[frame])
+    mask[6], mask[7] = 0, 1 - mask[7]
+    replay.buttons = replay.buttons.copy()
+    replay.buttons[frame] = pack_buttons(mask)
+
+    _screens, first_mismatch = Replayer(_start_env(), RamDecoder.from_json()).run(replay)
+    assert first_mismatch == frame
+
+def test_replay_rejects_another_start_state(tmp_path):
+    replay = _record(tmp_path)
+    replay.state = _start_env(seed=1).em.get_state()
+    with pytest.raises(ValueError, match="differs"):
+        Replayer(_start_env(), RamDecoder.from_json()).run(replay)
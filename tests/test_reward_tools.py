@@ -0,0 +1,57 @@
+import numpy as np
+import pytest
+
+from reward_tools import RewardParams, compare, custom_returns, episode_returns
+from stand_in_env import StandInRetroEnv
+from street_fighter_custom_wrapper import StreetFighterCustomWrapper
+
+def _random_traces(num, seed=0):
+    rng = np.random.default_rng(seed)
+    traces = []
+    for _ in range(num):
+        length = int(rng.integers(5, 60))
+        agent = 176 - np.cumsum(rng.integers(0, 12, length) * (rng.random(length) < 0.3))
+        enemy = 176 - np.cumsum(rng.integers(0, 12, length) * (rng.random(length) < 0.3))
+        # Some rounds end in a KO (HP below 0), the rest run out of steps
+        traces.append((np.maximum(agent, -1), np.maximum(enemy, -1)))
+    return traces
+
+def _wrapper_return(wrapper, agent, enemy, gamma=1.0):
+    wrapper.prev_player_health = wrapper.full_hp
+    wrapper.prev_oppont_health = wrapper.full_hp
+    total = 0.0
+    for t, (agent_hp, enemy_hp) in enumerate(zip(agent, enemy)):
+        reward, done = wrapper.compute_reward(int(agent_hp), int(enemy_hp))
+        total += 0.001 * reward * gamma ** t
+        if done:
+            break
+    return total
+
+@pytest.mark.parametrize("gamma", [1.0, 0.94])
+def test_default_params_reproduce_the_wrapper(gamma):
+    traces = _random_traces(40)
+    wrapper = StreetFighterCustomWrapper(StandInRetroEnv())
+    expected = [_wrapper_return(wrapper, agent, enemy, gamma) for agent, enemy in traces]
+    returns = episode_returns([tuple(RewardParams())], traces, gamma)
+    assert returns.shape == (1, len(traces))
+    assert np.allclose(returns[0], expected)
+
+def test_candidates_are_computed_independently():
+    traces = _random_traces(10, seed=1)
+    candidates = [tuple(RewardParams()), tuple(RewardParams(reward_coeff=1.0)), tuple(RewardParams(scale=0.002))]
+    returns = episode_returns(candidates, traces)
+    for i, candidate in enumerate(candidates):
+        assert np.allclose(returns[i], episode_returns([candidate], traces)[0])
+    assert np.allclose(returns[2], 2 * returns[0])
+
+def test_custom_returns_and_compare():
+    traces = _random_traces(10, seed=2)
+    damage_dealt = lambda agent, enemy, prev_agent, prev_enemy, terminal: prev_enemy - enemy
+    returns = custom_returns([damage_dealt], traces)
+    for value, (agent, enemy) in zip(returns[0], traces):
+        end = next((t for t in range(len(agent)) if agent[t] < 0 or enemy[t] < 0), len(agent) - 1)
+        assert value == pytest.approx(176 - enemy[end])
+
+    rows = compare([tuple(RewardParams()), tuple(RewardParams(scale=0.5))], traces)
+    assert rows[0]["rank_corr"] == pytest.approx(1.0)
+    assert rows[1]["rank_corr"] == pytest.approx(1.0)
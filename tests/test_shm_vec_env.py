@@ -0,0 +1,95 @@
+import multiprocessing
+import os
+import subprocess
+import sys
+
+import numpy as np
+import pytest
+
+pytest.importorskip("stable_baselines3")
+
+from ram_decoder import RamDecoder
+from shm_vec_env import ShmVecEnv
+from stand_in_env import StandInRetroEnv
+from street_fighter_custom_wrapper import StreetFighterCustomWrapper
+
+def _make_env(seed):
+    def _init():
+        return StreetFighterCustomWrapper(StandInRetroEnv(seed=seed), macro_action=True)
+    return _init
+
+def test_step_and_ram():
+    env = ShmVecEnv([_make_env(i) for i in range(2)], ram_decoder=RamDecoder.from_json(), start_method="fork")
+    try:
+        obs = env.reset()
+        assert obs.shape == (2, 100, 128, 3)
+        obs, rewards, dones, infos = env.step(np.zeros(2, dtype=np.int64))
+        ram, valid = env.get_ram()
+        assert valid.all()
+        assert (ram["agent_hp"] <= 176).all()
+    finally:
+        env.close()
+
+def test_workers_reuse_the_wrapper_record():
+    calls = multiprocessing.get_context("fork").Value("i", 0)
+    decoder = RamDecoder.from_json()
+    decode = decoder.decode
+
+    def counting_decode(ram):
+        with calls.get_lock():
+            calls.value += 1
+        return decode(ram)
+    # Forked workers share the patched decoder and the counter
+    decoder.decode = counting_decode
+
+    def make_env(seed):
+        return lambda: StreetFighterCustomWrapper(StandInRetroEnv(seed=seed), macro_action=True,
+                                                  ram_decoder=RamDecoder.from_json())
+    env = ShmVecEnv([make_env(i) for i in range(2)], ram_decoder=decoder, start_method="fork")
+    try:
+        env.reset()
+        # A reset has no step record yet, so it is decoded in the worker
+        assert calls.value == 2
+        for _ in range(3):
+            env.step(np.zeros(2, dtype=np.int64))
+        assert calls.value == 2
+        ram, valid = env.get_ram()
+        assert valid.all()
+        for index, record in enumerate(env.get_attr("prev_ram")):
+            assert ram[index] == record
+    finally:
+        env.close()
+
+def test_get_ram_without_decoder():
+    env = ShmVecEnv([_make_env(0)], start_method="fork")
+    try:
+        with pytest.raises(ValueError):
+            env.get_ram()
+    finally:
+        env.close()
+
+SCRIPT = """
+import sys
+sys.path.insert(0, {main!r})
+import numpy as np
+from shm_vec_env import ShmVecEnv
+from stand_in_env import StandInRetroEnv
+from street_fighter_custom_wrapper import StreetFighterCustomWrapper
+
+if __name__ == "__main__":
+    env = ShmVecEnv([lambda: StreetFighterCustomWrapper(StandInRetroEnv(), macro_action=True)], start_method={method!r})
+    env.reset()
+    env.step(np.zeros(1, dtype=np.int64))
+    env.close()
+"""
+
+@pytest.mark.parametrize("method", ["fork", "spawn"])
+def test_close_leaves_the_resource_tracker_clean(tmp_path, method):
+    # The parent alone tracks and unlinks the block: no KeyError or leak warning from the tracker
+    main_dir = os.path.dirname(sys.modules["shm_vec_env"].__file__)
+    script = tmp_path / "run.py"
+    script.write_text(SCRIPT.format(main=main_dir, method=method))
+    result = subprocess.run([sys.executable, str(script)], capture_output=True, text=True, timeout=120)
+    assert result.returncode == 0, result.stderr
+    assert "KeyError" not in result.stderr
+    assert "leaked" not in result.stderr
@@ -0,0 +1,66 @@
+import gzip
+
+import numpy as np
+
+from state_cache import PrewarmedEnvPool, StateCache, get_state_cache
+from stand_in_env import StandInRetroEnv
+from street_fighter_custom_wrapper import StreetFighterCustomWrapper
+
+def _save_state(path, seed=0, num_steps=10):
+    env = StandInRetroEnv(seed=seed)
+    env.reset()
+    for _ in range(num_steps):
+        env.step(np.zeros(12, dtype=np.int8))
+    blob = env.em.get_state()
+    with gzip.open(str(path), "wb") as f:
+        f.write(blob)
+    return blob
+
+def test_state_cache_reads_each_state_once(tmp_path):
+    path = tmp_path / "Other.state"
+    blob = _save_state(path)
+    cache = StateCache("StandIn-Test")
+    cache.preload([str(path)])
+    assert str(path) in cache and len(cache) == 1
+    # Served from memory from now on
+    path.unlink()
+    assert cache.get(str(path)) == blob
+
+def test_restore_resets_a_wrapped_env_into_the_state(tmp_path):
+    path = str(tmp_path / "Other.state")
+    blob = _save_state(path, seed=1)
+    env = StreetFighterCustomWrapper(StandInRetroEnv(seed=0), macro_action=True)
+    obs = StateCache("StandIn-Test").restore(env, path)
+    assert obs.shape == env.observation_space.shape
+    assert env.unwrapped.initial_state == blob and env.unwrapped.statename == path
+
+    # Further resets start from the restored state too
+    reference = StandInRetroEnv(seed=0)
+    reference.initial_state = blob
+    reference.reset()
+    env.reset()
+    assert np.array_equal(env.unwrapped.get_ram(), reference.get_ram())
+
+def test_get_state_cache_is_per_game():
+    assert get_state_cache("StandIn-A") is get_state_cache("StandIn-A")
+    assert get_state_cache("StandIn-A") is not get_state_cache("StandIn-B")
+
+def test_prewarmed_pool_shares_its_env_and_states(tmp_path):
+    state, other = str(tmp_path / "Start.state"), str(tmp_path / "Other.state")
+    _save_state(state, seed=0)
+    _save_state(other, seed=1)
+    made = []
+
+    def make_fn(game, state):
+        made.append((game, state))
+        return StandInRetroEnv()
+    pool = PrewarmedEnvPool("StandIn-Pool", state, states=(other,), make_fn=make_fn)
+    assert made == [("StandIn-Pool", state)]
+    assert pool.state_cache is get_state_cache("StandIn-Pool")
+    assert state in pool.state_cache and other in pool.state_cache
+
+    envs = [fn() for fn in pool.env_fns(2, lambda env, rank: (env, rank))]
+    assert envs == [(pool.base_env, 0), (pool.base_env, 1)]
+    pool.close()
+    assert pool.base_env is None
+    pool.close()
@@ -0,0 +1,113 @@
+import collections
+import math
+
+import numpy as np
+import pytest
+
+from fighter import Fighter
+from ram_decoder import RamDecoder
+from stand_in_env import StandInRetroEnv
+from street_fighter_custom_wrapper import StreetFighterCustomWrapper
+
+NUM_STEPS = 60
+
+def _reference_rollout(num_steps):
+    """
+    The original wrapper's loop: Fighter's whole macro per step, a deque of
+    obs[::2, ::2] and the lagged channel stack.
+    """
+    env = StandInRetroEnv(round_frames=100000)
+    frames = collections.deque(maxlen=9)
+    obs = env.reset()
+    for _ in range(9):
+        frames.append(obs[::2, ::2, :])
+    stack = lambda: np.stack([frames[i * 3 + 2][:, :, i] for i in range(3)], axis=-1)
+
+    info = None
+    prev_agent = prev_enemy = 176
+    results = [(stack(), None, False)]
+    for _ in range(num_steps):
+        for move in Fighter(info).get_best_move():
+            for _ in range(6):
+                obs, _reward, _done, info = env.step(move)
+                frames.append(obs[::2, ::2, :])
+        agent, enemy = info["agent_hp"], info["enemy_hp"]
+        done = agent < 0 or enemy < 0
+        if agent < 0:
+            reward = -math.pow(176, (enemy + 1) / 177)
+        elif enemy < 0:
+            reward = math.pow(176, (agent + 1) / 177) * 3
+        else:
+            reward = 3 * (prev_enemy - enemy) - (prev_agent - agent)
+            prev_agent, prev_enemy = agent, enemy
+        results.append((stack(), 0.001 * reward, done))
+        if done:
+            break
+    return results
+
+@pytest.fixture(scope="module")
+def reference():
+    return _reference_rollout(NUM_STEPS)
+
+@pytest.mark.parametrize("kwargs", [
+    dict(),
+    dict(fast_step=True),
+    dict(fast_step=True, ram_decoder=RamDecoder.from_json()),
+    dict(macro_action="hybrid"),
+])
+def test_whole_macro_steps_match_the_original_wrapper(reference, kwargs):
+    env = StreetFighterCustomWrapper(StandInRetroEnv(round_frames=100000), **kwargs)
+    assert np.array_equal(env.reset(), reference[0][0])
+    for expected_obs, expected_reward, expected_done in reference[1:]:
+        obs, reward, done, _info = env.step(0)
+        assert np.array_equal(obs, expected_obs)
+        assert reward == pytest.approx(expected_reward)
+        assert done == expected_done
+
+@pytest.mark.parametrize("fast_step", [False, True])
+def test_sliced_macros_match_at_macro_boundaries(reference, fast_step):
+    # step_frames=6 plays one move per step; once a macro is done the observation is the original one
+    env = StreetFighterCustomWrapper(StandInRetroEnv(round_frames=100000), macro_action="hybrid", step_frames=6,
+                                     fast_step=fast_step)
+    env.reset()
+    boundaries = []
+    total_reward = 0.0
+    done = False
+    while not done and len(boundaries) < len(reference) - 1:
+        obs, reward, done, _info = env.step(0)
+        total_reward += reward
+        if env.executor.idle:
+            boundaries.append((obs, total_reward, done))
+    assert len(boundaries) == len(reference) - 1
+    expected_total = 0.0
+    for (obs, total, done), (expected_obs, expected_reward, expected_done) in zip(boundaries, reference[1:]):
+        expected_total += expected_reward
+        assert np.array_equal(obs, expected_obs)
+        assert done == expected_done
+        if not done:
+            # A KO step pays the terminal bonus only, so damage in the earlier
+            # slices of the last macro is extra reward with step_frames
+            assert total == pytest.approx(expected_total)
+
+def test_macro_action_plays_the_chosen_macro():
+    env = StreetFighterCustomWrapper(StandInRetroEnv(), macro_action=True)
+    env.reset()
+    env.step(3)
+    assert env.last_macro == 3
+    hybrid = StreetFighterCustomWrapper(StandInRetroEnv(), macro_action="hybrid")
+    assert hybrid.action_space.n == env.action_space.n + 1
+    hybrid.reset()
+    hybrid.step(4)
+    assert hybrid.last_macro == 3
+
+def test_ram_record_is_converted_once_per_step():
+    decoder = RamDecoder.from_json()
+    env = StreetFighterCustomWrapper(StandInRetroEnv(round_frames=100000), fast_step=True, ram_decoder=decoder)
+    env.reset()
+    assert env.prev_info is None and env.prev_ram is None
+    _obs, _reward, _done, info = env.step(None)
+    # Fighter, the reward and the caller share one dict of plain ints, the record is kept for RAM consumers
+    assert env.prev_info is info
+    assert all(type(value) is int for value in info.values())
+    assert isinstance(env.prev_ram, np.void) and env.prev_ram.dtype == decoder.dtype
+    assert decoder.to_dict(env.prev_ram) == info
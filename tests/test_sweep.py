@@ -0,0 +1,40 @@
+import os
+import concurrent.futures
+
+import sweep
+
+def _fake_evaluate(calls):
+    def evaluate(task):
+        path, state, num_episodes, deterministic, record_dir = task
+        calls.append((os.path.basename(path), state))
+        win_rate = 1.0 if path.endswith("b.zip") else 0.5
+        return {"win_rate": win_rate, "mean_reward": win_rate, "std_reward": 0.0}
+    return evaluate
+
+def _run(monkeypatch, model_dir, states=("S1", "S2"), num_episodes=3):
+    # Play in threads with a fake evaluation instead of emulator processes
+    calls = []
+    monkeypatch.setattr(sweep, "_evaluate", _fake_evaluate(calls))
+    monkeypatch.setattr(sweep, "_init_worker", lambda *args: None)
+    monkeypatch.setattr(sweep.concurrent.futures, "ProcessPoolExecutor", concurrent.futures.ThreadPoolExecutor)
+    rows = sweep.sweep(str(model_dir), list(states), num_episodes=num_episodes, num_workers=2)
+    return rows, sorted(calls)
+
+def test_sweep_only_plays_new_results(monkeypatch, tmp_path):
+    (tmp_path / "a.zip").write_bytes(b"a")
+    (tmp_path / "b.zip").write_bytes(b"b")
+    rows, calls = _run(monkeypatch, tmp_path)
+    assert calls == [("a.zip", "S1"), ("a.zip", "S2"), ("b.zip", "S1"), ("b.zip", "S2")]
+    assert [row["checkpoint"] for row in rows] == ["b.zip", "a.zip"]
+    assert rows[0]["S1"] == rows[0]["win_rate"] == 1.0
+
+    assert _run(monkeypatch, tmp_path) == (rows, [])
+    # The cache follows the content, not the file name
+    (tmp_path / "c.zip").write_bytes(b"a")
+    (tmp_path / "a.zip").write_bytes(b"a2")
+    rows, calls = _run(monkeypatch, tmp_path, states=("S1",))
+    assert calls == [("a.zip", "S1")]
+    assert [row["checkpoint"] for row in rows] == ["b.zip", "a.zip", "c.zip"]
+    # Another episode count is another result
+    _rows, calls = _run(monkeypatch, tmp_path, states=("S1",), num_episodes=5)
+    assert len(calls) == 3
@@ -0,0 +1,65 @@
+import json
+import time
+
+import pytest
+
+pytest.importorskip("stable_baselines3")
+
+from stable_baselines3 import PPO
+from stable_baselines3.common.logger import KVWriter, Logger
+from stable_baselines3.common.vec_env import DummyVecEnv
+
+from observation import ObservationPipeline
+from stage_timer import StageTimer
+from stand_in_env import StandInRetroEnv
+from street_fighter_custom_wrapper import StreetFighterCustomWrapper
+from telemetry import TelemetryCallback, TimedVecEnv
+
+UPDATE_SLEEP = 0.2
+
+class _Dumps(KVWriter):
+    def __init__(self):
+        self.dumps = []
+
+    def write(self, key_values, key_excluded, step=0):
+        self.dumps.append((step, dict(key_values)))
+
+def _make_env(seed=0):
+    env = StandInRetroEnv(seed=seed, round_frames=240)
+    return StreetFighterCustomWrapper(env, macro_action=True, obs_pipeline=ObservationPipeline(size=(50, 64)),
+                                      timer=StageTimer())
+
+def test_telemetry_records_each_iteration(tmp_path):
+    venv = TimedVecEnv(DummyVecEnv([lambda: _make_env(1), lambda: _make_env(2)]))
+    model = PPO("CnnPolicy", venv, n_steps=8, batch_size=16, n_epochs=1, device="cpu")
+    dumps = _Dumps()
+    model.set_logger(Logger(None, [dumps]))
+    train = model.train
+
+    def slow_train():
+        time.sleep(UPDATE_SLEEP)
+        train()
+    model.train = slow_train
+
+    log_path = str(tmp_path / "telemetry.jsonl")
+    model.learn(3 * 16, callback=TelemetryCallback(log_path=log_path))
+    venv.close()
+
+    with open(log_path) as f:
+        records = [json.loads(line) for line in f]
+    assert [r["iteration"] for r in records] == [1, 2, 3]
+    assert [r["timesteps"] for r in records] == [16, 32, 48]
+    for record in records:
+        assert record["num_envs"] == 2 and record["env_s"] <= record["rollout_s"]
+        assert record["worker/emulator_s"] > 0 and record["worker/busy_s"] <= record["env_s"]
+        # The update is charged to the iteration it follows, not to the rollouts
+        assert record["update_s"] >= UPDATE_SLEEP and record["rollout_s"] < UPDATE_SLEEP
+
+    # The rollout metrics are dumped with their own iteration, the update time with the next
+    step, values = dumps.dumps[0]
+    assert step == 16 and values["telemetry/rollout_s"] == pytest.approx(records[0]["rollout_s"])
+    assert "telemetry/update_s" not in values
+    step, values = dumps.dumps[1]
+    assert step == 32 and values["telemetry/rollout_s"] == pytest.approx(records[1]["rollout_s"])
+    assert values["telemetry/update_s"] == pytest.approx(records[0]["update_s"])
+    assert dumps.dumps[-1][1]["telemetry/update_s"] == pytest.approx(records[2]["update_s"])
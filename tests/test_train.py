@@ -0,0 +1,62 @@
+import inspect
+import subprocess
+import sys
+
+import pytest
+
+import train
+from conftest import MAIN_DIR
+from stand_in_env import StandInRetroEnv
+
+def test_entry_points_import_without_heavy_dependencies():
+    script = ("import sys; import train, test; "
+              "print(sorted(m for m in ('retro', 'torch', 'stable_baselines3', 'sb3_contrib') if m in sys.modules))")
+    output = subprocess.run([sys.executable, "-c", script], cwd=MAIN_DIR, capture_output=True, text=True, check=True)
+    assert output.stdout.strip() == "[]"
+
+def test_main_defaults_are_resolved_when_called():
+    for parameter in ("game", "state", "total_timesteps", "save_dir", "ppo_kwargs"):
+        assert inspect.signature(train.main).parameters[parameter].default is None
+
+def test_wrapper_kwargs_reads_the_constants(monkeypatch):
+    monkeypatch.setattr(train, "STEP_FRAMES", 6)
+    monkeypatch.setattr(train, "OBS_PIPELINE", dict(size=(50, 64), grayscale=True))
+    settings = train.wrapper_kwargs()
+    assert settings["step_frames"] == 6 and settings["obs_pipeline"]["size"] == (50, 64)
+
+def test_wrap_env_uses_the_given_settings():
+    pytest.importorskip("stable_baselines3")
+    env = train.wrap_env(StandInRetroEnv(), seed=3, obs_pipeline=dict(size=(50, 64), grayscale=True),
+                         macro_action="hybrid", step_frames=6, telemetry=True)
+    wrapper = env.env
+    assert env.observation_space.shape == (50, 64, 3)
+    assert wrapper.macro_action == "hybrid" and wrapper.step_frames == 6 and wrapper.timer is not None
+    env.reset()
+    env.step(env.action_space.sample())
+    env.close()
+
+def test_make_model_overrides_ppo_kwargs():
+    pytest.importorskip("stable_baselines3")
+    from stable_baselines3.common.vec_env import DummyVecEnv
+
+    venv = DummyVecEnv([lambda: train.wrap_env(StandInRetroEnv(), obs_pipeline=dict(size=(50, 64)))])
+    model = train.make_model(venv, device="cpu", ppo_kwargs=dict(n_steps=16, batch_size=16, clip_range=0.1),
+                             tensorboard_log=None)
+    assert model.n_steps == 16 and model.batch_size == 16 and model.gamma == train.PPO_KWARGS["gamma"]
+    # Pairs become linear schedules, plain numbers stay constant
+    start, end = train.PPO_KWARGS["learning_rate"]
+    assert model.lr_schedule(1.0) == pytest.approx(start) and model.lr_schedule(0.0) == pytest.approx(end)
+    assert model.clip_range(1.0) == model.clip_range(0.0) == 0.1
+    venv.close()
+
+def test_wrapper_settings_follow_the_checkpoints(monkeypatch, tmp_path):
+    monkeypatch.setattr(train, "STEP_FRAMES", 6)
+    # Directories without saved settings take the module constants
+    assert train.load_wrapper_settings(str(tmp_path)) == dict(train.wrapper_kwargs(), telemetry=False)
+
+    train.save_wrapper_settings(str(tmp_path), dict(obs_pipeline=dict(size=(50, 64), grayscale=True),
+                                                    macro_action="hybrid", step_frames=None, telemetry=True))
+    settings = train.load_wrapper_settings(str(tmp_path))
+    assert settings["step_frames"] is None and settings["macro_action"] == "hybrid" and not settings["telemetry"]
+    wrapper = train.build_wrapper(StandInRetroEnv(), reset_round=False, **settings)
+    assert wrapper.observation_space.shape == (50, 64, 3) and not wrapper.reset_round
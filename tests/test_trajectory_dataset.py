@@ -0,0 +1,62 @@
+import numpy as np
+import pytest
+
+pytest.importorskip("torch")
+
+from ram_decoder import RamDecoder
+from trajectory_dataset import (TrajectoryDataset, TrajectoryShard, TrajectoryWriter, decode_frames, encode_frames,
+                                make_loader)
+
+def test_frame_codec_round_trip():
+    rng = np.random.default_rng(0)
+    obs = rng.integers(0, 256, size=(17, 100, 128, 3), dtype=np.uint8)
+    # Mostly unchanged frames, like consecutive game screens
+    obs[1::2] = obs[::2][:len(obs[1::2])]
+    blob = encode_frames(obs, level=1)
+    assert np.array_equal(decode_frames(blob, obs.shape[1:], obs.dtype), obs)
+
+def test_shard_round_trip(tmp_path):
+    decoder = RamDecoder.from_json()
+    rng = np.random.default_rng(1)
+    obs = rng.integers(0, 256, size=(10, 4, 5, 3), dtype=np.uint8)
+    ram = np.zeros(10, dtype=decoder.dtype)
+    ram["agent_hp"] = np.arange(10)
+
+    writer = TrajectoryWriter(str(tmp_path), obs.shape[1:], ram_dtype=decoder.dtype, chunk_size=4)
+    for i in range(10):
+        writer.add(obs[i], i, 0.5 * i, i == 9, ram[i])
+    writer.close()
+
+    shard = TrajectoryShard(str(tmp_path))
+    assert shard.num_steps == 10
+    assert shard.num_chunks == 3
+    chunks = [shard.chunk(i) for i in range(shard.num_chunks)]
+    assert np.array_equal(np.concatenate([c["obs"] for c in chunks]), obs)
+    assert list(np.concatenate([c["actions"] for c in chunks])) == list(range(10))
+    assert np.concatenate([c["dones"] for c in chunks]).tolist() == [False] * 9 + [True]
+    assert np.array_equal(np.concatenate([c["ram"] for c in chunks])["agent_hp"], np.arange(10))
+
+def test_dataset_yields_every_step_once(tmp_path):
+    obs = np.zeros((12, 2, 2, 3), dtype=np.uint8)
+    writer = TrajectoryWriter(str(tmp_path), obs.shape[1:], chunk_size=4)
+    for i in range(12):
+        writer.add(obs[i], i, 0.0, False)
+    writer.close()
+
+    dataset = TrajectoryDataset(str(tmp_path), batch_size=3, shuffle_chunks=2, drop_last=False)
+    actions = sorted(int(a) for batch in dataset for a in batch["actions"])
+    assert actions == list(range(12))
+
+@pytest.mark.parametrize("num_workers", [0, 2])
+def test_consecutive_epochs_are_shuffled_differently(tmp_path, num_workers):
+    obs = np.zeros((64, 2, 2, 3), dtype=np.uint8)
+    writer = TrajectoryWriter(str(tmp_path), obs.shape[1:], chunk_size=4)
+    for i in range(64):
+        writer.add(obs[i], i, 0.0, False)
+    writer.close()
+
+    # Persistent workers keep their dataset copies between epochs
+    loader = make_loader(str(tmp_path), batch_size=4, num_workers=num_workers, shuffle_chunks=2)
+    epochs = [[int(a) for batch in loader for a in batch["actions"]] for _ in range(2)]
+    assert sorted(epochs[0]) == sorted(epochs[1]) == list(range(64))
+    assert epochs[0] != epochs[1]
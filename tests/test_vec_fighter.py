@@ -0,0 +1,38 @@
+import numpy as np
+
+from fighter import MACRO_INDEX, MACRO_TABLE, Fighter, Status, VecFighter
+from ram_decoder import RamDecoder
+
+def _random_records(num, seed=0):
+    rng = np.random.default_rng(seed)
+    records = np.zeros(num, dtype=RamDecoder.from_json().dtype)
+    records["agent_x"] = rng.integers(0, 512, num)
+    records["enemy_x"] = rng.integers(0, 512, num)
+    # Dense around Fighter's thresholds: y 105-130 and the ground, distances 40, 100-105 and 150
+    records["enemy_y"] = rng.choice([100, 105, 106, 129, 130, 150, 191, 192, 193], num)
+    records["agent_y"] = rng.choice([150, 192], num)
+    statuses = [status.value for status in Status] + [0, 1]
+    records["enemy_status"] = rng.choice(statuses, num)
+    records["agent_status"] = rng.choice(statuses, num)
+    near = rng.random(num) < 0.5
+    distance = rng.choice([38, 39, 40, 41, 99, 100, 105, 106, 149, 150, 151], num)
+    records["enemy_x"][near] = np.minimum(records["agent_x"][near] + distance[near], 511)
+    return records
+
+def test_matches_fighter():
+    records = _random_records(20000)
+    macros = VecFighter().get_best_moves(records)
+    fighter = Fighter(None)
+    for record, macro in zip(records, macros):
+        fighter.update(record)
+        assert macro == MACRO_INDEX[fighter.get_best_macro()]
+
+def test_invalid_envs_get_the_default_decision():
+    records = _random_records(100, seed=1)
+    valid = np.arange(100) % 2 == 0
+    macros = VecFighter().get_best_moves(records, valid=valid)
+    assert (macros[~valid] == MACRO_INDEX[Fighter(None).get_best_macro()]).all()
+
+def test_sequences_index_the_macro_table():
+    macros = VecFighter().get_best_moves(_random_records(10, seed=2))
+    assert VecFighter.sequences(macros) == [MACRO_TABLE[i] for i in macros]